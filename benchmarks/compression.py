@@ -0,0 +1,84 @@
+"""Benchmarks compression levels for the feed and the public pages against
+the time it takes to upload them.
+
+    python -m benchmarks.compression FILE [FILE ...] [--mbps 20]
+        [--bucket BUCKET] [--repeat 5]
+
+FILE is a sample of what is uploaded, e.g. a feed or an episode page.
+Upload time is estimated from --mbps, or measured by actually uploading to
+--bucket when given.
+"""
+import argparse
+import time
+from highland import app, media_storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--mbps', type=float, default=20,
+                        help='upload bandwidth used for the estimate')
+    parser.add_argument('--bucket', help='bucket to measure uploads with')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    candidates = [(None, None)]
+    candidates += [(media_storage.ENCODING_GZIP, x) for x in range(1, 10)]
+    if media_storage.brotli is not None:
+        candidates += [(media_storage.ENCODING_BROTLI, x) for x in range(12)]
+
+    for file_name in args.files:
+        with open(file_name, 'rb') as f:
+            data = f.read()
+        print('{} ({} bytes)'.format(file_name, len(data)))
+        print('{:>8} {:>5} {:>10} {:>7} {:>10} {:>10} {:>10}'.format(
+            'encoding', 'level', 'bytes', 'ratio', 'compress', 'upload',
+            'total'))
+        for encoding, level in candidates:
+            compressed, compress_time = _measure_compress(
+                data, encoding, level, args.repeat)
+            if args.bucket:
+                upload_time = _measure_upload(
+                    data, args.bucket, encoding, level, args.repeat)
+            else:
+                upload_time = len(compressed) * 8 / (args.mbps * 1000000)
+            print('{:>8} {:>5} {:>10} {:>7.3f} {:>9.4f}s {:>9.4f}s '
+                  '{:>9.4f}s'.format(
+                      encoding or '-', '-' if level is None else level,
+                      len(compressed), len(compressed) / len(data),
+                      compress_time, upload_time,
+                      compress_time + upload_time))
+        print()
+
+
+def _measure_compress(data, encoding, level, repeat):
+    if encoding is None:
+        return data, 0.0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        compressed = media_storage.compress(data, encoding, level)
+    return compressed, (time.perf_counter() - start) / repeat
+
+
+def _measure_upload(data, bucket, encoding, level, repeat):
+    """Measures upload including compression, which media_storage does."""
+    compression = app.config.get('UPLOAD_COMPRESSION')
+    app.config['UPLOAD_COMPRESSION'] = \
+        {'BENCHMARK_BUCKET': (encoding, level)} if encoding else {}
+    app.config['BENCHMARK_BUCKET'] = bucket
+    try:
+        start = time.perf_counter()
+        for i in range(repeat):
+            media_storage.upload(data, bucket, 'compression_{}'.format(i),
+                                 'benchmark')
+        elapsed = (time.perf_counter() - start) / repeat
+        for i in range(repeat):
+            media_storage.delete('compression_{}'.format(i), bucket,
+                                 'benchmark')
+        return elapsed
+    finally:
+        app.config['UPLOAD_COMPRESSION'] = compression
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Benchmarks the feed and the public pages against the size of the show.
+
+    python -m benchmarks.rendering [--database URI] [--sizes 10 1000 10000]
+        [--repeat 3] [--results benchmarks/results.json] [--compare COMMIT]
+
+Synthetic shows with the given numbers of episodes are created in the
+database, an in-memory SQLite one unless --database is given. The tables
+there are dropped and created again, so give a scratch database. Nothing is
+uploaded; the storage is a storage_backend.MemoryStorage.
+
+For each operation, the wall time (the best of --repeat runs), the number of
+queries and the peak memory allocated by Python are reported. The results
+are saved under the current commit in --results, and compared with those of
+--compare when given.
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import set_committed_value
+from highland import app, models, media_storage, feed_operation, \
+    public_view, show_snapshot, storage_backend
+from highland.models import User, Show, Episode, Audio, Image
+
+DESCRIPTION = '<p>Episode {}, where we talk about <b>things</b>.</p>' \
+    '<ul><li><a href="https://example.com/{}">a link</a></li>' \
+    '<li>another topic</li></ul>' \
+    '<script>alert("removed by the sanitizer")</script>'
+
+
+class QueryCounter():
+    """Counts the statements executed on the engine"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database', default='sqlite://',
+                        help='SQLAlchemy URI of a scratch database')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 1000, 10000],
+                        help='numbers of episodes of the shows')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--results', default=os.path.join(
+        os.path.dirname(__file__), 'results.json'))
+    parser.add_argument('--compare', help='commit to compare the results with')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    media_storage.set_backend(storage_backend.MemoryStorage())
+    with app.test_request_context():
+        _setup_database()
+        counter = QueryCounter(models.db.engine)
+        results = []
+        for size in args.sizes:
+            show_id = _create_show(size)
+            for name, operation, prepare in _get_operations(show_id):
+                result = _measure(operation, prepare, counter, args.repeat)
+                result.update(operation=name, episodes=size)
+                results.append(result)
+                _print(result)
+        models.db.session.remove()
+        models.db.drop_all()
+
+    saved = _save(args.results, args.database, results)
+    if args.compare:
+        _compare(saved, args.compare, results)
+
+
+def _get_operations(show_id):
+    """Returns (name, operation, prepare) to measure on the show.
+    prepare is called before each run, outside the measurement.
+    """
+
+    def feed():
+        feed_operation._generate(feed_operation._load(show_id))
+        # leave the item cache as it was for the next run
+        models.db.session.rollback()
+
+    def show_html():
+        public_view.show_html(show_snapshot.load(show_id), upload=False)
+
+    def episode_html():
+        snapshot = show_snapshot.load(show_id)
+        public_view.episode_html(
+            snapshot, *snapshot.episodes[0], upload=False)
+
+    def cache_items():
+        # the feed as rendered by update, which commits the item cache
+        feed_operation._render(show_id)
+
+    return [
+        ('feed_cold', feed, None),
+        ('feed_warm', feed, cache_items),
+        ('show_html', show_html, None),
+        ('episode_html', episode_html, None),
+    ]
+
+
+def _measure(operation, prepare, counter, repeat):
+    """Runs the operation repeat times for the wall time and the number of
+    queries, then once more under tracemalloc for the peak memory, which is
+    kept apart as tracing slows the run down.
+    """
+
+    times = []
+    for _ in range(repeat):
+        if prepare:
+            prepare()
+        models.db.session.expire_all()
+        count = counter.count
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+        queries = counter.count - count
+
+    if prepare:
+        prepare()
+    models.db.session.expire_all()
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'queries': queries, 'peak_bytes': peak}
+
+
+def _setup_database():
+    models.db.drop_all()
+    models.db.create_all()
+    if models.db.engine.dialect.name == 'sqlite':
+        # SQLite drops the time zone, which the feed requires
+        for model in (Show, Episode, Audio, Image, models.FeedItem):
+            event.listen(model, 'load', _set_utc)
+    # the owner's email would otherwise be fetched from cognito
+    event.listen(User, 'load', _set_email)
+
+
+def _set_utc(target, context):
+    for column in target.__table__.columns:
+        value = getattr(target, column.name)
+        if isinstance(value, datetime.datetime) and value.tzinfo is None:
+            set_committed_value(target, column.name,
+                                value.replace(tzinfo=datetime.timezone.utc))
+
+
+def _set_email(target, context):
+    target.__dict__['email'] = 'benchmark@example.com'
+
+
+def _create_show(size):
+    """Creates a show with size published episodes, each with an audio.
+    Returns the id of the show.
+    """
+
+    user = User('benchmark-{}'.format(size), 'Benchmark', 'identity')
+    models.db.session.add(user)
+    models.db.session.flush()
+    image = Image(user.id, 'show.png', 'showimage', 'image/png')
+    models.db.session.add(image)
+    models.db.session.flush()
+    show = Show(user.id, 'Benchmark {}'.format(size), 'The show with {} '
+                'episodes'.format(size), 'subtitle', 'en-US', 'Benchmark',
+                'Technology', False, image.id, 'benchmark-{}'.format(size))
+    models.db.session.add(show)
+    models.db.session.flush()
+
+    audios = [Audio(user.id, 'episode{}.mp3'.format(i), 1800 + i,
+                    30000000 + i, 'audio/mpeg', 'audio{}'.format(i))
+              for i in range(size)]
+    models.db.session.add_all(audios)
+    models.db.session.flush()
+
+    start = datetime.datetime(2010, 1, 1, tzinfo=datetime.timezone.utc)
+    for i, audio in enumerate(audios):
+        episode = Episode(
+            show.id, user.id, 'Episode {}'.format(i), 'subtitle {}'.format(i),
+            DESCRIPTION.format(i, i), audio.id,
+            Episode.DraftStatus.published.name, None, False, None,
+            'episode-{}'.format(i))
+        episode.published_datetime = start + datetime.timedelta(hours=i)
+        models.db.session.add(episode)
+    models.db.session.commit()
+    return show.id
+
+
+def _print(result):
+    print('{operation:>12} {episodes:>6} episodes {seconds:>9.4f}s '
+          '{queries:>6} queries {peak_mb:>8.2f}MB'.format(
+              peak_mb=result['peak_bytes'] / 1024 / 1024, **result))
+
+
+def _save(file_name, database, results):
+    """Saves the results under the current commit. Returns all the saved."""
+
+    saved = {}
+    if os.path.exists(file_name):
+        with open(file_name) as f:
+            saved = json.load(f)
+    saved[_get_commit()] = {
+        'datetime': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'database': database.split(':')[0],
+        'results': results
+    }
+    with open(file_name, 'w') as f:
+        json.dump(saved, f, indent=2, sort_keys=True)
+    return saved
+
+
+def _compare(saved, commit, results):
+    base = saved.get(commit) or saved.get(_get_commit(commit))
+    if not base:
+        print('No results saved for {}'.format(commit))
+        return
+    base = {(x['operation'], x['episodes']): x for x in base['results']}
+    print('\ncompared with {}'.format(commit))
+    for result in results:
+        b = base.get((result['operation'], result['episodes']))
+        if not b:
+            continue
+        print('{:>12} {:>6} episodes {:>+8.1f}% time {:>+6} queries '
+              '{:>+8.1f}% memory'.format(
+                  result['operation'], result['episodes'],
+                  _change(b['seconds'], result['seconds']),
+                  result['queries'] - b['queries'],
+                  _change(b['peak_bytes'], result['peak_bytes'])))
+
+
+def _change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def _get_commit(ref='HEAD'):
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', ref],
+            stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ref
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Benchmarks the sanitizers of the episode descriptions.
+
+    python -m benchmarks.sanitizer [--database URI] [--count 1000]
+        [--repeat 3]
+
+The descriptions are those of the episodes in --database, or synthetic ones
+when not given. For each backend of html_sanitizer, the throughput in
+descriptions per second (the best of --repeat runs) is reported, along with
+the number of descriptions sanitized the same as bleach does.
+"""
+import argparse
+import time
+from highland import app, html_sanitizer, models
+from highland.models import Episode
+
+DESCRIPTION = '<p>Episode {}, where we talk about <b>things</b> &amp; ' \
+    '<em>more</em>.</p>\n<ul>\n<li><a href="https://example.com/{}" ' \
+    'title="notes">show notes</a></li>\n<li>another topic<br>' \
+    'continued</li>\n</ul>\n<blockquote>a quote</blockquote>' \
+    '<script>alert("removed by the sanitizer")</script>'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database',
+                        help='SQLAlchemy URI to read the descriptions from')
+    parser.add_argument('--count', type=int, default=1000,
+                        help='number of descriptions')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    descriptions = _load(args.database, args.count)
+    print('{} descriptions, {} bytes on average'.format(
+        len(descriptions),
+        sum(len(x) for x in descriptions) // max(len(descriptions), 1)))
+
+    reference = [html_sanitizer.clean_bleach(x) for x in descriptions]
+    for name, clean in sorted(html_sanitizer.BACKENDS.items()):
+        seconds = min(_measure(clean, descriptions)
+                      for _ in range(args.repeat))
+        same = sum(1 for x, y in zip(descriptions, reference)
+                   if clean(x) == y)
+        print('{:>8} {:>10.0f} descriptions/s {:>6}/{} same as bleach'.format(
+            name, len(descriptions) / seconds, same, len(descriptions)))
+
+
+def _load(database, count):
+    if not database:
+        return [DESCRIPTION.format(i, i) for i in range(count)]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database
+    with app.app_context():
+        rows = models.db.session.query(Episode.description). \
+            filter(Episode.description != ''). \
+            limit(count)
+        return [x for x, in rows]
+
+
+def _measure(clean, descriptions):
+    start = time.perf_counter()
+    for description in descriptions:
+        clean(description)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 import uuid
 import urllib.parse
-from highland import app, media_operation, user_operation
+from highland import app, media_operation, media_storage, user_operation
 from highland.exception import NoSuchEntityError
 from highland.models import db, Audio, Episode
 
@@ -17,6 +17,24 @@ def create(user_id, file_name, duration, length, file_type):
     return dict(audio)
 
 
+def ingest(user_id, stream, file_name, duration, file_type):
+    """Creates a new audio entity from the file read from the stream, which
+    is uploaded to the storage as it is read rather than held in memory. The
+    length and the checksum are the ones of what was uploaded.
+    Intended to be called by partners pushing files from their servers.
+    """
+
+    user = user_operation.get_model(id=user_id)
+    guid = uuid.uuid4().hex
+    audio = Audio(user_id, file_name, duration, 0, file_type, guid)
+    audio.length, audio.checksum = media_storage.upload_stream(
+        stream, app.config.get('S3_BUCKET_AUDIO'),
+        _get_audio_key(user, audio), ContentType=file_type)
+    db.session.add(audio)
+    db.session.commit()
+    return dict(audio)
+
+
 def delete(user_id, audio_ids):
     """Deletes the audios.
     Intended to be called by front end.
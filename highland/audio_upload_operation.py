@@ -0,0 +1,190 @@
+"""Audio files uploaded by the client in parts, which can be uploaded in
+parallel and again after a failure without starting over.
+
+The client starts an upload with the length of the file, and is told the
+size and the number of the parts to split it into. It asks for the urls of
+the parts in batches, PUTs each part to its url, and reports the ETag of
+the response. The upload is resumed by looking up the parts reported so
+far. Once all are reported, completing the upload creates the audio.
+"""
+import uuid
+from highland import app, audio_operation, media_storage, storage_backend, \
+    user_operation
+from highland.common import verify_ownership
+from highland.exception import InvalidValueError, NoSuchEntityError
+from highland.models import db, Audio, MultipartUpload, MultipartUploadPart
+
+# types of the audio files accepted, as given by the client
+AUDIO_TYPES = frozenset([
+    'audio/aac', 'audio/flac', 'audio/mp4', 'audio/mpeg', 'audio/ogg',
+    'audio/opus', 'audio/wav', 'audio/webm', 'audio/x-m4a', 'audio/x-wav'])
+
+
+def start(user_id, file_name, duration, length, file_type):
+    """Starts the upload of an audio file of length bytes. Returns the
+    upload as dict, along with the number of the parts.
+    Intended to be called by front end.
+    """
+
+    _require_count('length', length)
+    _require_count('duration', duration)
+    if file_type not in AUDIO_TYPES:
+        raise InvalidValueError('filetype not accepted. {}'.format(file_type))
+    user = user_operation.get_model(id=user_id)
+    upload = MultipartUpload(
+        user_id, file_name, duration, length, file_type, uuid.uuid4().hex,
+        _get_part_size(length))
+    upload.upload_id = media_storage.start_multipart_upload(
+        _get_bucket(), _get_key(user, upload), ContentType=file_type)
+    db.session.add(upload)
+    db.session.commit()
+    return _dict(upload, [])
+
+
+def get(user_id, upload_id):
+    """Returns the upload as dict, with the parts reported so far.
+    Intended to be called by front end.
+    """
+
+    upload = _get_model(user_id, upload_id)
+    return _dict(upload, _load_parts(upload))
+
+
+def get_part_urls(user_id, upload_id, part_numbers):
+    """Returns the urls to upload the parts to by part number. Up to
+    AUDIO_UPLOAD_URL_BATCH parts are given at a time.
+    Intended to be called by front end.
+    """
+
+    upload = _get_model(user_id, upload_id)
+    batch = app.config.get('AUDIO_UPLOAD_URL_BATCH') or 100
+    if len(part_numbers) > batch:
+        raise InvalidValueError(
+            'up to {} parts at a time. {} given'.format(
+                batch, len(part_numbers)))
+    count = _get_part_count(upload)
+    for x in part_numbers:
+        if not isinstance(x, int) or not 1 <= x <= count:
+            raise InvalidValueError('part number not accepted. {}'.format(x))
+
+    user = user_operation.get_model(id=user_id)
+    return media_storage.get_part_urls(
+        _get_bucket(), _get_key(user, upload), upload.upload_id, part_numbers,
+        app.config.get('AUDIO_UPLOAD_URL_SECONDS') or 3600)
+
+
+def record_parts(user_id, upload_id, parts):
+    """Records the parts uploaded, given as (part number, etag). A part
+    uploaded again replaces the one recorded. Returns the upload as get does.
+    Intended to be called by front end.
+    """
+
+    upload = _get_model(user_id, upload_id)
+    count = _get_part_count(upload)
+    recorded = {x.part_number: x for x in _load_parts(upload)}
+    for number, etag in parts:
+        if not isinstance(number, int) or not 1 <= number <= count:
+            raise InvalidValueError(
+                'part number not accepted. {}'.format(number))
+        if not etag:
+            raise InvalidValueError('etag required. part:{}'.format(number))
+        if number in recorded:
+            recorded[number].etag = etag
+        else:
+            recorded[number] = MultipartUploadPart(upload.id, number, etag)
+            db.session.add(recorded[number])
+    db.session.commit()
+    return _dict(upload, recorded.values())
+
+
+def complete(user_id, upload_id):
+    """Completes the upload once every part is recorded, and creates the
+    audio from it. Returns the audio as dict.
+    Intended to be called by front end.
+    """
+
+    upload = _get_model(user_id, upload_id)
+    parts = _load_parts(upload)
+    missing = sorted(set(range(1, _get_part_count(upload) + 1)) -
+                     {x.part_number for x in parts})
+    if missing:
+        raise InvalidValueError('parts not uploaded. {}'.format(missing))
+
+    user = user_operation.get_model(id=user_id)
+    media_storage.complete_multipart_upload(
+        _get_bucket(), _get_key(user, upload), upload.upload_id,
+        [(x.part_number, x.etag) for x in parts])
+    # the parts never pass through the server, so there is no checksum
+    audio = Audio(user_id, upload.filename, upload.duration, upload.length,
+                  upload.type, upload.guid)
+    db.session.add(audio)
+    db.session.delete(upload)
+    db.session.commit()
+    return dict(audio)
+
+
+def abort(user_id, upload_id):
+    """Aborts the upload, discarding the parts uploaded.
+    Intended to be called by front end.
+    """
+
+    upload = _get_model(user_id, upload_id)
+    user = user_operation.get_model(id=user_id)
+    media_storage.abort_multipart_upload(
+        _get_bucket(), _get_key(user, upload), upload.upload_id)
+    db.session.delete(upload)
+    db.session.commit()
+    return True
+
+
+def _get_model(user_id, upload_id):
+    upload = MultipartUpload.query.filter_by(id=upload_id).first()
+    if not upload:
+        raise NoSuchEntityError(
+            'Upload not found. Id:{}'.format(upload_id))
+    return verify_ownership(user_id, upload)
+
+
+def _load_parts(upload):
+    return MultipartUploadPart.query. \
+        filter_by(multipart_upload_id=upload.id). \
+        order_by(MultipartUploadPart.part_number). \
+        all()
+
+
+def _dict(upload, parts):
+    d = dict(upload)
+    d['part_count'] = _get_part_count(upload)
+    d['parts'] = sorted(
+        ({'part_number': x.part_number, 'etag': x.etag} for x in parts),
+        key=lambda x: x['part_number'])
+    return d
+
+
+def _require_count(name, value):
+    # bool is an int, but not a number the client means to send
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise InvalidValueError('{} not accepted. {}'.format(name, value))
+
+
+def _get_part_size(length):
+    """Size of the parts, as large as needed to stay within the number of
+    parts the storage allows.
+    """
+
+    return max(storage_backend.MULTIPART_PART_SIZE,
+               -(-length // storage_backend.MULTIPART_MAX_PARTS))
+
+
+def _get_part_count(upload):
+    # an empty file is uploaded as a single empty part
+    return max(1, -(-upload.length // upload.part_size))
+
+
+def _get_key(user, upload):
+    # the file is uploaded to where the audio it becomes is expected
+    return audio_operation._get_audio_key(user, upload)
+
+
+def _get_bucket():
+    return app.config.get('S3_BUCKET_AUDIO')
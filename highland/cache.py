@@ -0,0 +1,83 @@
+"""In-process caches shared by the threads of a worker"""
+import collections
+import threading
+import time
+
+
+class LRUCache:
+    """Least recently used cache, bounded by the total size of the values.
+
+    size_of: function returning the size of a value. If None, every value
+    counts as 1, so that max_size is the number of values.
+    """
+
+    def __init__(self, max_size, size_of=None):
+        self.max_size = max_size
+        self.size_of = size_of or (lambda value: 1)
+        self.size = 0
+        self._lock = threading.Lock()
+        self._values = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._values:
+                return default
+            self._values.move_to_end(key)
+            return self._values[key]
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        with self._lock:
+            if key in self._values:
+                self.size -= self.size_of(self._values.pop(key))
+            if size > self.max_size:
+                return value
+            self._values[key] = value
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self._values.popitem(last=False)
+                self.size -= self.size_of(evicted)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._values:
+                return default
+            value = self._values.pop(key)
+            self.size -= self.size_of(value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._values)
+
+
+class TTLCache(LRUCache):
+    """LRUCache of which values expire ttl seconds after being put.
+
+    clock: function returning the current time in seconds
+    """
+
+    def __init__(self, max_size, ttl, size_of=None, clock=time.monotonic):
+        size_of = size_of or (lambda value: 1)
+        super().__init__(max_size, lambda entry: size_of(entry[1]))
+        self.ttl = ttl
+        self.clock = clock
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires <= self.clock():
+            self.pop(key)
+            return default
+        return value
+
+    def put(self, key, value):
+        super().put(key, (self.clock() + self.ttl, value))
+        return value
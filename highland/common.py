@@ -1,6 +1,7 @@
+import hashlib
 import re
-import bleach
 
+from highland import html_sanitizer
 from highland.exception import AccessNotAllowedError, ValueError
 
 
@@ -20,8 +21,7 @@ def is_valid_alias(alias):
 
 
 def clean_html(s):
-    tags = bleach.ALLOWED_TAGS + ['br']
-    return bleach.clean(s, tags=tags)
+    return html_sanitizer.clean(s)
 
 
 def require_true(expression, message=None):
@@ -31,3 +31,10 @@ def require_true(expression, message=None):
         raise ValueError(message)
     else:
         raise ValueError()
+
+
+def fingerprint(*values):
+    """Returns a digest identifying the given values.
+    Values are expected to have a stable repr.
+    """
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
@@ -1,10 +1,18 @@
 import datetime
 import urllib.parse
 from highland import models, show_operation, app, audio_operation,\
-    image_operation, common, exception
+    image_operation, common, exception, cache
 from highland.common import verify_ownership
 from highland.models import Episode, Show
 
+# alias of the episode page uploaded for previews
+PREVIEW_ALIAS = '_preview'
+
+# sanitized descriptions of the episodes without description_html, i.e.
+# previews and the ones written before it was added, by content digest
+description_cache = cache.LRUCache(
+    app.config.get('DESCRIPTION_CACHE_BYTES', 16 * 1024 * 1024), size_of=len)
+
 
 def create(show_id, draft_status, alias, audio_id, image_id,
            scheduled_datetime=None, title='', subtitle='', description='',
@@ -41,6 +49,8 @@ def update(user_id, episode_id, draft_status=None, alias=None, audio_id=None,
     """
 
     episode = verify_ownership(user_id, _get_model(episode_id))
+    was_published = \
+        episode.draft_status == Episode.DraftStatus.published.name
     name_value_pairs = [
         ('title', title),
         ('subtitle', subtitle),
@@ -57,7 +67,7 @@ def update(user_id, episode_id, draft_status=None, alias=None, audio_id=None,
 
     _autofill_attributes(episode)
     _verify_episode(episode)
-    _update_show_build_datetime(episode)
+    _update_show_build_datetime(episode, was_published=was_published)
 
     models.db.session.commit()
     return dict(episode)
@@ -139,6 +149,51 @@ def load_public(show_id):
         all()
 
 
+def load_public_with_media(show_id):
+    """Retrieves all the public episodes under the show, each along with
+    the associated audio and image, in a single query.
+
+    Returns a sequence of (episode, audio, image). audio and image are None
+    when not set. The show is not looked up, so it is the caller's
+    responsibility to pass the id of an existing show.
+    """
+
+    return query_public_with_media(show_id).all()
+
+
+def query_public_with_media(show_id):
+    """Returns the query behind load_public_with_media, so that callers can
+    extend it or iterate over it without loading every row at once.
+    """
+
+    return models.db.session. \
+        query(Episode, models.Audio, models.Image). \
+        outerjoin(models.Audio, Episode.audio_id == models.Audio.id). \
+        outerjoin(models.Image, Episode.image_id == models.Image.id). \
+        filter(Episode.show_id == show_id,
+               Episode.draft_status == Episode.DraftStatus.published.name). \
+        order_by(Episode.published_datetime.desc())
+
+
+def load_public_by_ids(show_id, episode_ids):
+    """Retrieves the public episodes under the show among the given ids."""
+
+    return Episode.query. \
+        filter_by(show_id=show_id,
+                  draft_status=Episode.DraftStatus.published.name). \
+        filter(Episode.id.in_(episode_ids)). \
+        all()
+
+
+def count_public(show_id):
+    """Returns the number of the public episodes under the show."""
+
+    return Episode.query. \
+        filter_by(show_id=show_id,
+                  draft_status=Episode.DraftStatus.published.name). \
+        count()
+
+
 def load_publish_target():
     return Episode.query. \
         filter_by(
@@ -159,6 +214,7 @@ def publish(episode):
 
     episode.draft_status = Episode.DraftStatus.published.name
     episode.published_datetime = datetime.datetime.now(datetime.timezone.utc)
+    _update_show_build_datetime(episode)
     models.db.session.commit()
     return episode
 
@@ -171,12 +227,30 @@ def get_episode_url(episode, show=None):
         app.config.get('HOST_SITE'), '{}/{}'.format(show.alias, episode.alias))
 
 
+def get_description_html(episode):
+    """Returns the description of the episode sanitized for rendering.
+
+    The one stored with the episode is used if any. Otherwise the description
+    is sanitized once per content and kept in description_cache.
+    """
+
+    if episode.description_html is not None:
+        return episode.description_html
+    key = common.fingerprint(episode.description)
+    html = description_cache.get(key)
+    if html is None:
+        html = description_cache.put(
+            key, common.clean_html(episode.description))
+    return html
+
+
 def get_preview_episode(show, title, subtitle, description, audio_id,
                         image_id):
     """Creates temporary episode instance for a preview"""
     episode = Episode(
         show.id, show.owner_user_id, title, subtitle, description, audio_id,
-        Episode.DraftStatus.published.name, None, False, image_id, '_preview')
+        Episode.DraftStatus.published.name, None, False, image_id,
+        PREVIEW_ALIAS)
     episode.published_datetime = datetime.datetime.now(datetime.timezone.utc)
     return episode
 
@@ -216,11 +290,13 @@ def _verify_episode(episode):
     return episode
 
 
-def _update_show_build_datetime(episode, show=None):
-    """Updates the build datetime for the show as an episode is updated.
+def _update_show_build_datetime(episode, show=None, was_published=False):
+    """Updates the build datetime for the show as an episode is updated, if
+    the episode is published or was_published until the update.
     It does not commit the session."""
 
-    if episode.draft_status != Episode.DraftStatus.published.name:
+    if not was_published and \
+            episode.draft_status != Episode.DraftStatus.published.name:
         return None
 
     show = show or show_operation.get_model(episode.show_id)
@@ -232,6 +308,8 @@ def _autofill_attributes(episode):
     if not episode.alias:
         episode.alias = _get_default_alias(episode.show_id)
 
+    episode.description_html = common.clean_html(episode.description)
+
     episode.published_datetime = \
         PUBLISHED_DATETIME_FUNC[episode.draft_status]()
 
@@ -1,20 +1,94 @@
+import io
+import itertools
+import tempfile
 import urllib.parse
+from collections import namedtuple
+from sqlalchemy import func
+from feedgen.entry import FeedEntry
 from feedgen.feed import FeedGenerator
-from highland import show_operation, episode_operation, media_storage,\
-    audio_operation, image_operation, app, common, user_operation
+from lxml import etree
+from highland import episode_operation, audio_operation, image_operation, app,\
+    common, models, published_file_operation, cache, show_snapshot,\
+    upload_manager
+from highland.models import Episode, FeedItem
 
 FEED_FOLDER_RSS = 'rss'
+FEED_FOLDER_ARCHIVE = 'rss_archive'
 FEED_CONTENT_TYPE = 'application/rss+xml'
 
+# bump to invalidate every cached FeedItem when the item layout changes
+FEED_ITEM_VERSION = 1
+ITUNES_NS = 'http://www.itunes.com/dtds/podcast-1.0.dtd'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+HISTORY_NS = 'http://purl.org/syndication/history/1.0'
+CHANNEL_OPEN = b'<channel>\n'
+CHANNEL_CLOSE = b'  </channel>'
 
-def update(show_id):
-    """Generate the latest feed and update the public repository with that"""
+# changed items kept in the session before flushing them
+FEED_ITEM_FLUSH_SIZE = 100
+# episodes fetched at a time when streamed from the database
+FEED_QUERY_BATCH_SIZE = 100
+# feed size up to which it is kept in memory rather than a temporary file
+FEED_SPOOL_SIZE = 1024 * 1024
 
-    show = show_operation.get_model(show_id)
-    user = user_operation.get_model(show.owner_user_id)
-    return media_storage.upload(
-        _generate(user, show), app.config.get('S3_BUCKET_FEED'),
-        show.alias, FEED_FOLDER_RSS, ContentType=FEED_CONTENT_TYPE)
+FeedData = namedtuple(
+    'FeedData',
+    'user show show_image episodes episode_count last_build_datetime')
+
+# rendered feeds served by the app, bounded by their total bytes
+feed_cache = cache.LRUCache(
+    app.config.get('FEED_CACHE_BYTES', 64 * 1024 * 1024), size_of=len)
+
+
+def update(show_id, snapshot=None):
+    """Generate the latest feed and update the public repository with that.
+    The feed is rendered from the ShowSnapshot if given.
+
+    When the show has feed_page_size set, the feed is capped at that many
+    newest episodes and the older ones go to archive pages (RFC 5005).
+    Archive pages no longer needed, all of them when not paged, are deleted.
+    Files identical to the ones last uploaded are skipped.
+    Returns True if anything was uploaded, False if everything was skipped.
+    """
+
+    data = _load(show_id, snapshot)
+    if data.show.feed_page_size:
+        uploaded = _update_paged(data, data.show.feed_page_size)
+    else:
+        uploaded = _upload(data, FEED_FOLDER_RSS, data.show.alias,
+                           (xml for _, xml in _items(data)))
+        # left from when the show was paged
+        published_file_operation.delete_except(
+            data.show.id, app.config.get('S3_BUCKET_FEED'),
+            _get_archive_folder(data.show), [])
+    if not uploaded:
+        app.logger.info('feed unchanged. skipped show:{}'.format(show_id))
+    # persist the rendered items and the digest
+    models.db.session.commit()
+    return uploaded
+
+
+def get_cached(show):
+    """Returns the feed of the show as bytes, as it is uploaded by update.
+
+    The feed is rendered once per last_build_datetime of the show and kept
+    in feed_cache.
+    """
+
+    key = get_etag(show)
+    feed = feed_cache.get(key)
+    if feed is None:
+        feed = feed_cache.put(key, _render(show.id))
+    return feed
+
+
+def get_etag(show):
+    """Returns the entity tag of the feed, which changes as the show's
+    last_build_datetime does.
+    """
+
+    return common.fingerprint(
+        show.id, show.last_build_datetime, show.feed_page_size)
 
 
 def get_feed_url(show):
@@ -25,15 +99,231 @@ def get_feed_url(show):
         '{}/{}'.format(FEED_FOLDER_RSS, show.alias))
 
 
-def _generate(user, show):
-    """Generate the feed for the show"""
+def get_archive_url(show, page):
+    """Returns the url for the archive page of the feed."""
+
+    return urllib.parse.urljoin(
+        app.config.get('HOST_FEED'),
+        '{}/{}'.format(_get_archive_folder(show), page))
+
+
+def _update_paged(data, page_size):
+    """Uploads the newest page_size episodes as the feed and the rest as
+    archive pages, numbered from the oldest so that adding an episode only
+    changes the newest archive page. Pages no longer needed are deleted.
+    """
+
+    show = data.show
+    archived = data.episode_count - page_size
+    pages = _get_archive_page_count(archived, page_size)
+    items = _items(data)
+
+    # pages are uploaded concurrently, and all of them before stale ones
+    # are deleted
+    with upload_manager.batch() as batch:
+        uploaded = _upload(
+            data, FEED_FOLDER_RSS, show.alias,
+            (xml for _, xml in itertools.islice(items, page_size)),
+            batch=batch, links=_get_main_links(show, pages))
+
+        # items come newest first, so the newest archive page is filled
+        # first and takes whatever does not fill a page
+        for page in range(pages, 0, -1):
+            size = archived - (pages - 1) * page_size if page == pages \
+                else page_size
+            page_items = list(itertools.islice(items, size))
+            links = [('current', get_feed_url(show))]
+            if page > 1:
+                links.append(
+                    ('prev-archive', get_archive_url(show, page - 1)))
+            if page < pages:
+                links.append(
+                    ('next-archive', get_archive_url(show, page + 1)))
+            uploaded = _upload(
+                data, _get_archive_folder(show), str(page),
+                (xml for _, xml in page_items), batch=batch,
+                links=_with_first_link(show, pages, links), archive=True,
+                last_build_datetime=max(
+                    (e.update_datetime or e.create_datetime
+                     for e, _ in page_items), default=None)) or uploaded
+
+    published_file_operation.delete_except(
+        show.id, app.config.get('S3_BUCKET_FEED'), _get_archive_folder(show),
+        [str(x) for x in range(1, pages + 1)])
+    return uploaded
+
+
+def _render(show_id):
+    """Renders the feed, capped as uploaded by update if paged."""
+
+    data = _load(show_id)
+    items = (xml for _, xml in _items(data))
+    links = ()
+    page_size = data.show.feed_page_size
+    if page_size:
+        archived = data.episode_count - page_size
+        links = _get_main_links(
+            data.show, _get_archive_page_count(archived, page_size))
+        items = itertools.islice(items, page_size)
+
+    out = io.BytesIO()
+    _write(out, data, items, links=links)
+    # persist the rendered items
+    models.db.session.commit()
+    return out.getvalue()
+
+
+def _get_main_links(show, pages):
+    links = [('prev-archive', get_archive_url(show, pages))] if pages else []
+    return _with_first_link(show, pages, links)
+
+
+def _get_archive_page_count(archived, page_size):
+    """Number of archive pages needed for the archived episodes."""
+
+    return max(0, -(-archived // page_size))
+
+
+def _with_first_link(show, pages, links):
+    return [('first', get_archive_url(show, 1))] + links if pages else links
+
+
+def _get_archive_folder(show):
+    return '{}/{}'.format(FEED_FOLDER_ARCHIVE, show.alias)
+
+
+def _upload(data, folder, file_name, items, batch=None, **kwargs):
+    """Writes the feed with the items into a spooled file and uploads it
+    unless unchanged. Returns True if uploaded.
+
+    With batch, the upload is submitted to it instead of waited for. The
+    feed is then written in memory, since it is a page of a paged feed.
+    """
+
+    if batch is not None:
+        out = io.BytesIO()
+        _write(out, data, items, **kwargs)
+        return published_file_operation.upload_if_changed(
+            data.show.id, out.getvalue(), app.config.get('S3_BUCKET_FEED'),
+            file_name, folder, batch=batch, ContentType=FEED_CONTENT_TYPE)
+
+    with tempfile.SpooledTemporaryFile(max_size=FEED_SPOOL_SIZE) as feed:
+        _write(feed, data, items, **kwargs)
+        feed.seek(0)
+        return published_file_operation.upload_if_changed(
+            data.show.id, feed, app.config.get('S3_BUCKET_FEED'),
+            file_name, folder, ContentType=FEED_CONTENT_TYPE)
+
+
+def _load(show_id, snapshot=None):
+    """Loads everything the feed is built from as FeedData, taking the show
+    from the ShowSnapshot if given.
+
+    Without the snapshot, the episodes are streamed along with their cached
+    FeedItems from a single query, FEED_QUERY_BATCH_SIZE rows at a time, so
+    memory use does not depend on the number of episodes.
+    With the snapshot, whose episodes are already in memory, the cached
+    FeedItems of the show are fetched in one query.
+
+    The last build datetime of the main feed is the latest update of the
+    episodes in it, as for the archive pages, so that the feed is uploaded
+    again only if its content changes rather than whenever the show is
+    rebuilt. It is None if there is no episode, and the show's is used.
+    """
+
+    if snapshot is None:
+        user, show, show_image = show_snapshot.load_show(show_id)
+        query = episode_operation.query_public_with_media(show.id)
+        episodes = query. \
+            outerjoin(FeedItem, FeedItem.episode_id == Episode.id). \
+            add_entity(FeedItem). \
+            yield_per(FEED_QUERY_BATCH_SIZE)
+        return FeedData(user, show, show_image, episodes, query.count(),
+                        _query_last_build_datetime(query, show))
+
+    items = {x.episode_id: x for x in FeedItem.query.
+             join(Episode, FeedItem.episode_id == Episode.id).
+             filter(Episode.show_id == snapshot.show.id).
+             all()}
+    episodes = [(episode, audio, image, items.get(episode.id))
+                for episode, audio, image in snapshot.episodes]
+    newest = episodes[:snapshot.show.feed_page_size or None]
+    return FeedData(snapshot.user, snapshot.show, snapshot.show_image,
+                    episodes, len(episodes), max(
+                        (e.update_datetime or e.create_datetime
+                         for e, _, _, _ in newest), default=None))
+
+
+def _query_last_build_datetime(query, show):
+    """Returns the last build datetime of the main feed, as _load does, by
+    looking up the latest updated among the episodes of the query.
+    """
+
+    ids = query.with_entities(Episode.id)
+    if show.feed_page_size:
+        ids = ids.limit(show.feed_page_size)
+    updated = func.coalesce(Episode.update_datetime, Episode.create_datetime)
+    latest = Episode.query. \
+        filter(Episode.id.in_(ids.subquery())). \
+        order_by(updated.desc()). \
+        first()
+    return latest and (latest.update_datetime or latest.create_datetime)
+
+
+def _generate(data):
+    """Generate the feed for the show from the loaded FeedData"""
+
+    out = io.BytesIO()
+    _write(out, data, (xml for _, xml in _items(data)))
+    return out.getvalue()
+
+
+def _write(out, data, items, links=(), archive=False,
+           last_build_datetime=None):
+    """Writes the feed into the binary file object, one item at a time.
+
+    items: rendered items as bytes, see _items
+    links: sequence of (rel, href) added to the channel as atom:link
+    archive: whether to mark the feed as an archive document (RFC 5005)
+    last_build_datetime: defaults to the one of the main feed, see _load
+
+    The channel is rendered every time. Without links, the output is byte
+    for byte what FeedGenerator.rss_str(pretty=True) produces. Only one item
+    is held at a time, so memory use does not depend on the number of
+    episodes as long as items are streamed, see _load.
+    """
+
+    feed = _channel(data, last_build_datetime).rss_str(pretty=True)
+    i = feed.rindex(CHANNEL_CLOSE)
+    out.write(feed[:i])
+
+    elements = []
+    if archive:
+        elements.append(etree.Element(
+            '{%s}archive' % HISTORY_NS, nsmap={'fh': HISTORY_NS}))
+    for rel, href in links:
+        elements.append(
+            etree.Element('{%s}link' % ATOM_NS, href=href, rel=rel))
+    if elements:
+        out.write(_serialize_in_channel(*elements))
+
+    for item in items:
+        out.write(item)
+    out.write(feed[i:])
+
+
+def _channel(data, last_build_datetime=None):
+    """Returns FeedGenerator holding the channel, without any entry."""
+
+    user, show = data.user, data.show
 
     fg = FeedGenerator()
     fg.title(show.title)
     fg.description(show.description)
     fg.link(href=show.url)
     fg.language(show.language)
-    fg.lastBuildDate(show.last_build_datetime)
+    fg.lastBuildDate(last_build_datetime or data.last_build_datetime or
+                     show.last_build_datetime)
 
     fg.load_extension('podcast')
     fg.podcast.itunes_author(show.author)
@@ -42,31 +332,98 @@ def _generate(user, show):
     fg.podcast.itunes_owner(name=user.name, email=user.email)
     fg.podcast.itunes_subtitle(show.subtitle)
     fg.podcast.itunes_summary(show.description)
-    if show.image_id is not None:
-        image = image_operation.get_model(show.image_id)
-        fg.podcast.itunes_image(image_operation.get_image_url(user, image))
-
-    for episode in episode_operation.load_public(show.id):
-        audio = audio_operation.get(episode.audio_id)
-        fe = fg.add_entry()
-        fe.title(episode.title)
-        fe.link(href=episode_operation.get_episode_url(episode, show))
-        fe.description(common.clean_html(episode.description))
-        fe.enclosure(url=audio_operation.get_audio_url(user, audio),
-                     length=str(audio.length), type=audio.type)
-        fe.guid(episode.guid)
-        fe.pubdate(episode.update_datetime or episode.create_datetime)
-
-        fe.podcast.itunes_author(show.author)
-        fe.podcast.itunes_duration(_format_seconds(audio.duration))
-        fe.podcast.itunes_explicit('yes' if episode.explicit else 'no')
-        fe.podcast.itunes_subtitle(episode.subtitle)
-        if episode.image_id is not None:
-            image_episode = image_operation.get_model(episode.image_id)
-            fe.podcast.itunes_image(
-                image_operation.get_image_url(user, image_episode))
-
-    return fg.rss_str(pretty=True)
+    if data.show_image is not None:
+        fg.podcast.itunes_image(
+            image_operation.get_image_url(user, data.show_image))
+    return fg
+
+
+def _items(data):
+    """Yields (episode, rendered item as bytes) of the public episodes,
+    newest first.
+
+    Each item is taken from the FeedItem cache as long as its fingerprint is
+    unchanged, otherwise it is rendered and the cache is updated in the
+    session. Committing is up to the caller.
+    """
+
+    rendered = 0
+    for episode, audio, image, item in data.episodes:
+        fingerprint = _item_fingerprint(data, episode, audio, image)
+        if item is None:
+            item = FeedItem(episode.id)
+            models.db.session.add(item)
+        if item.fingerprint != fingerprint:
+            item.xml = _render_item(
+                data, episode, audio, image).decode('utf-8')
+            item.fingerprint = fingerprint
+            rendered += 1
+            # keep the session from holding every changed item
+            if rendered % FEED_ITEM_FLUSH_SIZE == 0:
+                models.db.session.flush()
+        yield episode, item.xml.encode('utf-8')
+
+
+def _render_item(data, episode, audio, image):
+    """Renders the item for the episode, indented as in the whole feed."""
+
+    user, show = data.user, data.show
+
+    fe = FeedEntry()
+    fe.load_extension('podcast')
+    fe.title(episode.title)
+    fe.link(href=episode_operation.get_episode_url(episode, show))
+    fe.description(episode_operation.get_description_html(episode))
+    fe.enclosure(url=audio_operation.get_audio_url(user, audio),
+                 length=str(audio.length), type=audio.type)
+    fe.guid(episode.guid)
+    fe.pubdate(episode.update_datetime or episode.create_datetime)
+
+    fe.podcast.itunes_author(show.author)
+    fe.podcast.itunes_duration(_format_seconds(audio.duration))
+    fe.podcast.itunes_explicit('yes' if episode.explicit else 'no')
+    fe.podcast.itunes_subtitle(episode.subtitle)
+    if image is not None:
+        fe.podcast.itunes_image(image_operation.get_image_url(user, image))
+
+    return _serialize_in_channel(fe.rss_entry())
+
+
+def _serialize_in_channel(*elements):
+    """Serializes the elements as children of the channel, so that the
+    result is byte for byte what FeedGenerator.rss_str(pretty=True) produces
+    for them. Only the namespaces declared by FeedGenerator are omitted.
+    """
+
+    rss = etree.Element('rss', nsmap={'itunes': ITUNES_NS, 'atom': ATOM_NS})
+    channel = etree.SubElement(rss, 'channel')
+    for element in elements:
+        channel.append(element)
+    s = etree.tostring(rss, pretty_print=True, encoding='UTF-8')
+    return s[s.index(CHANNEL_OPEN) + len(CHANNEL_OPEN):s.rindex(CHANNEL_CLOSE)]
+
+
+def _item_fingerprint(data, episode, audio, image):
+    return common.fingerprint(
+        FEED_ITEM_VERSION,
+        app.config.get('HOST_SITE'),
+        app.config.get('HOST_AUDIO'),
+        app.config.get('HOST_IMAGE'),
+        data.user.identity_id,
+        data.show.alias,
+        data.show.author,
+        episode.id,
+        episode.alias,
+        episode.title,
+        episode.subtitle,
+        episode.description,
+        episode.explicit,
+        episode.guid,
+        episode.update_datetime,
+        episode.create_datetime,
+        (audio.id, audio.owner_user_id, audio.guid, audio.length,
+         audio.type, audio.duration),
+        (image.id, image.guid) if image is not None else None)
 
 
 def _format_seconds(sec):
@@ -0,0 +1,160 @@
+"""Sanitizers of user supplied HTML, e.g. episode descriptions.
+
+Both backends enforce the bleach policy, with br allowed in addition:
+disallowed tags are escaped into text, comments are dropped, and only the
+allowed attributes, with acceptable protocols for urls, are kept.
+
+clean: the backend given by HTML_SANITIZER, bleach unless opted in to lxml
+clean_bleach: bleach on html5lib, the reference
+clean_lxml: tags are tokenized and checked against the policy with regular
+expressions, and the remaining markup is parsed by lxml's C parser, which
+also fixes its nesting. It gives the same result as bleach for well-formed
+markup at several times the speed. For badly nested allowed tags the trees
+built by libxml2 and html5lib may differ, e.g. html5lib reopens formatting
+tags closed out of order while libxml2 drops them, but the output is equally
+safe.
+"""
+import html
+import re
+from xml.sax.saxutils import escape, unescape
+import bleach
+import bleach.sanitizer
+import lxml.html
+from highland import app
+
+ALLOWED_TAGS = bleach.ALLOWED_TAGS + ['br']
+ALLOWED_ATTRIBUTES = bleach.ALLOWED_ATTRIBUTES
+ALLOWED_PROTOCOLS = bleach.sanitizer.PROTOS
+URI_ATTRIBUTES = bleach.sanitizer.BleachSanitizerMixin.attr_val_is_uri
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'command', 'embed', 'hr',
+                       'img', 'input', 'keygen', 'link', 'meta', 'param',
+                       'source', 'track', 'wbr'])
+
+_ATTRIBUTE = r'''[^\s/>][^\s/>=]*(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>"']*))?'''
+# comments, other markup declarations, tags, and unterminated tags at the
+# end, which html5lib drops
+_MARKUP = re.compile(
+    r'<!--.*?(?:--!?>|\Z)'
+    r'|<(/?)([a-zA-Z][^\s/>]*)'
+    r'((?:[\s/]+' + _ATTRIBUTE + r'|(?<=["\'])' + _ATTRIBUTE + r')*)'
+    r'[\s/]*?(/?)>'
+    r'|</?[a-zA-Z].*\Z'
+    r'|<[!?][^>]*>?|</[^a-zA-Z>][^>]*>?|</>', re.S)
+_ATTRIBUTES = re.compile(
+    r'''([^\s/>][^\s/>=]*)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']*)))?''')
+_URI_IGNORED = re.compile('[`\000-\040\177-\240\\s]+')
+_URI_SCHEME = re.compile(r'^[a-z0-9][-+.a-z0-9]*:')
+
+
+def clean(s):
+    backend = app.config.get('HTML_SANITIZER') or 'bleach'
+    return BACKENDS[backend](s)
+
+
+def clean_bleach(s):
+    return bleach.clean(s, tags=ALLOWED_TAGS)
+
+
+def clean_lxml(s):
+    if not s:
+        return ''
+    s = s.replace('\r\n', '\n').replace('\r', '\n').replace('\x00', '')
+
+    markup, position = [], 0
+    for m in _MARKUP.finditer(s):
+        markup.append(escape(html.unescape(s[position:m.start()])))
+        markup.append(_sanitize_tag(m))
+        position = m.end()
+    markup.append(escape(html.unescape(s[position:])))
+
+    # an explicit parent, as libxml2 drops the leading blanks of a fragment
+    root = lxml.html.fragment_fromstring(
+        '<div>{}</div>'.format(''.join(markup)))
+    out = [escape(root.text or '')]
+    for child in root:
+        _serialize(child, out)
+    return ''.join(out)
+
+
+BACKENDS = {'bleach': clean_bleach, 'lxml': clean_lxml}
+
+
+def _sanitize_tag(m):
+    """Returns the markup to parse for the tag in the match. Allowed tags
+    are kept with the allowed attributes, and the others are escaped as
+    bleach does.
+    """
+
+    end, name, attributes, self_closing = m.groups()
+    if name is None:
+        # comments and the like
+        return ''
+    name = name.lower()
+    attributes = _parse_attributes(attributes)
+
+    if name not in ALLOWED_TAGS:
+        if end:
+            text = '</{}>'.format(name)
+        else:
+            text = '<{}{}>'.format(name, ''.join(
+                ' {}="{}"'.format(k, escape(v)) for k, v in attributes))
+        if self_closing:
+            text = text[:-1] + '/>'
+        return escape(text)
+
+    if end:
+        # </br> is taken for <br> as html5lib does
+        return '<br>' if name == 'br' else '</{}>'.format(name)
+    allowed = ALLOWED_ATTRIBUTES.get(name, [])
+    kept = {}
+    for k, v in reversed(attributes):
+        if k in allowed:
+            kept[k] = v
+    for k in [x for x in kept if x in URI_ATTRIBUTES]:
+        uri = _URI_IGNORED.sub('', unescape(kept[k])).lower() \
+            .replace('\ufffd', '')
+        if _URI_SCHEME.match(uri) and \
+                uri.split(':')[0] not in ALLOWED_PROTOCOLS:
+            del kept[k]
+    return '<{}{}>'.format(name, ''.join(
+        ' {}="{}"'.format(k, html.escape(v)) for k, v in kept.items()))
+
+
+def _parse_attributes(attributes):
+    """Returns [(name, value)] of the attributes in the source order, with
+    names lowercased and character references in values resolved.
+    """
+
+    result = []
+    for name, double, single, unquoted in _ATTRIBUTES.findall(attributes):
+        value = double or single or unquoted
+        result.append((name.lower(), html.unescape(value)))
+    return result
+
+
+def _serialize(element, out):
+    """Serializes the element parsed from the sanitized markup as html5lib
+    does for bleach
+    """
+
+    tag = element.tag
+    allowed = tag in ALLOWED_TAGS
+    if allowed:
+        out.append('<{}{}>'.format(tag, ''.join(
+            ' {}={}'.format(k, _quote_attribute(v))
+            for k, v in sorted(element.attrib.items()))))
+    if element.text:
+        out.append(escape(element.text))
+    for child in element:
+        _serialize(child, out)
+    if allowed and tag not in VOID_TAGS:
+        out.append('</{}>'.format(tag))
+    if element.tail:
+        out.append(escape(element.tail))
+
+
+def _quote_attribute(value):
+    value = value.replace('&', '&amp;')
+    if '"' in value and "'" not in value:
+        return "'{}'".format(value)
+    return '"{}"'.format(value.replace('"', '&quot;'))
@@ -0,0 +1,81 @@
+"""JSON documents of the public site, for players and apps.
+
+The show is published as a JSON Feed (https://jsonfeed.org/version/1.1) at
+<show alias>/feed.json, and each episode as its feed item along with the
+show at <show alias>/episode-json/<episode alias>.json.
+"""
+import json
+
+VERSION = 'https://jsonfeed.org/version/1.1'
+FEED_FILE_NAME = 'feed.json'
+# episode documents have a folder of their own, so that no episode alias,
+# e.g. 'feed', takes the key of the feed. the hyphen keeps the folder apart
+# from episode aliases
+EPISODE_FOLDER = 'episode-json'
+FEED_CONTENT_TYPE = 'application/feed+json; charset=utf-8'
+EPISODE_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+
+def get_episode_file_name(episode):
+    """Returns the file name of the episode document, relative to the show
+    """
+
+    return '{}/{}.json'.format(EPISODE_FOLDER, episode.alias)
+
+
+def get_item(episode, audio, description_html, context):
+    """Returns the feed item of the episode as dict. context is the one of
+    the episode page, giving the urls.
+    """
+
+    item = {
+        'id': episode.guid,
+        'url': context['url'],
+        'title': episode.title,
+        'summary': episode.subtitle,
+        'content_html': description_html,
+        'date_published': episode.published_datetime.isoformat()
+    }
+    if context['image_url']:
+        item['image'] = context['image_url']
+    if audio:
+        item['attachments'] = [{
+            'url': context['audio_url'],
+            'mime_type': audio.type,
+            'size_in_bytes': audio.length,
+            'duration_in_seconds': audio.duration
+        }]
+    return item
+
+
+def render_feed(show, home_url, icon_url, items):
+    """Returns the JSON Feed of the show with the items, newest first"""
+
+    feed = _get_show(show, home_url, icon_url)
+    feed.update(version=VERSION, items=items)
+    return _dumps(feed)
+
+
+def render_episode(show, home_url, icon_url, item):
+    """Returns the document of the episode, the item with the show"""
+
+    return _dumps(dict(item, show=_get_show(show, home_url, icon_url)))
+
+
+def _get_show(show, home_url, icon_url):
+    result = {
+        'title': show.title,
+        'description': show.description,
+        'home_page_url': home_url,
+        'feed_url': '{}/{}'.format(home_url, FEED_FILE_NAME),
+        'language': show.language,
+        'authors': [{'name': show.author}]
+    }
+    if icon_url:
+        result['icon'] = icon_url
+    return result
+
+
+def _dumps(document):
+    return json.dumps(document, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':'))
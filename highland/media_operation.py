@@ -1,10 +1,35 @@
-from highland import app, media_storage
+from highland import app, cache, media_storage
 from highland.common import verify_ownership
 from highland.models import db, User
 
+# audios and images looked up by id for the previews, which are requested on
+# every edit. entries are dropped as the media are deleted
+preview_cache = cache.TTLCache(
+    app.config.get('PREVIEW_CACHE_ENTRIES', 256),
+    app.config.get('PREVIEW_CACHE_SECONDS', 30))
+
+
+def get_for_preview(model_class, media_id, get):
+    """Returns the media by get(media_id), or None if no media_id. It is
+    kept detached in preview_cache, having its columns loaded, until it
+    expires or the media is deleted.
+    """
+
+    if not media_id:
+        return None
+    key = _get_preview_key(model_class, media_id)
+    media = preview_cache.get(key)
+    if media is None:
+        media = get(media_id)
+        db.session.expunge(media)
+        preview_cache.put(key, media)
+    return media
+
 
 def delete(user_id, media_ids, model_class, get_key, bucket):
-    """Deletes media objects both from database and file storage
+    """Deletes media objects both from database and file storage. The
+    objects are deleted from the storage in bulk, and only the media whose
+    objects are deleted are deleted from the database and preview_cache.
 
     get_key: function of (user, media)
     that returns the string to be used as the key in the storage
@@ -20,14 +45,19 @@ def delete(user_id, media_ids, model_class, get_key, bucket):
     for media, user in targets:
         verify_ownership(user_id, media)
 
-    for media, user in targets:
-        try:
-            media_storage.delete(get_key(user, media), bucket)
-        except:
+    keys = [get_key(user, media) for media, user in targets]
+    errors = media_storage.delete_many(bucket, keys)
+    for key, (media, user) in zip(keys, targets):
+        if key in errors:
             app.logger.error(
-                'Failed to delete media:({},{})'.format(
-                    user.id, media.id), exc_info=1)
+                'Failed to delete media:({},{}). {}'.format(
+                    user.id, media.id, errors[key]))
         else:
             db.session.delete(media)
+            preview_cache.pop(_get_preview_key(model_class, media.id))
     db.session.commit()
     return True
+
+
+def _get_preview_key(model_class, media_id):
+    return model_class.__name__, str(media_id)
@@ -1,20 +1,212 @@
+import gzip
+import hashlib
+import io
 import os
-from highland.aws_resources import s3
+import shutil
+import tempfile
+from highland import app, aws_resources, storage_backend
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_GZIP = 'gzip'
+ENCODING_BROTLI = 'br'
+COMPRESS_CHUNK_SIZE = 64 * 1024
+# compressed size up to which it is kept in memory rather than a file
+COMPRESS_SPOOL_SIZE = 1024 * 1024
+
+_backend = None
+
+
+def get_backend():
+    """Returns the backend given by STORAGE_BACKEND, created on first use"""
+
+    global _backend
+    if _backend is None:
+        _backend = create_backend(app.config.get('STORAGE_BACKEND') or 's3')
+    return _backend
+
+
+def set_backend(backend):
+    """Replaces the backend, e.g. with a MemoryStorage. None to have it
+    created again from the settings.
+    """
+
+    global _backend
+    _backend = backend
+
+
+def create_backend(name):
+    if name == 's3':
+        return storage_backend.S3Storage(aws_resources.s3)
+    if name == 'local':
+        return storage_backend.LocalStorage(
+            app.config.get('STORAGE_LOCAL_DIR') or 'storage')
+    if name == 'memory':
+        return storage_backend.MemoryStorage()
+    raise ValueError('unknown storage backend:{}'.format(name))
 
 
 def upload(file_data, bucket, file_name=None, folder='', **kwargs):
+    """Uploads the file_data, given as str, bytes or a file object.
+
+    If compression is configured for the bucket in UPLOAD_COMPRESSION,
+    the content is uploaded compressed with Content-Encoding set.
+    """
     file_name = file_name or file_data.filename
     key_name = os.path.join(folder, file_name)
-    s3.Bucket(bucket).\
-        put_object(Key=key_name, Body=file_data, ACL='public-read', **kwargs)
+    encoding, level = _get_compression(bucket)
+    if not encoding:
+        get_backend().put(bucket, key_name, file_data, **kwargs)
+        return
+
+    body = compress(file_data, encoding, level)
+    try:
+        get_backend().put(bucket, key_name, body,
+                          ContentEncoding=encoding, **kwargs)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+def upload_stream(stream, bucket, file_name, folder='', **kwargs):
+    """Uploads the binary stream as it is read, without holding it in whole.
+    Returns the number of bytes uploaded and their sha256 hex digest.
+
+    The stream is not compressed, even if UPLOAD_COMPRESSION is configured
+    for the bucket.
+    """
+
+    reader = _DigestReader(stream)
+    get_backend().put_stream(
+        bucket, os.path.join(folder, file_name), reader, **kwargs)
+    return reader.length, reader.digest.hexdigest()
+
+
+def start_multipart_upload(bucket, key, **kwargs):
+    """Starts a multipart upload whose parts the client uploads to the urls
+    of get_part_urls. Returns the id of the upload. Only the S3 backend
+    supports it.
+    """
+
+    return get_backend().create_multipart_upload(bucket, key, **kwargs)
+
+
+def get_part_urls(bucket, key, upload_id, part_numbers, expires):
+    """Returns the urls to upload the parts to by part number"""
+
+    backend = get_backend()
+    return {x: backend.get_part_url(bucket, key, upload_id, x, expires)
+            for x in part_numbers}
+
+
+def complete_multipart_upload(bucket, key, upload_id, parts):
+    """Completes the upload with the parts given as (number, etag)"""
+
+    get_backend().complete_multipart_upload(bucket, key, upload_id, parts)
+
+
+def abort_multipart_upload(bucket, key, upload_id):
+    get_backend().abort_multipart_upload(bucket, key, upload_id)
 
 
 def delete(filename, bucket, folder=''):
     key_name = os.path.join(folder, filename)
-    s3.Object(bucket, key_name).delete()
+    get_backend().delete(bucket, key_name)
+
+
+def exists(bucket, key):
+    """Returns whether the object of the key is stored"""
+
+    return get_backend().exists(bucket, key)
+
+
+def list_keys(bucket, folder):
+    """Returns the keys of the objects under the folder"""
+
+    return get_backend().list_keys(bucket, '{}/'.format(folder))
+
+
+def delete_many(bucket, keys):
+    """Deletes the objects of the keys, up to 1000 of them per request on
+    S3. Returns the error message by key of the objects failed
+    to delete, which the other deletions do not wait for.
+    """
+
+    keys = list(keys)
+    if not keys:
+        return {}
+    errors = get_backend().delete_many(bucket, keys)
+    for key, message in sorted(errors.items()):
+        app.logger.warning(
+            'Failed to delete {} in {}. {}'.format(key, bucket, message))
+    return errors
 
 
 def delete_folder(bucket, folder):
-    bucket = s3.Bucket(bucket)
-    for obj in bucket.objects.filter(Prefix='{}/'.format(folder)):
-        s3.Object(bucket.name, obj.key).delete()
+    """Deletes the objects under the folder. Returns the errors as
+    delete_many does.
+    """
+
+    return delete_many(bucket, list_keys(bucket, folder))
+
+
+def compress(file_data, encoding, level=None):
+    """Compresses the file_data, given as str, bytes or a binary file object,
+    with the encoding, either 'gzip' or 'br'.
+
+    Returns bytes for str or bytes, and a file object positioned at the
+    beginning for a file object, which is compressed in chunks.
+    """
+    if isinstance(file_data, str):
+        file_data = file_data.encode('utf-8')
+    if isinstance(file_data, bytes):
+        with compress(io.BytesIO(file_data), encoding, level) as out:
+            return out.read()
+
+    out = tempfile.SpooledTemporaryFile(max_size=COMPRESS_SPOOL_SIZE)
+    if encoding == ENCODING_GZIP:
+        # fixed mtime so that the same content compresses to the same bytes
+        with gzip.GzipFile(fileobj=out, mode='wb', mtime=0,
+                           compresslevel=9 if level is None else level) as f:
+            shutil.copyfileobj(file_data, f, COMPRESS_CHUNK_SIZE)
+    elif encoding == ENCODING_BROTLI:
+        if brotli is None:
+            raise ValueError('brotli is not installed')
+        compressor = brotli.Compressor(quality=11 if level is None else level)
+        for chunk in iter(lambda: file_data.read(COMPRESS_CHUNK_SIZE), b''):
+            out.write(compressor.process(chunk))
+        out.write(compressor.finish())
+    else:
+        raise ValueError('unknown encoding:{}'.format(encoding))
+    out.seek(0)
+    return out
+
+
+def _get_compression(bucket):
+    """Returns (encoding, level) configured for the bucket.
+    UPLOAD_COMPRESSION maps the config key of the bucket, e.g.
+    'S3_BUCKET_FEED', to either of those.
+    """
+    for key, (encoding, level) in \
+            (app.config.get('UPLOAD_COMPRESSION') or {}).items():
+        if app.config.get(key) == bucket:
+            return encoding, level
+    return None, None
+
+
+class _DigestReader:
+    """Binary stream counting and hashing what is read through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.length = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.length += len(data)
+        self.digest.update(data)
+        return data
@@ -21,6 +21,8 @@ db = SQLAlchemy(app)
 class Show(ModelMappingMixin, db.Model):
     """last_build_datetime: when the last public change under the show was made
     update_datetime: when the last change to the show entity was made
+    feed_page_size: number of the newest episodes in the feed. the older
+    ones go to archive pages. no cap if not set
     """
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100))
@@ -33,6 +35,7 @@ class Show(ModelMappingMixin, db.Model):
     image_id = db.Column(db.Integer, db.ForeignKey('image.id'))
     alias = db.Column(db.String(100), unique=True)
     owner_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    feed_page_size = db.Column(db.Integer())
     last_build_datetime = db.Column(
         db.DateTime(timezone=True),
         default=lambda x: datetime.datetime.now(datetime.timezone.utc))
@@ -58,6 +61,9 @@ class Show(ModelMappingMixin, db.Model):
 
 
 class Episode(ModelMappingMixin, db.Model):
+    """description_html: description sanitized for rendering, refreshed
+    whenever the episode is written
+    """
     class DraftStatus(enum.Enum):
         draft = 'draft'
         scheduled = 'scheduled'
@@ -67,6 +73,7 @@ class Episode(ModelMappingMixin, db.Model):
     title = db.Column(db.String(100))
     subtitle = db.Column(db.String(200))
     description = db.Column(db.Text())
+    description_html = db.Column(db.Text())
     audio_id = db.Column(db.Integer, db.ForeignKey('audio.id'))
     image_id = db.Column(db.Integer, db.ForeignKey('image.id'))
     draft_status = db.Column(db.Enum(DraftStatus.draft.name,
@@ -111,13 +118,17 @@ class Episode(ModelMappingMixin, db.Model):
 class Audio(ModelMappingMixin, db.Model):
     """duration: in seconds
     length: in bytes
+    checksum: sha256 of the file if it was ingested through the server.
+    None if the client uploaded the file to the storage directly, in one
+    piece or in parts, since the server never reads the content then
     """
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(200))
     duration = db.Column(db.Integer())
-    length = db.Column(db.Integer())
+    length = db.Column(db.BigInteger())
     type = db.Column(db.String(30))
     guid = db.Column(db.String(32))
+    checksum = db.Column(db.String(64), nullable=True)
     owner_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     create_datetime = db.Column(
         db.DateTime(timezone=True),
@@ -149,6 +160,120 @@ class Image(ModelMappingMixin, db.Model):
         self.type = type
 
 
+class MultipartUpload(ModelMappingMixin, db.Model):
+    """Audio file being uploaded in parts by the client, which becomes the
+    audio of the guid once completed.
+    upload_id: id of the multipart upload given by the storage
+    part_size: bytes of each part but the last
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    upload_id = db.Column(db.String(200))
+    filename = db.Column(db.String(200))
+    duration = db.Column(db.Integer())
+    length = db.Column(db.BigInteger())
+    type = db.Column(db.String(30))
+    guid = db.Column(db.String(32))
+    part_size = db.Column(db.Integer())
+    owner_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    create_datetime = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda x: datetime.datetime.now(datetime.timezone.utc))
+
+    def __init__(self, user_id, filename, duration, length, type, guid,
+                 part_size):
+        self.owner_user_id = user_id
+        self.filename = filename
+        self.duration = duration
+        self.length = length
+        self.type = type
+        self.guid = guid
+        self.part_size = part_size
+
+
+class MultipartUploadPart(db.Model):
+    """Part of a MultipartUpload the client has uploaded.
+    etag: as returned by the storage for the part, needed to complete
+    """
+    multipart_upload_id = db.Column(
+        db.Integer, db.ForeignKey('multipart_upload.id', ondelete='CASCADE'),
+        primary_key=True)
+    part_number = db.Column(db.Integer, primary_key=True)
+    etag = db.Column(db.String(100))
+
+    def __init__(self, multipart_upload_id, part_number, etag):
+        self.multipart_upload_id = multipart_upload_id
+        self.part_number = part_number
+        self.etag = etag
+
+
+class FeedItem(db.Model):
+    """Rendered <item> of an episode in the feed.
+    fingerprint: digest of every value the item is rendered from
+    xml: the item as it appears in the pretty printed feed
+    """
+    episode_id = db.Column(
+        db.Integer, db.ForeignKey('episode.id', ondelete='CASCADE'),
+        primary_key=True)
+    fingerprint = db.Column(db.String(40))
+    xml = db.Column(db.Text())
+    update_datetime = db.Column(
+        db.DateTime(timezone=True),
+        onupdate=lambda x: datetime.datetime.now(datetime.timezone.utc))
+    create_datetime = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda x: datetime.datetime.now(datetime.timezone.utc))
+
+    def __init__(self, episode_id):
+        self.episode_id = episode_id
+
+
+class PublishedFile(db.Model):
+    """File uploaded to the public storage on behalf of the show.
+    digest: sha1 of the content last uploaded to the key
+    fingerprint: digest of the inputs the content was rendered from, if
+    tracked, so that it is rendered again only when they change
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    show_id = db.Column(
+        db.Integer, db.ForeignKey('show.id', ondelete='CASCADE'), index=True)
+    bucket = db.Column(db.String(100))
+    key = db.Column(db.String(300))
+    digest = db.Column(db.String(40))
+    fingerprint = db.Column(db.String(40))
+    update_datetime = db.Column(
+        db.DateTime(timezone=True),
+        onupdate=lambda x: datetime.datetime.now(datetime.timezone.utc))
+    create_datetime = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda x: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'key'),
+    )
+
+    def __init__(self, show_id, bucket, key):
+        self.show_id = show_id
+        self.bucket = bucket
+        self.key = key
+
+
+class RebuildRequest(db.Model):
+    """Pending request to rebuild the public pages and the feed of a show.
+    episode_id: episode whose page is to be rebuilt as well, if any
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    show_id = db.Column(
+        db.Integer, db.ForeignKey('show.id', ondelete='CASCADE'), index=True)
+    episode_id = db.Column(db.Integer)
+    create_datetime = db.Column(
+        db.DateTime(timezone=True),
+        default=lambda x: datetime.datetime.now(datetime.timezone.utc))
+
+    def __init__(self, show_id, episode_id=None):
+        self.show_id = show_id
+        self.episode_id = episode_id
+
+
 class User(ModelMappingMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True)
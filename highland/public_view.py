@@ -1,44 +1,346 @@
-from flask import render_template, Markup
-from highland import show_operation, episode_operation, media_storage, \
-    app, audio_operation, feed_operation, image_operation, common
+import os
+from jinja2 import Markup
+from highland import episode_operation, media_storage, app, \
+    audio_operation, feed_operation, image_operation, common, models, \
+    published_file_operation, show_snapshot, site_template, cache, \
+    json_feed, upload_manager, media_operation
+from highland.models import Audio, Image
+
+
+# fields of the models rendered on the pages. a page is rendered again
+# only when any of them, or anything else it is rendered from, changes
+BASE_SHOW_FIELDS = ('title', 'author', 'description', 'alias')
+INDEX_SHOW_FIELDS = BASE_SHOW_FIELDS + ('subtitle',)
+INDEX_EPISODE_FIELDS = ('title', 'alias', 'published_datetime')
+EPISODE_FIELDS = ('title', 'subtitle', 'description', 'alias',
+                  'published_datetime')
+# archive pages of the index are at <show alias>/page-<number>. the hyphen
+# keeps them apart from episode aliases
+INDEX_PAGE_PREFIX = 'page-'
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+
+_template_versions = {}
+
+# rendered previews by show id and the previewed values, kept for a while as
+# previews are requested on every edit
+preview_cache = cache.TTLCache(
+    app.config.get('PREVIEW_CACHE_ENTRIES', 256),
+    app.config.get('PREVIEW_CACHE_SECONDS', 30))
 
 
 def update_full(user, show_id):
-    show = show_operation.get_model(show_id)
-    show_image = \
-        image_operation.get_model(show.image_id) if show.image_id else None
-    episodes = episode_operation.load_public(show_id)
-    show_html(user, show, show_image)
-    _delete_all_episodes(user, show)
-    for episode in episodes:
-        episode_html(user, show, show_image, episode)
+    """Rebuilds the public site of the show by sync. The pages are rendered
+    on behalf of the owner of the show, whoever the user is.
+    """
+
+    sync(show_id)
     return True
 
 
-def show_html(user, show, show_image, upload=True):
-    episodes = episode_operation.load_public(show.id)
-    image_url = image_operation.get_image_url(user, show_image) \
-        if show_image else ''
-    html = render_template(
-        'public_sites/index.html',
-        title=show.title,
-        show=show,
-        url=show.url,
-        home_url=_get_site_url(show.alias),
-        feed_url=feed_operation.get_feed_url(show),
-        image_url=image_url,
-        episodes=episodes)
-    if upload:
-        media_storage.upload(html, app.config.get('S3_BUCKET_SITES'), show.alias,
-                             ContentType='text/html; charset=utf-8')
+def update(snapshot, episode_ids=()):
+    """Publishes the index and the pages of the given episodes from the
+    ShowSnapshot, skipping the ones whose inputs are unchanged.
+
+    The pages are uploaded concurrently, and stale archive pages of the
+    index are deleted once all of them are uploaded. The records of the
+    uploads are updated in the session. Committing is up to the caller.
+    """
+
+    published = published_file_operation.load_by_key(
+        snapshot.show.id, app.config.get('S3_BUCKET_SITES'))
+    with upload_manager.batch() as batch:
+        for episode, audio, image in snapshot.episodes:
+            if episode.id in episode_ids:
+                episode_html(snapshot, episode, audio, image,
+                             published=published, batch=batch)
+        pages = _publish_index(snapshot, published, batch=batch)
+    _delete_index_pages_except(snapshot.show, published, pages)
+    return pages.get(snapshot.show.alias)
+
+
+def sync(show_id, snapshot=None):
+    """Brings the public site of the show up to date with the least I/O,
+    rendering from the ShowSnapshot if given.
+
+    The keys under the show are listed first, and the index, which is not
+    under it, is looked up on its own. The index, its archive pages and the
+    episode pages are uploaded only when new, missing from the storage or
+    changed in their inputs since they were last uploaded. Pages under the
+    show that belong to neither the index, any public episode nor the
+    preview are deleted at the end, after every upload succeeded, so that no
+    page is missing in between.
+
+    The JSON documents of the show and the episodes are published along
+    with the pages, and counted among them.
+
+    Returns the number of pages uploaded, unchanged and deleted as dict.
+    """
+
+    snapshot = snapshot or show_snapshot.load(show_id)
+    user, show, show_image, episodes = snapshot
+    bucket = app.config.get('S3_BUCKET_SITES')
+    prefix = _get_page_key('', show.alias)
+    listed = set(media_storage.list_keys(bucket, show.alias))
+    published = published_file_operation.load_by_key(show.id, bucket)
+    # pages missing from the storage are uploaded again. the index is at the
+    # key of the folder itself, out of the listing
+    for key, x in published.items():
+        if key.startswith(prefix) and key not in listed or \
+                key == show.alias and not media_storage.exists(bucket, key):
+            x.fingerprint = None
+    contexts = [_get_episode_context(user, show, show_image, *x)
+                for x in episodes]
+    items = [_get_json_item(x, audio, context)
+             for (x, audio, _), context in zip(episodes, contexts)]
+    # pages are rendered here and uploaded concurrently, each episode page
+    # along with its JSON document. the uploaded ones are recorded even if
+    # some others failed
+    with upload_manager.batch() as batch:
+        pages = _publish_index(snapshot, published, items, batch)
+        for (episode, _, _), context, item in zip(episodes, contexts, items):
+            _publish_page(
+                show, episode.alias, show.alias,
+                _get_episode_fingerprint(show, episode, context),
+                lambda: _render_episode(show, episode, context), published,
+                batch=batch)
+            _publish_json(
+                show, json_feed.get_episode_file_name(episode),
+                _render_episode_json(user, show, show_image, item),
+                json_feed.EPISODE_CONTENT_TYPE, published, batch)
+        uploads = batch.wait()
+    error = next((x.error for x in uploads if x.error is not None), None)
+    published = {k: v for k, v in published.items() if k.startswith(prefix)}
+
+    deleted = []
+    if error is None:
+        # the preview is uploaded apart from the site, see preview_episode
+        expected = set(pages) | {_get_page_key(
+            episode_operation.PREVIEW_ALIAS, show.alias)}
+        for episode, _, _ in episodes:
+            expected.add(_get_page_key(episode.alias, show.alias))
+            expected.add(_get_page_key(
+                json_feed.get_episode_file_name(episode), show.alias))
+        stale = sorted((listed | set(published)) - expected)
+        errors = media_storage.delete_many(bucket, stale)
+        for key in (x for x in stale if x not in errors):
+            if key in published:
+                models.db.session.delete(published[key])
+            deleted.append(key)
+    models.db.session.commit()
+    if error is not None:
+        raise error
+
+    result = {
+        'uploaded': len(uploads),
+        'unchanged': len(episodes) * 2 + len(pages) - len(uploads),
+        'deleted': len(deleted)
+    }
+    app.logger.info('site of show:{} synced. {}'.format(show.id, result))
+    return result
+
+
+def show_html(snapshot, upload=True, published=None):
+    """Renders the index page of the show from the ShowSnapshot, and uploads
+    it along with its archive pages if upload is set.
+
+    With SITE_INDEX_PAGE_SIZE set, the index lists that many newest
+    episodes, and the older ones go to archive pages numbered from the
+    oldest, so that publishing an episode changes few of them.
+
+    The JSON Feed of the show is uploaded along with the index.
+
+    When uploading, each page is skipped without rendering if its inputs
+    are unchanged since it was last uploaded, and None is returned if the
+    index is. published maps the keys of the show's pages to their records,
+    which are looked up if not given. The records of the uploads are
+    updated in the session. Committing is up to the caller.
+    """
+
+    if not upload:
+        _, file_name, folder, episodes, links = _get_index_pages(snapshot)[0]
+        return _render_index(snapshot, episodes, links)
+    return _publish_index(snapshot, published).get(snapshot.show.alias)
+
+
+def episode_html(snapshot, episode, audio, image, upload=True,
+                 published=None, batch=None):
+    """Renders the page of the episode with its audio and image, either of
+    which may be None, under the show of the ShowSnapshot. Uploads it if
+    upload is set, in the same way as show_html, along with the JSON
+    document of the episode. With batch, the uploads are submitted to it
+    and recorded when it is waited for.
+    """
+
+    user, show, show_image, _ = snapshot
+    context = _get_episode_context(
+        user, show, show_image, episode, audio, image)
+    if not upload:
+        return _render_episode(show, episode, context)
+    html = _publish_page(
+        show, episode.alias, show.alias,
+        _get_episode_fingerprint(show, episode, context),
+        lambda: _render_episode(show, episode, context), published,
+        batch=batch)
+    _publish_json(
+        show, json_feed.get_episode_file_name(episode),
+        _render_episode_json(user, show, show_image,
+                             _get_json_item(episode, audio, context)),
+        json_feed.EPISODE_CONTENT_TYPE, published, batch)
     return html
 
 
-def episode_html(user, show, show_image, episode, upload=True):
-    image_url = _get_episode_image_url(user, episode, show_image)
+def preview_episode(user, show, title, subtitle, description, audio_id,
+                    image_id):
+    """Renders the page of the episode being edited and uploads it as the
+    preview. The page is rendered again only if the previewed values have
+    changed, or it has been kept longer than PREVIEW_CACHE_SECONDS.
+    """
+
+    key = (show.id, common.fingerprint(
+        _get_template_version(site_template.TEMPLATE_EPISODE), user.id,
+        _get_values(show, BASE_SHOW_FIELDS), show.image_id,
+        title, subtitle, description, audio_id, image_id))
+    html = preview_cache.get(key)
+    if html is None:
+        episode = episode_operation.get_preview_episode(
+            show, title, subtitle, description, audio_id, image_id)
+        show_image = media_operation.get_for_preview(
+            Image, show.image_id, image_operation.get_model)
+        audio = media_operation.get_for_preview(
+            Audio, audio_id, audio_operation.get)
+        image = media_operation.get_for_preview(
+            Image, image_id, image_operation.get_model)
+        html = preview_cache.put(key, episode_html(
+            show_snapshot.ShowSnapshot(user, show, show_image, []),
+            episode, audio, image, upload=False))
+    _upload_page(html, episode_operation.PREVIEW_ALIAS, show.alias)
+    return html
+
+
+def _publish_index(snapshot, published=None, items=None, batch=None):
+    """Publishes the index, its archive pages and the JSON Feed. Returns the
+    rendered page, or None if skipped, by key. items are the JSON items of
+    the episodes, which are made from the snapshot if not given. With batch,
+    the uploads are submitted to it.
+    """
+
+    result = {}
+    for key, file_name, folder, episodes, links in \
+            _get_index_pages(snapshot):
+        fingerprint = common.fingerprint(
+            _get_template_version(site_template.TEMPLATE_INDEX),
+            _get_values(snapshot.show, INDEX_SHOW_FIELDS),
+            [_get_values(x, INDEX_EPISODE_FIELDS) for x in episodes],
+            sorted(_get_index_context(snapshot, links).items()))
+        result[key] = _publish_page(
+            snapshot.show, file_name, folder, fingerprint,
+            lambda: _render_index(snapshot, episodes, links), published,
+            batch=batch)
+
+    user, show, show_image, episodes = snapshot
+    if items is None:
+        items = [_get_json_item(x, audio, _get_episode_context(
+            user, show, show_image, x, audio, image))
+            for x, audio, image in episodes]
+    result[_get_page_key(json_feed.FEED_FILE_NAME, show.alias)] = \
+        _publish_json(
+            show, json_feed.FEED_FILE_NAME, json_feed.render_feed(
+                show, _get_site_url(show.alias),
+                _get_show_image_url(user, show_image), items),
+            json_feed.FEED_CONTENT_TYPE, published, batch)
+    return result
+
+
+def _get_index_pages(snapshot):
+    """Returns (key, file_name, folder, episodes, links) of the index and
+    its archive pages. The index comes first, followed by the archive pages
+    from the newest. The newest archive page takes whatever does not fill a
+    page.
+    """
+
+    show = snapshot.show
+    episodes = [x for x, _, _ in snapshot.episodes]
+    page_size = app.config.get('SITE_INDEX_PAGE_SIZE') or 0
+    archived = len(episodes) - page_size if page_size else 0
+    pages = max(0, -(-archived // page_size)) if page_size else 0
+    if not pages:
+        return [(show.alias, show.alias, '', episodes, {})]
+
+    result = [(show.alias, show.alias, '', episodes[:page_size],
+               {'older_url': _get_index_url(show, pages)})]
+    start = page_size
+    for page in range(pages, 0, -1):
+        size = archived - (pages - 1) * page_size if page == pages \
+            else page_size
+        links = {'url': _get_index_url(show, page),
+                 'newer_url': _get_index_url(show, page + 1)
+                 if page < pages else _get_site_url(show.alias)}
+        if page > 1:
+            links['older_url'] = _get_index_url(show, page - 1)
+        file_name = _get_index_file_name(page)
+        result.append((_get_page_key(file_name, show.alias), file_name,
+                       show.alias, episodes[start:start + size], links))
+        start += size
+    return result
+
+
+def _get_index_context(snapshot, links):
+    """Returns the variables for the index template, except for the show
+    and the episodes. links override the url of the page and give the urls
+    of the newer and older pages, if any.
+    """
+
+    user, show, show_image, _ = snapshot
+    context = {
+        'title': show.title,
+        'url': show.url,
+        'home_url': _get_site_url(show.alias),
+        'feed_url': feed_operation.get_feed_url(show),
+        'image_url': image_operation.get_image_url(user, show_image)
+        if show_image else '',
+        'newer_url': None,
+        'older_url': None
+    }
+    context.update(links)
+    return context
+
+
+def _render_index(snapshot, episodes, links):
+    return site_template.render(
+        site_template.TEMPLATE_INDEX, show=snapshot.show, episodes=episodes,
+        **_get_index_context(snapshot, links))
 
-    if episode.audio_id:
-        audio = audio_operation.get(episode.audio_id)
+
+def _delete_index_pages_except(show, published, keys):
+    """Deletes the archive pages of the index that are recorded in published
+    but not among the keys. Records are deleted in the session, except for
+    the pages failed to delete.
+    """
+
+    prefix = _get_page_key(INDEX_PAGE_PREFIX, show.alias)
+    stale = sorted(k for k in published
+                   if k.startswith(prefix) and k not in keys)
+    errors = media_storage.delete_many(
+        app.config.get('S3_BUCKET_SITES'), stale)
+    for key in (x for x in stale if x not in errors):
+        models.db.session.delete(published.pop(key))
+
+
+def _get_index_file_name(page):
+    return '{}{}'.format(INDEX_PAGE_PREFIX, page)
+
+
+def _get_index_url(show, page):
+    return '{}/{}'.format(
+        _get_site_url(show.alias), _get_index_file_name(page))
+
+
+def _get_episode_context(user, show, show_image, episode, audio, image):
+    """Returns the variables for the episode template, except for the show
+    and the episode themselves.
+    """
+
+    if audio:
         m, s = divmod(audio.duration, 60)
         h, m = divmod(m, 60)
         length = '{0:.2f}'.format(audio.length / 1000000)
@@ -47,48 +349,138 @@ def episode_html(user, show, show_image, episode, upload=True):
     else:
         length, h, m, s, audio_type, audio_url = '0', 0, 0, 0, '', '#audio'
 
-    html = render_template(
-        'public_sites/episode.html',
-        title=episode.title,
+    return {
+        'title': episode.title,
+        'url': episode_operation.get_episode_url(episode, show),
+        'home_url': _get_site_url(show.alias),
+        'feed_url': feed_operation.get_feed_url(show),
+        'duration': "%d:%02d:%02d" % (h, m, s),
+        'length': length,
+        'audio_type': audio_type,
+        'audio_url': audio_url,
+        'image_url': _get_episode_image_url(user, image, show_image)
+    }
+
+
+def _get_episode_fingerprint(show, episode, context):
+    return common.fingerprint(
+        _get_template_version(site_template.TEMPLATE_EPISODE),
+        _get_values(show, BASE_SHOW_FIELDS),
+        _get_values(episode, EPISODE_FIELDS),
+        sorted(context.items()))
+
+
+def _render_episode(show, episode, context):
+    return site_template.render(
+        site_template.TEMPLATE_EPISODE,
         show=show,
-        url=episode_operation.get_episode_url(episode),
-        home_url=_get_site_url(show.alias),
-        feed_url=feed_operation.get_feed_url(show),
         episode=episode,
-        episode_description=Markup(common.clean_html(episode.description)),
-        duration="%d:%02d:%02d" % (h, m, s),
-        length=length,
-        audio_type=audio_type,
-        audio_url=audio_url,
-        image_url=image_url)
-    if upload:
-        media_storage.upload(
-            html, app.config.get('S3_BUCKET_SITES'), episode.alias,
-            show.alias, ContentType='text/html; charset=utf-8')
+        episode_description=Markup(
+            episode_operation.get_description_html(episode)),
+        **context)
+
+
+def _get_json_item(episode, audio, context):
+    return json_feed.get_item(
+        episode, audio, episode_operation.get_description_html(episode),
+        context)
+
+
+def _render_episode_json(user, show, show_image, item):
+    return json_feed.render_episode(
+        show, _get_site_url(show.alias),
+        _get_show_image_url(user, show_image), item)
+
+
+def _publish_json(show, file_name, document, content_type, published=None,
+                  batch=None):
+    """Uploads the JSON document under the show unless it is unchanged.
+    Documents are cheap to make, so their digest serves as the fingerprint.
+    """
+
+    return _publish_page(
+        show, file_name, show.alias,
+        published_file_operation.get_digest(document), lambda: document,
+        published, content_type, batch)
+
+
+def _publish_page(show, file_name, folder, fingerprint, render,
+                  published=None, content_type=HTML_CONTENT_TYPE,
+                  batch=None):
+    """Renders and uploads the page unless the fingerprint of its inputs is
+    unchanged. Returns the page, or None if skipped.
+
+    With batch, the upload is submitted to it and recorded when the batch
+    is waited for, if it succeeds.
+    """
+
+    bucket = app.config.get('S3_BUCKET_SITES')
+    key = _get_page_key(file_name, folder)
+    published = published.get(key) if published is not None \
+        else published_file_operation.get_model(bucket, key)
+    if published and published.fingerprint == fingerprint:
+        app.logger.info('inputs unchanged. page skipped:{}'.format(key))
+        return None
+
+    html = render()
+
+    def done():
+        published_file_operation.record(
+            show.id, bucket, key, published_file_operation.get_digest(html),
+            fingerprint, published)
+
+    if batch is None:
+        _upload_page(html, file_name, folder, content_type)
+        done()
+    else:
+        batch.submit(html, bucket, file_name, folder, done=done,
+                     ContentType=content_type)
     return html
 
 
-def preview_episode(user, show, title, subtitle, description, audio_id,
-                    image_id):
-    episode = episode_operation.get_preview_episode(
-        show, title, subtitle, description, audio_id, image_id)
-    show_image = \
-        image_operation.get_model(show.image_id) if show.image_id else None
-    return episode_html(user, show, show_image, episode)
+def _get_template_version(name):
+    """Returns the digest of the sources of the template and the base
+    template it extends, computed once per process.
+    """
+
+    version = _template_versions.get(name)
+    if version is None:
+        version = common.fingerprint(*(
+            site_template.get_source(x)
+            for x in (name, site_template.TEMPLATE_BASE)))
+        _template_versions[name] = version
+    return version
 
 
-def _delete_all_episodes(user, show):
-    media_storage.delete_folder(app.config.get('S3_BUCKET_SITES'), show.alias)
+def _get_values(entity, fields):
+    return tuple(getattr(entity, x) for x in fields)
+
+
+def _get_page_key(file_name, folder=''):
+    return os.path.join(folder, file_name)
+
+
+def _upload_page(html, file_name, folder='', content_type=HTML_CONTENT_TYPE):
+    """Uploads the page through upload_manager, which retries on failure"""
+
+    upload_manager.upload(
+        html, app.config.get('S3_BUCKET_SITES'), file_name, folder,
+        ContentType=content_type)
 
 
 def _get_site_url(show_alias):
     return '{}/{}'.format(app.config.get('HOST_SITE'), show_alias)
 
 
-def _get_episode_image_url(user, episode, show_image):
-    if episode.image_id:
-        return image_operation.get_image_url(
-            user, image_operation.get_model(episode.image_id))
+def _get_show_image_url(user, show_image):
+    if show_image:
+        return image_operation.get_image_url(user, show_image)
+    return ''
+
+
+def _get_episode_image_url(user, image, show_image):
+    if image:
+        return image_operation.get_image_url(user, image)
     if show_image:
         return image_operation.get_image_url(user, show_image)
     return ''
@@ -1,5 +1,6 @@
-from highland import app, models, show_operation, public_view, \
-    feed_operation, user_operation, image_operation, episode_operation
+import itertools
+from highland import app, models, public_view, feed_operation, \
+    episode_operation, rebuild_queue, show_snapshot
 
 
 def publish_scheduled():
@@ -9,39 +10,29 @@ def publish_scheduled():
         app.logger.info('no scheduled episode ready to publish found')
         return result
 
-    def _reset(episode):
-        user = user_operation.get_model(id=episode.owner_user_id)
-        show = show_operation.get_model(episode.show_id)
-        show_image = image_operation.get_model(show.image_id)
-        return user, show, show_image, {
-            'user_id': user.id,
-            'show_id': show.id,
-            'episode_ids': []
-        }
-
-    user, show, show_image, episode_summary = _reset(episodes[0])
-    for episode in episodes:
-        if episode.show_id != show.id:
-            _update_show(user, show, show_image)
-            result.appned(episode_summary)
-            user, show, show_image, episode_summary = _reset(episode)
-        episode_summary['episode_ids'].append(episode.id)
-        public_view.episode_html(user, show, show_image, episode)
-        episode_operation.publish(episode)
-    _update_show(user, show, show_image)
-    result.append(episode_summary)
-
+    # targets come ordered by show
+    for show_id, targets in itertools.groupby(episodes, lambda x: x.show_id):
+        targets = list(targets)
+        for episode in targets:
+            episode_operation.publish(episode)
+        episode_ids = [x.id for x in targets]
+        result.append({
+            'user_id': targets[0].owner_user_id,
+            'show_id': show_id,
+            'episode_ids': episode_ids,
+            'feed_uploaded': rebuild(show_id, episode_ids)
+        })
+
+    skipped = [x.get('show_id') for x in result if not x.get('feed_uploaded')]
+    if skipped:
+        app.logger.info('feed upload skipped for shows:{}'.format(skipped))
     return result
 
 
-def _update_show(user, show, show_image):
-    public_view.show_html(user, show, show_image)
-    feed_operation.update(show.id)
-    app.logger.info('published show:{}'.format(show.id))
-
-
 def publish(episode):
-    '''Update public entity when an episode is updated
+    '''Update public entity when an episode is updated.
+    The rebuild is queued, so that repeated updates to the show within the
+    debounce window are merged into one.
     '''
     if episode.draft_status != models.Episode.DraftStatus.published.name:
         app.logger.warning(
@@ -49,9 +40,23 @@ def publish(episode):
             format(episode.owner_user_id, episode.show_id, episode.id))
         return
 
-    user = user_operation.get_model(id=episode.owner_user_id)
-    show = show_operation.get_model(episode.show_id)
-    show_image = image_operation.get_model(show.image_id)
-    public_view.episode_html(user, show, show_image, episode)
-    public_view.show_html(user, show, show_image)
-    feed_operation.update(show.id)
+    queue.request(episode.show_id, episode.id)
+
+
+def rebuild(show_id, episode_ids=()):
+    '''Rebuild the show page and the feed, along with the pages of the
+    given episodes that are still public. The show is loaded once as a
+    ShowSnapshot, which both are rendered from.
+    Returns True if the feed was uploaded, False if it was unchanged.
+    '''
+    snapshot = show_snapshot.load(show_id)
+    public_view.update(snapshot, episode_ids)
+    feed_uploaded = feed_operation.update(show_id, snapshot)
+    app.logger.info('published show:{}'.format(show_id))
+    return feed_uploaded
+
+
+queue = rebuild_queue.create(
+    rebuild,
+    app.config.get('PUBLISH_QUEUE', 'local'),
+    app.config.get('PUBLISH_DEBOUNCE_SECONDS', 0))
@@ -0,0 +1,106 @@
+import hashlib
+import os
+from highland import app, media_storage, models, upload_manager
+from highland.models import PublishedFile
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+def upload_if_changed(show_id, body, bucket, file_name, folder='',
+                      batch=None, **kwargs):
+    """Uploads the body unless it is identical to what was last uploaded to
+    the same key. Returns True if uploaded, False if skipped.
+
+    With batch, the upload is submitted to it and True means it is to be
+    uploaded. The digest is then recorded when the batch is waited for.
+
+    The digest is recorded in the session. Committing is up to the caller.
+    """
+
+    key = os.path.join(folder, file_name)
+    digest = get_digest(body)
+    published = get_model(bucket, key)
+    if published and published.digest == digest:
+        app.logger.info(
+            'content unchanged. upload skipped:({},{})'.format(bucket, key))
+        return False
+
+    def done():
+        record(show_id, bucket, key, digest, published=published)
+
+    if batch is None:
+        upload_manager.upload(body, bucket, file_name, folder, **kwargs)
+        done()
+    else:
+        batch.submit(body, bucket, file_name, folder, done=done, **kwargs)
+    return True
+
+
+def get_model(bucket, key):
+    """Returns the record of the file at the key, or None if not published"""
+
+    return PublishedFile.query.filter_by(bucket=bucket, key=key).first()
+
+
+def load_by_key(show_id, bucket):
+    """Returns the records of the files published for the show in the
+    bucket, mapped by key.
+    """
+
+    return {x.key: x for x in PublishedFile.query.
+            filter_by(show_id=show_id, bucket=bucket).all()}
+
+
+def record(show_id, bucket, key, digest, fingerprint=None, published=None):
+    """Records the file as uploaded with the digest and the fingerprint of
+    its inputs. published is the existing record of the key, if any.
+
+    The record is updated in the session. Committing is up to the caller.
+    """
+
+    if not published:
+        published = PublishedFile(show_id, bucket, key)
+        models.db.session.add(published)
+    published.digest = digest
+    published.fingerprint = fingerprint
+    return published
+
+
+def get_digest(body):
+    """Returns the digest of the content, given as either str, bytes or a
+    binary file object. A file object is read in chunks and rewound.
+    """
+
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if isinstance(body, bytes):
+        return hashlib.sha1(body).hexdigest()
+
+    h = hashlib.sha1()
+    for chunk in iter(lambda: body.read(DIGEST_CHUNK_SIZE), b''):
+        h.update(chunk)
+    body.seek(0)
+    return h.hexdigest()
+
+
+def delete_except(show_id, bucket, folder, file_names):
+    """Deletes the files published under the folder for the show, except
+    the ones with the given names. Returns the deleted keys, which leave out
+    the ones failed to delete from the storage.
+
+    Records are deleted in the session. Committing is up to the caller.
+    """
+
+    keep = {os.path.join(folder, x) for x in file_names}
+    published = PublishedFile.query. \
+        filter_by(show_id=show_id, bucket=bucket). \
+        filter(PublishedFile.key.startswith('{}/'.format(folder))). \
+        all()
+
+    targets = [x for x in published if x.key not in keep]
+    errors = media_storage.delete_many(bucket, [x.key for x in targets])
+    deleted = []
+    for x in (x for x in targets if x.key not in errors):
+        models.db.session.delete(x)
+        deleted.append(x.key)
+    return deleted
@@ -0,0 +1,177 @@
+"""Coalesces the requests to rebuild the public pages and the feed of a show.
+
+Requests for a show made within the window are merged, so that the show is
+rebuilt once, along with the episodes requested in the meantime.
+"""
+import datetime
+import threading
+import time
+from sqlalchemy import func
+from highland import app, models
+from highland.models import RebuildRequest
+
+
+def create(rebuild, kind, window):
+    """Creates the queue of the kind, either 'local' or 'database'.
+
+    rebuild: function of (show_id, episode_ids) doing the actual rebuild
+    window: seconds to wait for further requests before rebuilding
+    """
+
+    if kind == 'database':
+        return DatabaseRebuildQueue(rebuild, window)
+    if kind == 'local':
+        return LocalRebuildQueue(rebuild, window)
+    raise ValueError('unknown rebuild queue:{}'.format(kind))
+
+
+class LocalRebuildQueue:
+    """Keeps the requests in memory of the process. The rebuild runs on a
+    timer thread when the window of the first pending request closes.
+    """
+
+    def __init__(self, rebuild, window):
+        self.rebuild = rebuild
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def request(self, show_id, episode_id=None):
+        if not self.window:
+            return self.rebuild(show_id, _ids(episode_id))
+
+        with self._lock:
+            if show_id not in self._pending:
+                self._pending[show_id] = (
+                    time.monotonic() + self.window, set(),
+                    self._start_timer(show_id, self.window))
+            self._pending[show_id][1].update(_ids(episode_id))
+
+    def process_due(self):
+        """Rebuilds the shows whose window has closed.
+        Returns the ids of the rebuilt shows.
+        """
+        now = time.monotonic()
+        return self._process(lambda due: due <= now)
+
+    def flush(self):
+        """Rebuilds every pending show right away.
+        Returns the ids of the rebuilt shows.
+        """
+        return self._process(lambda due: True)
+
+    def _start_timer(self, show_id, delay):
+        timer = threading.Timer(delay, self._process_timer, [show_id])
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _process_timer(self, show_id):
+        self.process_due()
+        # a timer may fire a little before the due time, leaving the show
+        # pending. armed again for the rest, unless the show was processed
+        # and requested anew with a timer of its own in the meantime
+        with self._lock:
+            if show_id in self._pending and \
+                    self._pending[show_id][2] is threading.current_thread():
+                due, episode_ids, _ = self._pending[show_id]
+                self._pending[show_id] = (
+                    due, episode_ids, self._start_timer(
+                        show_id, max(due - time.monotonic(), 0)))
+
+    def _process(self, is_due):
+        with self._lock:
+            targets = [(show_id, episode_ids)
+                       for show_id, (due, episode_ids, _)
+                       in self._pending.items() if is_due(due)]
+            for show_id, _ in targets:
+                self._pending.pop(show_id)[2].cancel()
+
+        with app.app_context():
+            for show_id, episode_ids in targets:
+                try:
+                    self.rebuild(show_id, episode_ids)
+                except Exception:
+                    app.logger.error(
+                        'Failed to rebuild show:{}'.format(show_id),
+                        exc_info=1)
+        return [show_id for show_id, _ in targets]
+
+
+class DatabaseRebuildQueue:
+    """Keeps the requests as RebuildRequest rows so that any node can
+    process them. process_due is expected to be called periodically.
+    """
+
+    def __init__(self, rebuild, window):
+        self.rebuild = rebuild
+        self.window = window
+
+    def request(self, show_id, episode_id=None):
+        if not self.window:
+            return self.rebuild(show_id, _ids(episode_id))
+
+        models.db.session.add(RebuildRequest(show_id, episode_id))
+        models.db.session.commit()
+
+    def process_due(self):
+        """Rebuilds the shows whose oldest request is older than the window.
+        Returns the ids of the rebuilt shows.
+        """
+        threshold = datetime.datetime.now(datetime.timezone.utc) - \
+            datetime.timedelta(seconds=self.window)
+        show_ids = [x for x, in models.db.session.
+                    query(RebuildRequest.show_id).
+                    group_by(RebuildRequest.show_id).
+                    having(func.min(RebuildRequest.create_datetime) <=
+                           threshold).
+                    all()]
+
+        rebuilt = []
+        for show_id in show_ids:
+            episode_ids = self._claim(show_id)
+            if episode_ids is None:
+                # claimed by another node in the meantime
+                continue
+            try:
+                self.rebuild(show_id, episode_ids)
+            except Exception:
+                app.logger.error(
+                    'Failed to rebuild show:{}. Requeued.'.format(show_id),
+                    exc_info=1)
+                models.db.session.rollback()
+                for episode_id in episode_ids or [None]:
+                    models.db.session.add(RebuildRequest(show_id, episode_id))
+                models.db.session.commit()
+            else:
+                rebuilt.append(show_id)
+        return rebuilt
+
+    def flush(self):
+        """Rebuilds every pending show right away.
+        Returns the ids of the rebuilt shows.
+        """
+        window, self.window = self.window, 0
+        try:
+            return self.process_due()
+        finally:
+            self.window = window
+
+    def _claim(self, show_id):
+        """Deletes the requests for the show and returns the requested
+        episode ids, or None if there is no request left.
+        """
+        requests = RebuildRequest.query. \
+            filter_by(show_id=show_id). \
+            with_for_update(). \
+            all()
+        for x in requests:
+            models.db.session.delete(x)
+        models.db.session.commit()
+        if not requests:
+            return None
+        return {x.episode_id for x in requests if x.episode_id is not None}
+
+
+def _ids(episode_id):
+    return set() if episode_id is None else {episode_id}
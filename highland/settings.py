@@ -6,6 +6,11 @@ S3_BUCKET_FEED = ''
 S3_BUCKET_AUDIO = ''
 S3_BUCKET_IMAGE = ''
 
+# where the buckets are. 's3', 'local' for directories under
+# STORAGE_LOCAL_DIR, or 'memory' to keep them in the process
+STORAGE_BACKEND = 's3'
+STORAGE_LOCAL_DIR = ''
+
 COGNITO_REGION = ''
 COGNITO_USER_POOL_ID = ''
 COGNITO_CLIENT_ID = ''
@@ -39,3 +44,55 @@ HOST_AUDIO = ''
 HOST_IMAGE = ''
 
 HOST_OLYMPIA = ''
+
+# 'local' to coalesce in process, 'database' to share among nodes
+PUBLISH_QUEUE = 'local'
+# seconds to wait for further changes to a show before rebuilding it.
+# 0 rebuilds right away
+PUBLISH_DEBOUNCE_SECONDS = 0
+# sent by the scheduler in the X-Task-Secret header to call the task
+# endpoints such as /process_rebuild_queue, which refuse every call if empty
+TASK_SECRET = ''
+
+# compress uploads to the buckets, given by config key, with (encoding, level)
+# encoding is either 'gzip' or 'br', which requires brotli to be installed
+# e.g. {'S3_BUCKET_FEED': ('gzip', 6), 'S3_BUCKET_SITES': ('gzip', 6)}
+UPLOAD_COMPRESSION = {}
+
+# total bytes of the rendered feeds kept in memory to serve /rss/<alias>
+FEED_CACHE_BYTES = 64 * 1024 * 1024
+
+# threads uploading the pages and the feeds, shared by the process
+UPLOAD_CONCURRENCY = 16
+# uploads submitted and not finished, beyond which submitting blocks
+UPLOAD_QUEUE_SIZE = 256
+# retries of a failed upload, waiting up to BACKOFF * 2 ** attempt in between
+UPLOAD_RETRIES = 3
+UPLOAD_BACKOFF_SECONDS = 0.5
+
+# seconds the urls to upload the parts of an audio file to are valid for
+AUDIO_UPLOAD_URL_SECONDS = 60 * 60
+# part urls handed out per request
+AUDIO_UPLOAD_URL_BATCH = 100
+
+# bytecode cache of the public site templates, shared by the processes.
+# a temporary directory if empty
+SITE_TEMPLATE_CACHE_DIR = ''
+
+# episodes listed on the index of a public site. the older ones go to
+# archive pages. all on the index if 0
+SITE_INDEX_PAGE_SIZE = 0
+
+# total bytes of the sanitized descriptions kept in memory for the episodes
+# not having them stored
+DESCRIPTION_CACHE_BYTES = 16 * 1024 * 1024
+
+# episode previews, and the audios and images looked up for them, kept in
+# memory for the repeated previews while editing
+PREVIEW_CACHE_ENTRIES = 256
+PREVIEW_CACHE_SECONDS = 30
+
+# sanitizer of the episode descriptions, either 'bleach' or 'lxml'.
+# both apply the same policy. lxml is faster but may nest badly formed
+# markup differently, see highland/html_sanitizer.py
+HTML_SANITIZER = 'bleach'
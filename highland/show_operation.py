@@ -23,11 +23,16 @@ def create(user_id, title, description, subtitle, language, author, category,
 
 
 def update(user_id, show_id, title, description, subtitle, language, author,
-           category, explicit, image_id):
+           category, explicit, image_id, feed_page_size=None):
     """Updates the show. Exception is thrown if the show is not found.
+    feed_page_size is left as is if None, and the cap is removed if 0.
     Intended to be called by front end.
     """
 
+    if feed_page_size is not None and feed_page_size < 0:
+        raise exception.InvalidValueError(
+            'feed page size not accepted. {}'.format(feed_page_size))
+
     show = verify_ownership(user_id, get_model(show_id))
     show.title = title
     show.description = description
@@ -37,6 +42,8 @@ def update(user_id, show_id, title, description, subtitle, language, author,
     show.category = category
     show.explicit = explicit
     show.image_id = image_id
+    if feed_page_size is not None:
+        show.feed_page_size = feed_page_size or None
     show.last_build_datetime = datetime.datetime.now(datetime.timezone.utc)
     models.db.session.commit()
     return dict(show)
@@ -76,5 +83,22 @@ def get_model(show_id):
     if not show:
         raise exception.NoSuchEntityError(
             'Show does not exist. Id:{}'.format(show_id))
-    show.url = urllib.parse.urljoin(app.config.get('HOST_SITE'), show.alias)
+    show.url = get_show_url(show)
     return show
+
+
+def get_model_by_alias(alias):
+    """Gets and returns the show with the alias as the raw model object."""
+
+    show = Show.query.filter_by(alias=alias).first()
+    if not show:
+        raise exception.NoSuchEntityError(
+            'Show does not exist. Alias:{}'.format(alias))
+    show.url = get_show_url(show)
+    return show
+
+
+def get_show_url(show):
+    """Returns the url for the show site."""
+
+    return urllib.parse.urljoin(app.config.get('HOST_SITE'), show.alias)
@@ -0,0 +1,44 @@
+"""Public state of a show, loaded once and shared by the renderers"""
+from collections import namedtuple
+from highland import show_operation, episode_operation, models, exception
+from highland.models import Show, User, Image
+
+ShowSnapshot = namedtuple('ShowSnapshot', 'user show show_image episodes')
+ShowSnapshot.__doc__ = """Public state of a show, which the public pages and
+the feed are rendered from.
+episodes: (episode, audio, image) of the public episodes, newest first.
+audio and image are None when not set
+"""
+
+
+def load(show_id):
+    """Loads the public state of the show as ShowSnapshot.
+
+    The show, its owner and the show image are fetched in one query, and the
+    public episodes with their audio and image in another, so the number of
+    queries does not depend on the number of episodes.
+    """
+
+    user, show, show_image = load_show(show_id)
+    return ShowSnapshot(user, show, show_image,
+                        episode_operation.load_public_with_media(show.id))
+
+
+def load_show(show_id):
+    """Loads (user, show, show image) of the show in one query, without the
+    episodes. show_image is None when not set.
+    """
+
+    row = models.db.session. \
+        query(Show, User, Image). \
+        join(User, Show.owner_user_id == User.id). \
+        outerjoin(Image, Show.image_id == Image.id). \
+        filter(Show.id == show_id). \
+        first()
+    if not row:
+        raise exception.NoSuchEntityError(
+            'Show does not exist. Id:{}'.format(show_id))
+
+    show, user, show_image = row
+    show.url = show_operation.get_show_url(show)
+    return user, show, show_image
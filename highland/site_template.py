@@ -0,0 +1,53 @@
+"""Jinja environment for the public sites, independent of Flask contexts so
+that pages can be rendered from background workers and process pools.
+
+Compiled templates are kept in a bytecode cache on the file system, shared
+by the processes and preserved across restarts.
+"""
+import os
+import jinja2
+from highland import app
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(__file__), 'templates')
+TEMPLATE_BASE = 'public_sites/base.html'
+TEMPLATE_INDEX = 'public_sites/index.html'
+TEMPLATE_EPISODE = 'public_sites/episode.html'
+TEMPLATES = (TEMPLATE_BASE, TEMPLATE_INDEX, TEMPLATE_EPISODE)
+
+
+def render(name, **context):
+    """Renders the template with the context."""
+
+    return environment.get_template(name).render(**context)
+
+
+def get_source(name):
+    """Returns the source of the template."""
+
+    return environment.loader.get_source(environment, name)[0]
+
+
+def precompile():
+    """Compiles the public site templates into the bytecode cache, meant to
+    be run at deploy time. Returns the names of the templates compiled.
+    """
+
+    for name in TEMPLATES:
+        environment.get_template(name)
+    return TEMPLATES
+
+
+def _create_environment():
+    cache_dir = app.config.get('SITE_TEMPLATE_CACHE_DIR')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATE_FOLDER),
+        # every public site template is html
+        autoescape=True,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(cache_dir or None),
+        # templates change only by deploying, when the cache is rebuilt
+        auto_reload=bool(app.config.get('DEBUG')))
+
+
+environment = _create_environment()
@@ -0,0 +1,243 @@
+"""Backends of media_storage, storing objects by bucket and key.
+
+S3Storage: the buckets on S3
+LocalStorage: a directory per bucket under the given root
+MemoryStorage: dicts kept in the process, e.g. for benchmarks and tests
+
+A backend provides put, put_stream, delete, delete_many, exists and
+list_keys.
+Bodies are given as str, bytes or a binary file object. Keyword arguments
+of put are S3 parameters such as ContentType, which only S3Storage and
+MemoryStorage keep. put_stream stores a binary stream of unknown length as
+it is read, which S3Storage does by a multipart upload, holding one part
+in memory at a time. delete_many returns the error message by key of the
+objects it failed to delete.
+
+S3Storage also provides the calls of a multipart upload whose parts the
+client uploads itself, to urls presigned by get_part_url. It calls S3
+through the client of the resource given only, as the uploads of
+upload_manager share it between threads, which a client allows and a
+resource does not.
+"""
+import os
+import shutil
+import threading
+from botocore.exceptions import BotoCoreError, ClientError
+
+# keys per multi-object delete request, the maximum S3 accepts
+DELETE_BATCH_SIZE = 1000
+# bytes per part of a multipart upload. S3 requires 5MB or more, except for
+# the last part
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+# parts of a multipart upload at most
+MULTIPART_MAX_PARTS = 10000
+
+
+class S3Storage:
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def put(self, bucket, key, body, **kwargs):
+        self.s3.meta.client.put_object(
+            Bucket=bucket, Key=key, Body=body, ACL='public-read', **kwargs)
+
+    def put_stream(self, bucket, key, stream, part_size=MULTIPART_PART_SIZE,
+                   **kwargs):
+        upload_id = self.create_multipart_upload(bucket, key, **kwargs)
+        try:
+            parts = []
+            for number, chunk in enumerate(_read_parts(stream, part_size), 1):
+                response = self.s3.meta.client.upload_part(
+                    Bucket=bucket, Key=key, UploadId=upload_id,
+                    PartNumber=number, Body=chunk)
+                parts.append((number, response['ETag']))
+            self.complete_multipart_upload(bucket, key, upload_id, parts)
+        except Exception:
+            # parts left behind are stored, and charged, until aborted
+            self.abort_multipart_upload(bucket, key, upload_id)
+            raise
+
+    def create_multipart_upload(self, bucket, key, **kwargs):
+        """Returns the id of the upload started"""
+
+        return self.s3.meta.client.create_multipart_upload(
+            Bucket=bucket, Key=key, ACL='public-read', **kwargs)['UploadId']
+
+    def get_part_url(self, bucket, key, upload_id, part_number, expires):
+        """Returns the url to PUT the part to, valid for expires seconds.
+        The ETag header of the response is needed to complete the upload.
+        """
+
+        return self.s3.meta.client.generate_presigned_url(
+            'upload_part', ExpiresIn=expires, Params={
+                'Bucket': bucket, 'Key': key, 'UploadId': upload_id,
+                'PartNumber': part_number})
+
+    def complete_multipart_upload(self, bucket, key, upload_id, parts):
+        """Completes the upload with the parts given as (number, etag)"""
+
+        self.s3.meta.client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'ETag': etag, 'PartNumber': number}
+                for number, etag in parts]})
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        self.s3.meta.client.abort_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id)
+
+    def delete(self, bucket, key):
+        self.s3.meta.client.delete_object(Bucket=bucket, Key=key)
+
+    def delete_many(self, bucket, keys):
+        errors = {}
+        for i in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[i:i + DELETE_BATCH_SIZE]
+            try:
+                response = self.s3.meta.client.delete_objects(
+                    Bucket=bucket, Delete={
+                        'Objects': [{'Key': x} for x in batch],
+                        'Quiet': True})
+            except (BotoCoreError, ClientError) as e:
+                errors.update((x, str(e)) for x in batch)
+                continue
+            for error in response.get('Errors', []):
+                errors[error['Key']] = '{}: {}'.format(
+                    error.get('Code'), error.get('Message'))
+        return errors
+
+    def exists(self, bucket, key):
+        try:
+            self.s3.meta.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def list_keys(self, bucket, prefix):
+        pages = self.s3.meta.client.get_paginator('list_objects').paginate(
+            Bucket=bucket, Prefix=prefix)
+        return [x['Key'] for page in pages for x in page.get('Contents', [])]
+
+
+class LocalStorage:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def put(self, bucket, key, body, **kwargs):
+        path = self._get_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            if hasattr(body, 'read'):
+                shutil.copyfileobj(body, f)
+            else:
+                f.write(_to_bytes(body))
+
+    def put_stream(self, bucket, key, stream, **kwargs):
+        self.put(bucket, key, stream, **kwargs)
+
+    def delete(self, bucket, key):
+        try:
+            os.remove(self._get_path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def delete_many(self, bucket, keys):
+        errors = {}
+        for key in keys:
+            try:
+                self.delete(bucket, key)
+            except (OSError, ValueError) as e:
+                errors[key] = str(e)
+        return errors
+
+    def exists(self, bucket, key):
+        return os.path.isfile(self._get_path(bucket, key))
+
+    def list_keys(self, bucket, prefix):
+        directory = self._get_path(bucket, '')
+        keys = []
+        for parent, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                key = os.path.relpath(
+                    os.path.join(parent, file_name), directory)
+                key = key.replace(os.sep, '/')
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def _get_path(self, bucket, key):
+        directory = os.path.join(self.root, bucket)
+        path = os.path.abspath(os.path.join(directory, key))
+        if path != directory and \
+                not path.startswith(directory + os.sep):
+            raise ValueError('key out of the bucket:{}'.format(key))
+        return path
+
+
+class MemoryStorage:
+    def __init__(self):
+        # (bucket, key) -> bytes, and the keyword arguments of put
+        self.objects = {}
+        self.metadata = {}
+        self._lock = threading.Lock()
+
+    def put(self, bucket, key, body, **kwargs):
+        data = body.read() if hasattr(body, 'read') else body
+        with self._lock:
+            self.objects[(bucket, key)] = _to_bytes(data)
+            self.metadata[(bucket, key)] = kwargs
+
+    def put_stream(self, bucket, key, stream, **kwargs):
+        self.put(bucket, key, stream, **kwargs)
+
+    def delete(self, bucket, key):
+        with self._lock:
+            self.objects.pop((bucket, key), None)
+            self.metadata.pop((bucket, key), None)
+
+    def delete_many(self, bucket, keys):
+        for key in keys:
+            self.delete(bucket, key)
+        return {}
+
+    def exists(self, bucket, key):
+        with self._lock:
+            return (bucket, key) in self.objects
+
+    def list_keys(self, bucket, prefix):
+        with self._lock:
+            return sorted(k for b, k in self.objects
+                          if b == bucket and k.startswith(prefix))
+
+
+def _read_parts(stream, part_size):
+    """Yields the stream in chunks of part_size bytes, the last of which may
+    be shorter. A single empty chunk is yielded for an empty stream, as a
+    multipart upload needs a part.
+    """
+
+    chunk = _read_fully(stream, part_size)
+    yield chunk
+    while len(chunk) == part_size:
+        chunk = _read_fully(stream, part_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _read_fully(stream, size):
+    # a stream such as the body of a request may return less than asked
+    chunks = []
+    while size > 0:
+        data = stream.read(size)
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return b''.join(chunks)
+
+
+def _to_bytes(data):
+    return data.encode('utf-8') if isinstance(data, str) else data
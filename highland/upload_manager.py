@@ -0,0 +1,203 @@
+"""Concurrent uploads through media_storage.
+
+The uploads of a process share a pool of UPLOAD_CONCURRENCY threads. Up to
+UPLOAD_QUEUE_SIZE uploads may be submitted and not finished at a time,
+beyond which submitting blocks until one finishes. A failed upload is
+retried up to UPLOAD_RETRIES times, waiting a random time up to
+UPLOAD_BACKOFF_SECONDS * 2 ** attempt in between.
+
+Callers submit uploads through a batch and wait for them together:
+
+    with upload_manager.batch() as batch:
+        batch.submit(body, bucket, file_name, folder, done=record)
+        ...
+        batch.flush()
+
+done is called in the caller's thread once the upload has succeeded, so it
+may use the database session.
+"""
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from botocore.exceptions import BotoCoreError, ClientError
+from highland import app, media_storage
+
+# key uploaded to, seconds it took including retries, number of attempts,
+# and the exception if it failed in the end
+UploadResult = namedtuple('UploadResult', 'key seconds attempts error')
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+class UploadManager:
+    def __init__(self, max_workers, max_queued, retries, backoff):
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max(max_queued, 1))
+        self._stats_lock = threading.Lock()
+        self._stats = {'uploaded': 0, 'failed': 0, 'retried': 0,
+                       'total_seconds': 0.0, 'max_seconds': 0.0}
+
+    def submit(self, file_data, bucket, file_name=None, folder='',
+               **kwargs):
+        """Submits the upload, blocking while the queue is full. Returns a
+        future of its UploadResult, which holds the error instead of
+        raising it.
+        """
+
+        self._slots.acquire()
+        try:
+            return self._executor.submit(
+                self._upload, file_data, bucket, file_name, folder, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def batch(self):
+        return UploadBatch(self)
+
+    def stats(self):
+        """Returns the number of uploads succeeded, failed and retried, and
+        the total and the longest seconds they took, as dict.
+        """
+
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait)
+
+    def _upload(self, file_data, bucket, file_name, folder, kwargs):
+        key = os.path.join(
+            folder, file_name or getattr(file_data, 'filename', ''))
+        start = time.perf_counter()
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                if hasattr(file_data, 'seek'):
+                    file_data.seek(0)
+                try:
+                    media_storage.upload(
+                        file_data, bucket, file_name, folder, **kwargs)
+                    error = None
+                    break
+                except (BotoCoreError, ClientError) as e:
+                    error = e
+                    if attempt == self.retries:
+                        break
+                    app.logger.warning(
+                        'Failed to upload {}. Retrying'.format(key),
+                        exc_info=1)
+                    time.sleep(random.uniform(
+                        0, self.backoff * 2 ** attempt))
+        except Exception as e:
+            error = e
+        finally:
+            self._slots.release()
+
+        result = UploadResult(
+            key, time.perf_counter() - start, attempt + 1, error)
+        self._record(result)
+        return result
+
+    def _record(self, result):
+        with self._stats_lock:
+            self._stats['failed' if result.error else 'uploaded'] += 1
+            self._stats['retried'] += result.attempts - 1
+            self._stats['total_seconds'] += result.seconds
+            self._stats['max_seconds'] = \
+                max(self._stats['max_seconds'], result.seconds)
+        if result.error:
+            app.logger.error('Failed to upload {} in {:.3f}s: {}'.format(
+                result.key, result.seconds, result.error))
+        else:
+            app.logger.debug('uploaded {} in {:.3f}s, {} attempt(s)'.format(
+                result.key, result.seconds, result.attempts))
+
+
+class UploadBatch:
+    """Uploads submitted through the manager to be waited for together"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._pending = []
+
+    def submit(self, file_data, bucket, file_name=None, folder='', done=None,
+               **kwargs):
+        """Submits the upload. done is called without arguments by wait if
+        the upload succeeds.
+        """
+
+        future = self.manager.submit(
+            file_data, bucket, file_name, folder, **kwargs)
+        self._pending.append((future, done))
+        return future
+
+    def wait(self):
+        """Waits for the uploads submitted so far, calling done of the ones
+        succeeded. Returns their UploadResults in the order submitted.
+        """
+
+        pending, self._pending = self._pending, []
+        results = []
+        for future, done in pending:
+            result = future.result()
+            if result.error is None and done is not None:
+                done()
+            results.append(result)
+        return results
+
+    def flush(self):
+        """Waits as wait does, then raises the error of the first upload
+        failed, if any. Returns the UploadResults.
+        """
+
+        results = self.wait()
+        for result in results:
+            if result.error is not None:
+                raise result.error
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # nothing is left running with the bodies, which the caller may
+        # close next
+        if exc_type is None:
+            self.flush()
+        else:
+            self.wait()
+
+
+def get():
+    """Returns the manager of the process, created on first use"""
+
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = UploadManager(
+                app.config.get('UPLOAD_CONCURRENCY') or 1,
+                app.config.get('UPLOAD_QUEUE_SIZE') or 1,
+                app.config.get('UPLOAD_RETRIES') or 0,
+                app.config.get('UPLOAD_BACKOFF_SECONDS') or 0)
+        return _manager
+
+
+def batch():
+    return get().batch()
+
+
+def upload(file_data, bucket, file_name=None, folder='', **kwargs):
+    """Uploads with retries through the manager and waits for it. The error
+    is raised if it fails in the end.
+    """
+
+    with batch() as b:
+        b.submit(file_data, bucket, file_name, folder, **kwargs)
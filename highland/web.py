@@ -1,5 +1,8 @@
 from collections import namedtuple
+from functools import wraps
+import datetime
 import dateutil.parser
+import hmac
 import traceback
 
 from flask import request, jsonify, redirect, render_template, \
@@ -8,8 +11,8 @@ from flask import request, jsonify, redirect, render_template, \
 from highland import app, \
     show_operation, episode_operation, audio_operation, user_operation,\
     image_operation, public_view, feed_operation, stat_operation, \
-    cognito_auth, publish, common
-from highland.exception import AccessNotAllowedError
+    cognito_auth, publish, common, show_snapshot, audio_upload_operation
+from highland.exception import AccessNotAllowedError, InvalidValueError
 
 app.secret_key = app.config.get('APP_SECRET')
 auth = cognito_auth.CognitoAuth(app.config.get('COGNITO_JWT_SET'),
@@ -17,6 +20,13 @@ auth = cognito_auth.CognitoAuth(app.config.get('COGNITO_JWT_SET'),
                                 app.config.get('COGNITO_USER_POOL_ID'))
 
 
+# handlers are tried in the order registered, so the specific ones go first
+@app.errorhandler(InvalidValueError)
+def handle_invalid_value(error):
+    app.logger.error(traceback.format_exc())
+    return jsonify(result='error'), 400
+
+
 @app.errorhandler(Exception)
 def handle_error(error):
     app.logger.error(traceback.format_exc())
@@ -29,6 +39,7 @@ def handle_access_not_allowed(error):
     return jsonify(result='error'), 403
 
 
+
 @app.route('/stat/episode_by_day', methods=['GET'])
 @auth.require_authenticated()
 def stat_episode_by_day():
@@ -92,9 +103,9 @@ def show():
     if 'PUT' == request.method:
         args = request.get_json()
         (id, title, description, subtitle, language, author, category,
-         explicit, image_id) = _get_args(
+         explicit, image_id, feed_page_size) = _get_args(
              args, 'id', 'title', 'description', 'subtitle', 'language',
-             'author', 'category', 'explicit', 'image_id')
+             'author', 'category', 'explicit', 'image_id', 'feed_page_size')
         common.require_true(id, 'id required')
         common.require_true(title, 'title required')
         common.require_true(description, 'description required')
@@ -106,7 +117,8 @@ def show():
 
         show = show_operation.update(
             auth.authenticated_user.id, id, title, description, subtitle,
-            language, author, category, explicit, image_id)
+            language, author, category, explicit, image_id,
+            int(feed_page_size) if feed_page_size is not None else None)
         return jsonify(show=show, result='success')
 
     if 'GET' == request.method:
@@ -206,6 +218,70 @@ def audio():
         return jsonify(result='success')
 
 
+@app.route('/audio/ingest', methods=['POST'])
+@auth.require_authenticated()
+def ingest_audio():
+    """Creates an audio from the request body, the file itself, streamed to
+    the storage. filename and duration are given as query parameters.
+    """
+    file_name, duration = _get_args(request.args, 'filename', 'duration')
+    common.require_true(file_name, 'filename required')
+    audio = audio_operation.ingest(
+        auth.authenticated_user.id, request.stream, file_name,
+        int(duration or 0), request.mimetype or 'audio/mpeg')
+    return jsonify(audio=audio, result='success'), 201
+
+
+@app.route('/audio/upload', methods=['POST'])
+@auth.require_authenticated()
+def start_audio_upload():
+    file_name, duration, length, file_type = _get_args(
+        request.get_json(), 'filename', 'duration', 'length', 'filetype')
+    upload = audio_upload_operation.start(
+        auth.authenticated_user.id, file_name, duration, length, file_type)
+    return jsonify(upload=upload, result='success'), 201
+
+
+@app.route('/audio/upload/<int:upload_id>', methods=['GET', 'DELETE'])
+@auth.require_authenticated()
+def audio_upload(upload_id):
+    if 'GET' == request.method:
+        upload = audio_upload_operation.get(
+            auth.authenticated_user.id, upload_id)
+        return jsonify(upload=upload, result='success')
+
+    if 'DELETE' == request.method:
+        audio_upload_operation.abort(auth.authenticated_user.id, upload_id)
+        return jsonify(result='success')
+
+
+@app.route('/audio/upload/<int:upload_id>/part_urls', methods=['POST'])
+@auth.require_authenticated()
+def audio_upload_part_urls(upload_id):
+    urls = audio_upload_operation.get_part_urls(
+        auth.authenticated_user.id, upload_id,
+        request.get_json().get('part_numbers') or [])
+    return jsonify(urls=urls, result='success')
+
+
+@app.route('/audio/upload/<int:upload_id>/parts', methods=['PUT'])
+@auth.require_authenticated()
+def audio_upload_parts(upload_id):
+    parts = [(x.get('part_number'), x.get('etag'))
+             for x in request.get_json().get('parts') or []]
+    upload = audio_upload_operation.record_parts(
+        auth.authenticated_user.id, upload_id, parts)
+    return jsonify(upload=upload, result='success')
+
+
+@app.route('/audio/upload/<int:upload_id>/complete', methods=['POST'])
+@auth.require_authenticated()
+def complete_audio_upload(upload_id):
+    audio = audio_upload_operation.complete(
+        auth.authenticated_user.id, upload_id)
+    return jsonify(audio=audio, result='success'), 201
+
+
 @app.route('/image/<image_id>', methods=['GET'])
 @auth.require_authenticated()
 def get_image(image_id):
@@ -277,20 +353,43 @@ def datetime_valid_or_none(d):
         return None
 
 
+def require_task_secret(func):
+    """Refuses the call unless the X-Task-Secret header matches TASK_SECRET,
+    for the endpoints called by the scheduler rather than a user.
+    """
+
+    @wraps(func)
+    def secret_checked(*args, **kwargs):
+        secret = app.config.get('TASK_SECRET') or ''
+        given = request.headers.get('X-Task-Secret', '')
+        if not secret or not hmac.compare_digest(
+                given.encode('utf-8'), secret.encode('utf-8')):
+            return 'authentication required', 403
+        return func(*args, **kwargs)
+    return secret_checked
+
+
 @app.route('/publish_scheduled', methods=['POST'])
 def publish_scheduled():
     result = publish.publish_scheduled()
     return jsonify(result=result)
 
 
+@app.route('/process_rebuild_queue', methods=['POST'])
+@require_task_secret
+def process_rebuild_queue():
+    result = publish.queue.process_due()
+    return jsonify(result=result)
+
+
 @app.route('/publish_site', methods=['POST'])
 def publish_site():
     '''
     test only
     '''
     args = request.get_json()
-    public_view.update_full(auth.authenticated_user, args.get('show_id'))
-    return 'done'
+    result = public_view.sync(args.get('show_id'))
+    return jsonify(result=result)
 
 
 @app.route('/preview_site/<show_id>', methods=['GET'])
@@ -298,16 +397,7 @@ def preview_site(show_id):
     '''
     test only
     '''
-    user = auth.authenticated_user
-    show = show_operation.get_model(show_id)
-    show_image = \
-        image_operation.get_model(show.image_id) if show.image_id else None
-    return public_view.show_html(
-        user,
-        show,
-        show_image,
-        episode_operation.load_public(show_id),
-        False)
+    return public_view.show_html(show_snapshot.load(show_id), upload=False)
 
 
 @app.route('/preview/site/', methods=['GET'])
@@ -333,20 +423,45 @@ def preview_feed(show_id):
     '''
     test only
     '''
-    user = auth.authenticated_user
     return Response(
-        feed_operation._generate(user, show_operation.get_model(show_id)),
+        feed_operation._generate(feed_operation._load(show_id)),
         mimetype=feed_operation.FEED_CONTENT_TYPE)
 
 
+@app.route('/rss/<show_alias>', methods=['GET'])
+def feed(show_alias):
+    """Serves the feed as uploaded to S3_BUCKET_FEED, honoring conditional
+    requests with the ETag and Last-Modified of the show's last build.
+    """
+    show = show_operation.get_model_by_alias(show_alias)
+    etag = feed_operation.get_etag(show)
+    last_modified = show.last_build_datetime.astimezone(
+        datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and \
+            last_modified <= request.if_modified_since
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(feed_operation.get_cached(show),
+                            mimetype=feed_operation.FEED_CONTENT_TYPE)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
 @app.route('/publish_feed', methods=['POST'])
 def publish_feed():
     '''
     test only
     '''
     args = request.get_json()
-    feed_operation.update(args.get('show_id'))
-    return 'feed published'
+    if feed_operation.update(args.get('show_id')):
+        return 'feed published'
+    return 'feed unchanged'
 
 
 @app.route('/', methods=['GET'])
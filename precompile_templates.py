@@ -0,0 +1,12 @@
+"""Compiles the public site templates into the bytecode cache, so that
+workers do not compile them again on their first render. Run at deploy time.
+
+    python precompile_templates.py
+"""
+from highland import app, site_template
+
+if __name__ == '__main__':
+    for name in site_template.precompile():
+        print('compiled {}'.format(name))
+    print('bytecode cache:{}'.format(
+        app.config.get('SITE_TEMPLATE_CACHE_DIR') or 'temporary directory'))
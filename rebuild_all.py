@@ -0,0 +1,96 @@
+"""Rebuilds the feed and the public site of every show, in parallel across
+processes. Progress is recorded in the state file, so that a failed or
+interrupted run resumes with the shows not rebuilt yet.
+
+    python rebuild_all.py [--processes N] [--state FILE] [--restart]
+        [--show-id ID ...]
+"""
+from highland import app, models, feed_operation, public_view, show_snapshot
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--state', default='rebuild_all.state',
+                        help='file recording the rebuilt shows')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore the state of the previous run')
+    parser.add_argument('--show-id', type=int, nargs='*', dest='show_ids',
+                        help='shows to rebuild, all of them if not given')
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.state):
+        os.remove(args.state)
+    done = _load_done(args.state)
+
+    with app.app_context():
+        show_ids = args.show_ids or [x for x, in models.db.session.query(
+            models.Show.id).order_by(models.Show.id).all()]
+        # workers must not share the connections of this process
+        models.db.session.remove()
+        models.db.engine.dispose()
+    targets = [x for x in show_ids if x not in done]
+    print('{} shows to rebuild, {} already done'.format(
+        len(targets), len(show_ids) - len(targets)))
+
+    failed = []
+    start = time.perf_counter()
+    with open(args.state, 'a') as state, \
+            multiprocessing.Pool(args.processes) as pool:
+        for i, result in enumerate(
+                pool.imap_unordered(_rebuild, targets), 1):
+            state.write(json.dumps(result) + '\n')
+            state.flush()
+            if result.get('error'):
+                failed.append(result.get('show_id'))
+            print('[{}/{}] show:{} {:.2f}s {}'.format(
+                i, len(targets), result.get('show_id'),
+                result.get('seconds'), result.get('error') or 'ok'))
+    elapsed = time.perf_counter() - start
+
+    rebuilt = len(targets) - len(failed)
+    print('rebuilt {} shows in {:.2f}s ({:.2f} shows/s), {} failed'.format(
+        rebuilt, elapsed, rebuilt / elapsed if elapsed else 0, len(failed)))
+    if failed:
+        print('failed shows:{}. run again to retry them'.format(failed))
+        sys.exit(1)
+
+
+def _rebuild(show_id):
+    """Rebuilds the show in a worker process. Returns the result as dict."""
+    start = time.perf_counter()
+    error = None
+    with app.app_context():
+        try:
+            snapshot = show_snapshot.load(show_id)
+            public_view.sync(show_id, snapshot)
+            feed_operation.update(show_id, snapshot)
+        except Exception:
+            error = traceback.format_exc().strip().split('\n')[-1]
+            app.logger.error(
+                'Failed to rebuild show:{}'.format(show_id), exc_info=1)
+    return {
+        'show_id': show_id,
+        'seconds': time.perf_counter() - start,
+        'error': error
+    }
+
+
+def _load_done(state_file):
+    """Returns the ids of the shows rebuilt by the previous runs."""
+    if not os.path.exists(state_file):
+        return set()
+    with open(state_file) as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    return {x.get('show_id') for x in results if not x.get('error')}
+
+
+if __name__ == '__main__':
+    main()
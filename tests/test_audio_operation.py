@@ -1,8 +1,9 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
 from tests.utility import create_user, assign_ids
-from highland import app, audio_operation, media_operation, user_operation
+from highland import app, audio_operation, media_operation, media_storage, \
+    user_operation
 from highland.exception import NoSuchEntityError
 from highland.models import db, Audio, Episode
 
@@ -21,6 +22,33 @@ class TestAudioOperation(unittest.TestCase):
         self.assertEqual(1, result.get('owner_user_id'))
         self.assertEqual('some_guid', result.get('guid'))
 
+    @patch.object(app, 'config', {'S3_BUCKET_AUDIO': 'audio_bucket'})
+    @patch.object(db.session, 'commit')
+    @patch.object(db.session, 'add')
+    @patch.object(media_storage, 'upload_stream')
+    @patch.object(user_operation, 'get_model')
+    @patch('uuid.uuid4')
+    def test_ingest(self, mock_uuid4, mock_get_user, mock_upload_stream,
+                    mock_add, mock_commit):
+        mock_uuid4.return_value.hex = 'some_guid'
+        mock_get_user.return_value = create_user(id=1)
+        mock_upload_stream.return_value = (6400, 'some_checksum')
+        stream = MagicMock()
+
+        result = audio_operation.ingest(
+            1, stream, 'some.mp3', 120, 'audio/mpeg')
+
+        mock_upload_stream.assert_called_with(
+            stream, 'audio_bucket', '{}/some_guid'.format(
+                mock_get_user.return_value.identity_id),
+            ContentType='audio/mpeg')
+        mock_commit.assert_called_with()
+        self.assertEqual(
+            (1, 'some_guid', 120, 6400, 'some_checksum'),
+            (result.get('owner_user_id'), result.get('guid'),
+             result.get('duration'), result.get('length'),
+             result.get('checksum')))
+
     @patch.object(app, 'config')
     @patch.object(media_operation, 'delete')
     def test_delete(self, mock_media_delete, mock_config):
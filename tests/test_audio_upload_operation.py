@@ -0,0 +1,176 @@
+import unittest
+from unittest.mock import patch
+
+from tests.utility import create_user
+from highland import app, audio_upload_operation, media_storage, \
+    storage_backend, user_operation
+from highland.exception import AccessNotAllowedError, InvalidValueError
+from highland.models import db, MultipartUpload, MultipartUploadPart
+
+MB = 1024 * 1024
+
+
+@patch.object(app, 'config', {'S3_BUCKET_AUDIO': 'audio_bucket',
+                              'AUDIO_UPLOAD_URL_BATCH': 3,
+                              'AUDIO_UPLOAD_URL_SECONDS': 600})
+@patch.object(user_operation, 'get_model', return_value=create_user(1))
+class TestAudioUploadOperation(unittest.TestCase):
+    @patch.object(db, 'session')
+    @patch.object(media_storage, 'start_multipart_upload',
+                  return_value='s3_upload')
+    @patch('uuid.uuid4')
+    def test_start(self, mock_uuid4, mock_start, mock_session, mock_user):
+        mock_uuid4.return_value.hex = 'some_guid'
+
+        result = audio_upload_operation.start(
+            1, 'some.mp3', 120, 20 * MB, 'audio/mpeg')
+
+        mock_start.assert_called_with(
+            'audio_bucket', 'identity/some_guid', ContentType='audio/mpeg')
+        upload = mock_session.add.call_args[0][0]
+        self.assertEqual('s3_upload', upload.upload_id)
+        mock_session.commit.assert_called_with()
+        self.assertEqual(
+            (storage_backend.MULTIPART_PART_SIZE, 3, []),
+            (result['part_size'], result['part_count'], result['parts']))
+
+    @patch.object(media_storage, 'start_multipart_upload')
+    def test_start_raises_on_invalid_values(self, mock_start, mock_user):
+        for duration, length, file_type in [
+                (120, -1, 'audio/mpeg'), (120, None, 'audio/mpeg'),
+                (120, '1024', 'audio/mpeg'), (120, 1.5, 'audio/mpeg'),
+                (120, True, 'audio/mpeg'), ('120', 1024, 'audio/mpeg'),
+                (None, 1024, 'audio/mpeg'), (-1, 1024, 'audio/mpeg'),
+                (120, 1024, 'text/html'), (120, 1024, None)]:
+            with self.subTest(duration=duration, length=length,
+                              file_type=file_type):
+                with self.assertRaises(InvalidValueError):
+                    audio_upload_operation.start(
+                        1, 'some.mp3', duration, length, file_type)
+        mock_start.assert_not_called()
+
+    def test_part_size_keeps_parts_within_limit(self, mock_user):
+        self.assertEqual(
+            storage_backend.MULTIPART_PART_SIZE,
+            audio_upload_operation._get_part_size(0))
+        length = storage_backend.MULTIPART_PART_SIZE * \
+            storage_backend.MULTIPART_MAX_PARTS * 2 + 1
+        size = audio_upload_operation._get_part_size(length)
+        self.assertEqual(
+            storage_backend.MULTIPART_MAX_PARTS,
+            audio_upload_operation._get_part_count(
+                self._create_upload(length=length, part_size=size)))
+
+    @patch.object(media_storage, 'get_part_urls')
+    @patch.object(MultipartUpload, 'query')
+    def test_get_part_urls(self, mock_query, mock_get_urls, mock_user):
+        mock_query.filter_by.return_value.first.return_value = \
+            self._create_upload()
+
+        audio_upload_operation.get_part_urls(1, 5, [1, 3])
+
+        mock_get_urls.assert_called_with(
+            'audio_bucket', 'identity/some_guid', 's3_upload', [1, 3], 600)
+        for part_numbers in ([1, 2, 3, 4], [0], [4], ['1']):
+            with self.assertRaises(InvalidValueError):
+                audio_upload_operation.get_part_urls(1, 5, part_numbers)
+
+    @patch.object(MultipartUpload, 'query')
+    def test_get_raises_when_not_owned_by_the_user(
+            self, mock_query, mock_user):
+        mock_query.filter_by.return_value.first.return_value = \
+            self._create_upload()
+
+        with self.assertRaises(AccessNotAllowedError):
+            audio_upload_operation.get(9, 5)
+
+    @patch.object(db, 'session')
+    @patch.object(MultipartUploadPart, 'query')
+    @patch.object(MultipartUpload, 'query')
+    def test_record_parts(self, mock_query, mock_part_query, mock_session,
+                          mock_user):
+        mock_query.filter_by.return_value.first.return_value = \
+            self._create_upload()
+        recorded = MultipartUploadPart(5, 2, 'old')
+        mock_part_query.filter_by.return_value.order_by.return_value.\
+            all.return_value = [recorded]
+
+        result = audio_upload_operation.record_parts(
+            1, 5, [(2, 'etag2'), (1, 'etag1')])
+
+        self.assertEqual('etag2', recorded.etag)
+        added = mock_session.add.call_args[0][0]
+        self.assertEqual((5, 1, 'etag1'),
+                         (added.multipart_upload_id, added.part_number,
+                          added.etag))
+        mock_session.commit.assert_called_with()
+        self.assertEqual(
+            [{'part_number': 1, 'etag': 'etag1'},
+             {'part_number': 2, 'etag': 'etag2'}], result['parts'])
+        with self.assertRaises(InvalidValueError):
+            audio_upload_operation.record_parts(1, 5, [(4, 'etag4')])
+        with self.assertRaises(InvalidValueError):
+            audio_upload_operation.record_parts(1, 5, [(3, '')])
+
+    @patch.object(db, 'session')
+    @patch.object(media_storage, 'complete_multipart_upload')
+    @patch.object(MultipartUploadPart, 'query')
+    @patch.object(MultipartUpload, 'query')
+    def test_complete(self, mock_query, mock_part_query, mock_complete,
+                      mock_session, mock_user):
+        upload = self._create_upload()
+        mock_query.filter_by.return_value.first.return_value = upload
+        mock_part_query.filter_by.return_value.order_by.return_value.\
+            all.return_value = [MultipartUploadPart(5, x, 'etag{}'.format(x))
+                                for x in (1, 2, 3)]
+
+        result = audio_upload_operation.complete(1, 5)
+
+        mock_complete.assert_called_with(
+            'audio_bucket', 'identity/some_guid', 's3_upload',
+            [(1, 'etag1'), (2, 'etag2'), (3, 'etag3')])
+        self.assertEqual(
+            ('some_guid', 20 * MB, 1, None),
+            (result['guid'], result['length'], result['owner_user_id'],
+             result['checksum']))
+        mock_session.delete.assert_called_with(upload)
+        mock_session.commit.assert_called_with()
+
+    @patch.object(db, 'session')
+    @patch.object(media_storage, 'complete_multipart_upload')
+    @patch.object(MultipartUploadPart, 'query')
+    @patch.object(MultipartUpload, 'query')
+    def test_complete_raises_when_parts_are_missing(
+            self, mock_query, mock_part_query, mock_complete, mock_session,
+            mock_user):
+        mock_query.filter_by.return_value.first.return_value = \
+            self._create_upload()
+        mock_part_query.filter_by.return_value.order_by.return_value.\
+            all.return_value = [MultipartUploadPart(5, 2, 'etag2')]
+
+        with self.assertRaises(InvalidValueError):
+            audio_upload_operation.complete(1, 5)
+        mock_complete.assert_not_called()
+        mock_session.commit.assert_not_called()
+
+    @patch.object(db, 'session')
+    @patch.object(media_storage, 'abort_multipart_upload')
+    @patch.object(MultipartUpload, 'query')
+    def test_abort(self, mock_query, mock_abort, mock_session, mock_user):
+        upload = self._create_upload()
+        mock_query.filter_by.return_value.first.return_value = upload
+
+        self.assertTrue(audio_upload_operation.abort(1, 5))
+
+        mock_abort.assert_called_with(
+            'audio_bucket', 'identity/some_guid', 's3_upload')
+        mock_session.delete.assert_called_with(upload)
+        mock_session.commit.assert_called_with()
+
+    def _create_upload(self, length=20 * MB,
+                       part_size=storage_backend.MULTIPART_PART_SIZE):
+        upload = MultipartUpload(1, 'some.mp3', 120, length, 'audio/mpeg',
+                                 'some_guid', part_size)
+        upload.id = 5
+        upload.upload_id = 's3_upload'
+        return upload
@@ -0,0 +1,72 @@
+import unittest
+
+from highland import cache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_put(self):
+        c = cache.LRUCache(2)
+        self.assertIsNone(c.get('a'))
+        self.assertEqual('default', c.get('a', 'default'))
+        self.assertEqual(1, c.put('a', 1))
+        self.assertEqual(1, c.get('a'))
+
+    def test_evicts_least_recently_used(self):
+        c = cache.LRUCache(2)
+        c.put('a', 1)
+        c.put('b', 2)
+        c.get('a')
+        c.put('c', 3)
+
+        self.assertEqual(1, c.get('a'))
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(3, c.get('c'))
+        self.assertEqual(2, len(c))
+
+    def test_bounded_by_size_of_values(self):
+        c = cache.LRUCache(10, size_of=len)
+        c.put('a', b'12345')
+        c.put('b', b'1234')
+        c.put('c', b'123')
+
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(7, c.size)
+
+        c.put('b', b'1')
+        self.assertEqual(4, c.size)
+
+    def test_value_larger_than_cache_is_not_kept(self):
+        c = cache.LRUCache(3, size_of=len)
+        self.assertEqual(b'12345', c.put('a', b'12345'))
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(0, c.size)
+
+    def test_pop(self):
+        c = cache.LRUCache(10, size_of=len)
+        c.put('a', b'123')
+
+        self.assertEqual(b'123', c.pop('a'))
+        self.assertIsNone(c.pop('a'))
+        self.assertEqual(0, c.size)
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_values_expire(self):
+        now = [100]
+        c = cache.TTLCache(2, 10, clock=lambda: now[0])
+        c.put('a', 1)
+
+        now[0] = 109
+        self.assertEqual(1, c.get('a'))
+        now[0] = 110
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(0, len(c))
+
+    def test_bounded_by_size_of_values(self):
+        c = cache.TTLCache(5, 10, size_of=len)
+        c.put('a', b'123')
+        c.put('b', b'123')
+
+        self.assertIsNone(c.get('a'))
+        self.assertEqual(b'123', c.get('b'))
+        self.assertEqual(3, c.size)
@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 import unittest
 from unittest.mock import patch, MagicMock
 from highland import show_operation, episode_operation, models, audio_operation,\
-    image_operation, exception
+    image_operation, exception, common, feed_operation
 from highland.exception import AccessNotAllowedError, InvalidValueError,\
     NoSuchEntityError, ValueError
 from highland.models import db, Episode, Show
@@ -66,7 +66,7 @@ class TestEpisodeOperation(unittest.TestCase):
             subtitle='n_sub', description='n_desc', explicit=True)
 
         mock_verify.assert_called_with(episode)
-        mock_update_show.assert_called_with(episode)
+        mock_update_show.assert_called_with(episode, was_published=False)
         mock_session.commit.assert_called_with()
         self.assertEqual(101, episode.show_id)
         self.assertEqual(1, episode.owner_user_id)
@@ -117,6 +117,42 @@ class TestEpisodeOperation(unittest.TestCase):
             all.return_value = [(episode, show)]
         return episode, show
 
+    @patch.object(db, 'session')
+    @patch.object(show_operation, 'get_model')
+    def test_publish_changes_feed_etag(self, mock_get_show, mock_session):
+        show = self._create_show()
+        show.last_build_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        mock_get_show.return_value = show
+        episode = self._create_episode()
+        episode.draft_status = Episode.DraftStatus.scheduled.name
+        etag = feed_operation.get_etag(show)
+
+        episode_operation.publish(episode)
+
+        self.assertEqual(Episode.DraftStatus.published.name,
+                         episode.draft_status)
+        self.assertNotEqual(etag, feed_operation.get_etag(show))
+        mock_session.commit.assert_called_with()
+
+    @patch.object(db, 'session')
+    @patch.object(show_operation, 'get_model')
+    @patch.object(episode_operation, '_verify_episode')
+    @patch.object(episode_operation, '_get_model')
+    def test_unpublish_changes_feed_etag(
+            self, mock_get_episode, mock_verify, mock_get_show,
+            mock_session):
+        show = self._create_show()
+        show.last_build_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        mock_get_show.return_value = show
+        episode = self._create_episode()
+        episode.draft_status = Episode.DraftStatus.published.name
+        mock_get_episode.return_value = episode
+        etag = feed_operation.get_etag(show)
+
+        episode_operation.update(1, 201, draft_status='draft')
+
+        self.assertNotEqual(etag, feed_operation.get_etag(show))
+
     @patch.object(episode_operation, '_update_show_build_datetime')
     @patch.object(db, 'session')
     def test_delete(self, mock_session, mock_update_show):
@@ -244,8 +280,9 @@ class TestEpisodeOperation(unittest.TestCase):
         mocked_query.filter_by.assert_called_with(
             draft_status=models.Episode.DraftStatus.scheduled.name)
 
+    @patch.object(show_operation, 'get_model')
     @patch.object(models.db.session, 'commit')
-    def test_publish(self, mocked_commit):
+    def test_publish(self, mocked_commit, mocked_get_show):
         mocked_episode = MagicMock()
 
         result = episode_operation.publish(mocked_episode)
@@ -253,6 +290,9 @@ class TestEpisodeOperation(unittest.TestCase):
         self.assertEqual(result, mocked_episode)
         self.assertEqual(models.Episode.DraftStatus.published.name,
                          mocked_episode.draft_status)
+        mocked_get_show.assert_called_with(mocked_episode.show_id)
+        self.assertTrue(datetime_almost_utcnow(
+            mocked_get_show.return_value.last_build_datetime))
         mocked_commit.assert_called_with()
 
     @patch.object(models.db.session, 'commit')
@@ -293,6 +333,28 @@ class TestEpisodeOperation(unittest.TestCase):
         mocked_access.assert_called_with(mocked_user.id, mocked_episode)
         mocked_get_show.assert_called_with(mocked_user, mocked_episode.show_id)
 
+    @patch.object(common, 'clean_html')
+    def test_get_description_html_stored(self, mocked_clean_html):
+        episode = self._create_episode()
+        episode.description_html = '<p>stored</p>'
+
+        self.assertEqual('<p>stored</p>',
+                         episode_operation.get_description_html(episode))
+        mocked_clean_html.assert_not_called()
+
+    @patch.object(common, 'clean_html')
+    def test_get_description_html_cached(self, mocked_clean_html):
+        mocked_clean_html.return_value = '<p>clean</p>'
+        episode_operation.description_cache.clear()
+        first, second = self._create_episode(), self._create_episode()
+        first.description = second.description = '<p>raw</p>'
+
+        self.assertEqual('<p>clean</p>',
+                         episode_operation.get_description_html(first))
+        self.assertEqual('<p>clean</p>',
+                         episode_operation.get_description_html(second))
+        mocked_clean_html.assert_called_once_with('<p>raw</p>')
+
     def test_get_preview_episode(self):
         episode_operation.get_preview_episode(
             MagicMock(), MagicMock(), '', '', '', 1, 2)
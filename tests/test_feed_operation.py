@@ -1,141 +1,390 @@
+import io
 import unittest
-from feedgen.feed import FeedGenerator
-from feedgen.ext.podcast import PodcastExtension
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
-from highland import feed_operation, show_operation, episode_operation,\
-    media_storage, audio_operation, image_operation, settings, common
+from highland import feed_operation, episode_operation, audio_operation,\
+    image_operation, settings, common, models, published_file_operation,\
+    show_snapshot, upload_manager
+from highland.models import Audio, Episode, FeedItem, Image, Show
+from tests.utility import assign_ids
 
 
 class TestFeedOperation(unittest.TestCase):
+    @patch.object(models.db, 'session')
+    @patch.object(published_file_operation, 'delete_except')
+    @patch.object(published_file_operation, 'upload_if_changed')
+    @patch.object(feed_operation, '_write')
+    @patch.object(feed_operation, '_load')
+    def test_update(self, mock_load, mock_write, mock_upload,
+                    mock_delete_except, mock_session):
+        data = feed_operation.FeedData(
+            MagicMock(), MagicMock(), MagicMock(), [], 0, None)
+        data.show.feed_page_size = None
+        mock_load.return_value = data
+        mock_write.side_effect = \
+            lambda out, data, items, **kwargs: out.write(b'feed')
+        uploaded = []
+        mock_upload.side_effect = \
+            lambda show_id, body, *args, **kwargs: \
+            uploaded.append(body.read()) or True
+
+        result = feed_operation.update(1)
+
+        self.assertTrue(result)
+        self.assertEqual([b'feed'], uploaded)
+        mock_load.assert_called_with(1, None)
+        args, kwargs = mock_upload.call_args
+        self.assertEqual(data.show.id, args[0])
+        self.assertEqual((settings.S3_BUCKET_FEED, data.show.alias,
+                          feed_operation.FEED_FOLDER_RSS), args[2:])
+        self.assertEqual(
+            {'ContentType': feed_operation.FEED_CONTENT_TYPE}, kwargs)
+        mock_delete_except.assert_called_with(
+            data.show.id, settings.S3_BUCKET_FEED,
+            'rss_archive/{}'.format(data.show.alias), [])
+        mock_session.commit.assert_called_with()
+
+    @patch.object(models.db, 'session')
+    @patch.object(published_file_operation, 'delete_except')
+    @patch.object(published_file_operation, 'upload_if_changed')
+    @patch.object(feed_operation, '_write')
+    @patch.object(feed_operation, '_load')
+    def test_update_reports_skipped_upload(
+            self, mock_load, mock_write, mock_upload, mock_delete_except,
+            mock_session):
+        mock_load.return_value.show.feed_page_size = None
+        mock_upload.return_value = False
+        self.assertFalse(feed_operation.update(1))
+        mock_session.commit.assert_called_with()
+
+    @patch.object(models.db, 'session')
+    @patch.object(published_file_operation, 'delete_except')
+    @patch.object(feed_operation, '_upload')
+    @patch.object(feed_operation, '_items')
+    @patch.object(feed_operation, '_load')
+    def test_update_deletes_archive_pages_once_unpaged(
+            self, mock_load, mock_items, mock_upload, mock_delete_except,
+            mock_session):
+        show = MagicMock()
+        show.alias = 'alias'
+        episodes = [MagicMock(update_datetime=datetime(
+            2016, 1, 1 + x, tzinfo=timezone.utc)) for x in range(5)]
+        mock_load.return_value = feed_operation.FeedData(
+            MagicMock(), show, None, [], len(episodes), None)
+        mock_items.side_effect = \
+            lambda data: iter((e, b'item') for e in episodes)
+        published = set()
+
+        def upload(data, folder, file_name, items, **kwargs):
+            list(items)
+            published.add('{}/{}'.format(folder, file_name))
+            return True
+
+        def delete_except(show_id, bucket, folder, file_names):
+            keep = {'{}/{}'.format(folder, x) for x in file_names}
+            published.difference_update(
+                {x for x in published
+                 if x.startswith(folder + '/') and x not in keep})
+
+        mock_upload.side_effect = upload
+        mock_delete_except.side_effect = delete_except
+
+        show.feed_page_size = 2
+        feed_operation.update(1)
+        self.assertEqual(
+            {'rss/alias', 'rss_archive/alias/1', 'rss_archive/alias/2'},
+            published)
+
+        show.feed_page_size = 0
+        feed_operation.update(1)
+        self.assertEqual({'rss/alias'}, published)
+
+    @patch.object(feed_operation, '_render')
+    def test_get_cached_renders_once_per_build(self, mock_render):
+        show = MagicMock()
+        show.last_build_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        mock_render.side_effect = [b'first', b'second']
+        feed_operation.feed_cache.clear()
+
+        self.assertEqual(b'first', feed_operation.get_cached(show))
+        self.assertEqual(b'first', feed_operation.get_cached(show))
+        show.last_build_datetime = datetime(2016, 1, 2, tzinfo=timezone.utc)
+        self.assertEqual(b'second', feed_operation.get_cached(show))
+        self.assertEqual(2, mock_render.call_count)
+
+    @patch.object(published_file_operation, 'delete_except')
+    @patch.object(feed_operation, '_upload')
+    @patch.object(feed_operation, '_items')
+    @patch('highland.app.config')
+    def test_update_paged(self, mock_config, mock_items, mock_upload,
+                          mock_delete_except):
+        mock_config.get.side_effect = \
+            lambda key: {'HOST_FEED': 'http://feed',
+                         'S3_BUCKET_FEED': 'feed_bucket'}.get(key)
+        show = MagicMock()
+        show.alias = 'alias'
+        episodes = [MagicMock() for x in range(7)]
+        data = feed_operation.FeedData(
+            MagicMock(), show, None, [(e, None, None, None) for e in episodes],
+            len(episodes), None)
+        for i, e in enumerate(episodes):
+            e.update_datetime = datetime(2016, 1, 7 - i, tzinfo=timezone.utc)
+        mock_items.return_value = \
+            iter((e, str(i).encode('utf-8')) for i, e in enumerate(episodes))
+        uploads = []
+        mock_upload.side_effect = \
+            lambda data, folder, file_name, items, **kwargs: \
+            uploads.append((folder, file_name, list(items), kwargs))
+
+        feed_operation._update_paged(data, 3)
+
+        main, page_2, page_1 = uploads
+        self.assertEqual(('rss', 'alias', [b'0', b'1', b'2']), main[:3])
+        self.assertEqual(
+            [('first', 'http://feed/rss_archive/alias/1'),
+             ('prev-archive', 'http://feed/rss_archive/alias/2')],
+            main[3].get('links'))
+        self.assertEqual(('rss_archive/alias', '2', [b'3']), page_2[:3])
+        self.assertTrue(page_2[3].get('archive'))
+        self.assertEqual(
+            episodes[3].update_datetime,
+            page_2[3].get('last_build_datetime'))
+        self.assertEqual(
+            [('first', 'http://feed/rss_archive/alias/1'),
+             ('current', 'http://feed/rss/alias'),
+             ('prev-archive', 'http://feed/rss_archive/alias/1')],
+            page_2[3].get('links'))
+        self.assertEqual(
+            ('rss_archive/alias', '1', [b'4', b'5', b'6']), page_1[:3])
+        self.assertEqual(
+            [('first', 'http://feed/rss_archive/alias/1'),
+             ('current', 'http://feed/rss/alias'),
+             ('next-archive', 'http://feed/rss_archive/alias/2')],
+            page_1[3].get('links'))
+        mock_delete_except.assert_called_with(
+            show.id, 'feed_bucket', 'rss_archive/alias', ['1', '2'])
+
+    def test_get_archive_page_count(self):
+        self.assertEqual(0, feed_operation._get_archive_page_count(-2, 3))
+        self.assertEqual(0, feed_operation._get_archive_page_count(0, 3))
+        self.assertEqual(1, feed_operation._get_archive_page_count(1, 3))
+        self.assertEqual(1, feed_operation._get_archive_page_count(3, 3))
+        self.assertEqual(2, feed_operation._get_archive_page_count(4, 3))
+
+    @patch.object(feed_operation, '_query_last_build_datetime')
+    @patch.object(episode_operation, 'query_public_with_media')
+    @patch.object(show_snapshot, 'load_show')
+    @patch.object(show_snapshot, 'load')
+    def test_load_streams_episodes(self, mock_load_snapshot, mock_load_show,
+                                   mock_query, mock_last_build):
+        user, show, show_image = MagicMock(), MagicMock(), MagicMock()
+        mock_load_show.return_value = (user, show, show_image)
+        mock_query.return_value.count.return_value = 2
+        streamed = mock_query.return_value.outerjoin.return_value. \
+            add_entity.return_value.yield_per.return_value
+
+        result = feed_operation._load(1)
+
+        mock_load_snapshot.assert_not_called()
+        mock_load_show.assert_called_with(1)
+        mock_query.assert_called_with(show.id)
+        mock_query.return_value.outerjoin.return_value.add_entity. \
+            assert_called_with(FeedItem)
+        mock_query.return_value.outerjoin.return_value.add_entity. \
+            return_value.yield_per.assert_called_with(
+                feed_operation.FEED_QUERY_BATCH_SIZE)
+        mock_last_build.assert_called_with(mock_query.return_value, show)
+        self.assertEqual(
+            feed_operation.FeedData(user, show, show_image, streamed, 2,
+                                    mock_last_build.return_value),
+            result)
+
+    @patch.object(FeedItem, 'query')
+    @patch.object(show_snapshot, 'load')
+    def test_load_from_snapshot(self, mock_load_snapshot, mock_query):
+        episodes = assign_ids([Episode(1, 1, 'title', 'subtitle', 'desc',
+                                       None, 'published', None, False, None,
+                                       str(i)) for i in range(2)], 10)
+        episodes[0].create_datetime = datetime(2016, 5, 2, tzinfo=timezone.utc)
+        episodes[1].create_datetime = datetime(2016, 5, 1, tzinfo=timezone.utc)
+        episodes[1].update_datetime = datetime(2016, 5, 3, tzinfo=timezone.utc)
+        audio, image = MagicMock(), MagicMock()
+        snapshot = show_snapshot.ShowSnapshot(
+            MagicMock(), MagicMock(), MagicMock(),
+            [(episodes[0], audio, image), (episodes[1], None, None)])
+        snapshot.show.feed_page_size = None
+        item = FeedItem(11)
+        mock_query.join.return_value.filter.return_value.all.return_value = \
+            [item]
+
+        result = feed_operation._load(1, snapshot)
+
+        mock_load_snapshot.assert_not_called()
+        self.assertEqual(snapshot.user, result.user)
+        self.assertEqual(snapshot.show, result.show)
+        self.assertEqual(snapshot.show_image, result.show_image)
+        self.assertEqual(
+            [(episodes[0], audio, image, None),
+             (episodes[1], None, None, item)], result.episodes)
+        self.assertEqual(2, result.episode_count)
+        self.assertEqual(episodes[1].update_datetime,
+                         result.last_build_datetime)
+
+        # only the episodes in the main feed count when paged
+        snapshot.show.feed_page_size = 1
+        self.assertEqual(episodes[0].create_datetime,
+                         feed_operation._load(1, snapshot).last_build_datetime)
+
+    @patch.object(models.db, 'session')
+    @patch.object(upload_manager, 'upload')
+    @patch.object(published_file_operation, 'record')
+    @patch.object(published_file_operation, 'get_model')
+    @patch.object(FeedItem, 'query')
+    @patch.object(audio_operation, 'get_audio_url',
+                  return_value='http://audio/a.mp3')
+    @patch.object(episode_operation, 'get_episode_url',
+                  return_value='http://site/show/ep')
+    def test_update_skips_rebuild_without_changes(
+            self, mock_get_episode_url, mock_get_audio_url, mock_query,
+            mock_get_model, mock_record, mock_upload, mock_session):
+        show = Show(1, 'title', 'desc', 'sub', 'en', 'author', 'Technology',
+                    False, None, 'show')
+        show.id = 1
+        show.url = 'http://site/show'
+        show.last_build_datetime = datetime(2016, 5, 1, tzinfo=timezone.utc)
+        episode = Episode(1, 1, 'ep title', 'ep sub', 'desc', 10,
+                          'published', None, False, None, 'ep')
+        episode.id = 10
+        episode.guid = 'some_guid'
+        episode.create_datetime = datetime(2016, 4, 1, tzinfo=timezone.utc)
+        user = MagicMock(id=1, email='owner@example.com')
+        user.name = 'owner'
+        snapshot = show_snapshot.ShowSnapshot(
+            user, show, None,
+            [(episode, Audio(1, 'a.mp3', 61, 128, 'audio/mpeg', 'guid'),
+              None)])
+        mock_query.join.return_value.filter.return_value.all.return_value = \
+            []
+        recorded = {}
+        mock_get_model.side_effect = lambda bucket, key: recorded.get(key)
+        mock_record.side_effect = \
+            lambda show_id, bucket, key, digest, **kwargs: \
+            recorded.__setitem__(key, MagicMock(digest=digest))
+        uploaded = []
+        mock_upload.side_effect = \
+            lambda body, *args, **kwargs: uploaded.append(body.read())
+
+        self.assertTrue(feed_operation.update(1, snapshot))
+        # rebuilt as something other than the feed's items changed
+        show.last_build_datetime = datetime(2016, 5, 2, tzinfo=timezone.utc)
+        self.assertFalse(feed_operation.update(1, snapshot))
+        self.assertEqual(1, len(uploaded))
+
+        episode.title = 'edited'
+        episode.update_datetime = datetime(2016, 5, 3, tzinfo=timezone.utc)
+        self.assertTrue(feed_operation.update(1, snapshot))
+        self.assertIn(b'<lastBuildDate>Tue, 03 May 2016 00:00:00 +0000',
+                      uploaded[-1])
+
+    @patch.object(feed_operation, '_items')
+    @patch.object(feed_operation, '_channel')
+    def test_generate_splices_items_into_channel(
+            self, mock_channel, mock_items):
+        mock_channel.return_value.rss_str.return_value = \
+            b'<rss>\n  <channel>\n    <title>t</title>\n  </channel>\n</rss>\n'
+        mock_items.return_value = [(MagicMock(), b'    <item>1</item>\n'),
+                                   (MagicMock(), b'    <item>2</item>\n')]
+        data = MagicMock()
+
+        result = feed_operation._generate(data)
+
+        mock_channel.return_value.rss_str.assert_called_with(pretty=True)
+        mock_items.assert_called_with(data)
+        self.assertEqual(
+            b'<rss>\n  <channel>\n    <title>t</title>\n'
+            b'    <item>1</item>\n    <item>2</item>\n'
+            b'  </channel>\n</rss>\n', result)
+
+    @patch.object(feed_operation, '_channel')
+    def test_write_adds_archive_and_links(self, mock_channel):
+        mock_channel.return_value.rss_str.return_value = \
+            b'<rss>\n  <channel>\n    <title>t</title>\n  </channel>\n</rss>\n'
+        out = io.BytesIO()
+        last_build_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+
+        feed_operation._write(
+            out, MagicMock(), [b'    <item>1</item>\n'],
+            links=[('current', 'http://feed/rss/alias')], archive=True,
+            last_build_datetime=last_build_datetime)
+
+        self.assertEqual(
+            last_build_datetime, mock_channel.call_args[0][1])
+        self.assertEqual(
+            b'<rss>\n  <channel>\n    <title>t</title>\n'
+            b'    <fh:archive'
+            b' xmlns:fh="http://purl.org/syndication/history/1.0"/>\n'
+            b'    <atom:link href="http://feed/rss/alias" rel="current"/>\n'
+            b'    <item>1</item>\n'
+            b'  </channel>\n</rss>\n', out.getvalue())
+
+    @patch.object(feed_operation, '_render_item')
+    @patch.object(feed_operation, '_item_fingerprint')
+    @patch.object(models.db, 'session')
+    def test_items_renders_only_changed_items(
+            self, mock_session, mock_fingerprint, mock_render):
+        unchanged, changed, added = MagicMock(), MagicMock(), MagicMock()
+        unchanged.id, changed.id, added.id = 1, 2, 3
+        cached_unchanged, cached_changed = FeedItem(1), FeedItem(2)
+        cached_unchanged.fingerprint, cached_unchanged.xml = 'fp1', 'one'
+        cached_changed.fingerprint, cached_changed.xml = 'old', 'two'
+        mock_fingerprint.side_effect = \
+            lambda data, episode, audio, image: 'fp{}'.format(episode.id)
+        mock_render.side_effect = \
+            lambda data, episode, audio, image: \
+            'new{}'.format(episode.id).encode('utf-8')
+        data = feed_operation.FeedData(
+            MagicMock(), MagicMock(), None,
+            [(unchanged, MagicMock(), None, cached_unchanged),
+             (changed, MagicMock(), None, cached_changed),
+             (added, MagicMock(), None, None)], 3, None)
+
+        result = list(feed_operation._items(data))
+
+        self.assertEqual([unchanged, changed, added], [e for e, _ in result])
+        self.assertEqual([b'one', b'new2', b'new3'], [x for _, x in result])
+        self.assertEqual(2, mock_render.call_count)
+        self.assertEqual('fp2', cached_changed.fingerprint)
+        self.assertEqual(1, mock_session.add.call_count)
+        mock_session.commit.assert_not_called()
+
     @patch.object(image_operation, 'get_image_url')
-    @patch.object(image_operation, 'get_image_or_assert')
-    @patch.object(feed_operation, '_format_seconds')
     @patch.object(audio_operation, 'get_audio_url')
-    @patch.object(audio_operation, 'get_audio_or_assert')
-    @patch.object(FeedGenerator, 'add_entry')
-    @patch.object(FeedGenerator, 'rss_str')
-    @patch.object(PodcastExtension, 'itunes_image')
-    @patch.object(PodcastExtension, 'itunes_summary')
-    @patch.object(PodcastExtension, 'itunes_subtitle')
-    @patch.object(PodcastExtension, 'itunes_owner')
-    @patch.object(PodcastExtension, 'itunes_explicit')
-    @patch.object(PodcastExtension, 'itunes_category')
-    @patch.object(PodcastExtension, 'itunes_author')
-    @patch.object(FeedGenerator, 'lastBuildDate')
-    @patch.object(FeedGenerator, 'language')
-    @patch.object(FeedGenerator, 'link')
-    @patch.object(FeedGenerator, 'description')
-    @patch.object(FeedGenerator, 'title')
-    @patch.object(media_storage, 'upload')
     @patch.object(episode_operation, 'get_episode_url')
-    @patch.object(episode_operation, 'load_public')
-    @patch.object(show_operation, 'get_show_url')
-    @patch.object(show_operation, 'get_show_or_assert')
-    def test_update(
-            self,
-            mocked_get_show, mocked_get_show_url,
-            mocked_load_episode, mocked_get_episode_url,
-            mocked_upload,
-            mocked_fg_title, mocked_fg_description, mocked_fg_link,
-            mocked_fg_language, mocked_fg_last_build_date,
-            mocked_i_author, mocked_i_category, mocked_i_explicit,
-            mocked_i_owner, mocked_i_subtitle, mocked_i_summary,
-            mocked_i_image,
-            mocked_fg_rss_str, mocked_fg_add_entry,
-            mocked_get_audio, mocked_get_audio_url, mocked_format_seconds,
-            mocked_get_image, mocked_get_image_url):
-        mocked_user = MagicMock()
-        mocked_show = MagicMock()
-        mocked_show.image_id = 1
-        image_url_show = 'some_url_show_image'
-        mocked_show_url = MagicMock()
-        mocked_episode = MagicMock()
-        mocked_episode.image_id = 2
-        mocked_episode.description = 'some description'
-        image_url_episode = 'some_url_episode_image'
-        mocked_episode_url = MagicMock()
-        mocked_content = MagicMock()
-        mocked_audio = MagicMock()
-        audio_url = 'some_audio_url'
-        formatted_seconds = '0:25:12'
-        mocked_fe = MagicMock()
-        mocked_image_show = MagicMock()
-        mocked_image_episode = MagicMock()
-
-        mocked_get_show.return_value = mocked_show
-        mocked_get_show_url.return_value = mocked_show_url
-        mocked_load_episode.return_value = [mocked_episode]
-        mocked_get_episode_url.return_value = mocked_episode_url
-        mocked_fg_rss_str.return_value = mocked_content
-        mocked_fg_add_entry.return_value = mocked_fe
-
-        mocked_get_audio.return_value = mocked_audio
-        mocked_get_audio_url.return_value = audio_url
-        mocked_format_seconds.return_value = formatted_seconds
-
-        def get_image_side_effect(user, image_id):
-            if image_id == mocked_show.image_id:
-                return mocked_image_show
-            elif image_id == mocked_episode.image_id:
-                return mocked_image_episode
-            assert False
-        mocked_get_image.side_effect = get_image_side_effect
-
-        def get_image_url_side_effect(user, image):
-            if image == mocked_image_show:
-                return image_url_show
-            elif image == mocked_image_episode:
-                return image_url_episode
-            assert False
-        mocked_get_image_url.side_effect = get_image_url_side_effect
-
-        feed_operation.update(mocked_user, mocked_show.id)
-
-        mocked_get_show.assert_called_with(mocked_user, mocked_show.id)
-        mocked_fg_title.assert_called_with(mocked_show.title)
-        mocked_fg_description.assert_called_with(mocked_show.description)
-        mocked_fg_link.assert_called_with(href=mocked_show_url)
-        mocked_fg_language.assert_called_with(mocked_show.language)
-        mocked_fg_last_build_date.assert_called_with(
-            mocked_show.last_build_datetime)
-        mocked_i_author.assert_called_with(mocked_show.author)
-        mocked_i_category.assert_called_with(mocked_show.category)
-        mocked_i_explicit.assert_called_with(
-            'yes' if mocked_show.explicit else 'no')
-        mocked_i_owner.assert_called_with(name=mocked_user.name,
-                                          email=mocked_user.email)
-        mocked_i_subtitle.assert_called_with(mocked_show.subtitle)
-        mocked_i_summary.assert_called_with(mocked_show.description)
-        mocked_get_image.assert_any_call(mocked_user, mocked_show.image_id)
-        mocked_i_image.assert_called_with(image_url_show)
-
-        mocked_fg_rss_str.assert_called_with(pretty=True)
-        mocked_get_episode_url.assert_called_with(mocked_user, mocked_episode,
-                                                  mocked_show)
-        mocked_fg_add_entry.assert_called_with()
-        mocked_fe.title.assert_called_with(mocked_episode.title)
-        mocked_fe.link.assert_called_with(href=mocked_episode_url)
-        mocked_fe.description.assert_called_with(mocked_episode.description)
-        mocked_fe.enclosure.assert_called_with(
-            url=audio_url, length=str(mocked_audio.length),
-            type=mocked_audio.type)
-        mocked_fe.guid.assert_called_with(mocked_episode.guid)
-        mocked_fe.pubdate.assert_called_with(mocked_episode.update_datetime)
-        mocked_fe.podcast.itunes_author.\
-            assert_called_with(mocked_show.author)
-        mocked_fe.podcast.itunes_duration.\
-            assert_called_with(formatted_seconds)
-        mocked_fe.podcast.itunes_explicit.\
-            assert_called_with('yes' if mocked_episode.explicit else 'no')
-        mocked_fe.podcast.itunes_subtitle.\
-            assert_called_with(mocked_episode.subtitle)
-        mocked_get_image.assert_any_call(mocked_user, mocked_episode.image_id)
-        mocked_fe.podcast.itunes_image.assert_called_with(image_url_episode)
-
-        mocked_upload.assert_called_with(
-            mocked_content, settings.S3_BUCKET_FEED, mocked_show.alias,
-            feed_operation.FEED_FOLDER_RSS,
-            ContentType=feed_operation.FEED_CONTENT_TYPE)
+    def test_render_item(
+            self, mock_get_episode_url, mock_get_audio_url,
+            mock_get_image_url):
+        mock_get_episode_url.return_value = 'http://site/alias/1'
+        mock_get_audio_url.return_value = 'http://audio/a.mp3'
+        mock_get_image_url.return_value = 'http://image/a.jpg'
+        episode = Episode(1, 1, 'ep title', 'ep sub', '<p>desc</p>', 10,
+                          'published', None, False, 20, '1')
+        episode.guid = 'some_guid'
+        episode.create_datetime = datetime(2016, 5, 1, tzinfo=timezone.utc)
+        audio = Audio(1, 'a.mp3', 61, 128, 'audio/mpeg', 'audio_guid')
+        show = MagicMock()
+        show.author = 'some author'
+        data = feed_operation.FeedData(
+            MagicMock(), show, None, [], 0, None)
+
+        result = feed_operation._render_item(data, episode, audio, Image(
+            1, 'a.jpg', 'image_guid', 'image/jpeg')).decode('utf-8')
+
+        self.assertTrue(result.startswith('    <item>\n      <title>'))
+        self.assertTrue(result.endswith('    </item>\n'))
+        self.assertIn('<itunes:duration>0:01:01</itunes:duration>', result)
+        self.assertIn('<itunes:image href="http://image/a.jpg"/>', result)
+        self.assertIn('<guid isPermaLink="false">some_guid</guid>', result)
+        self.assertNotIn('xmlns', result)
 
     @patch.object(common, 'require_true')
     def test_get_feed_url(self, mocked_require_true):
@@ -0,0 +1,128 @@
+import re
+import unittest
+from unittest.mock import patch
+from highland import app, html_sanitizer, settings
+
+# descriptions expected to be sanitized the same by both backends
+CORPUS = [
+    '',
+    'plain text',
+    'a & b < c > d',
+    '&amp; &lt; &nbsp; &foo; &amp',
+    'x\r\ny\rz',
+    'a\x00b',
+    '<em>日本語</em> テキスト',
+    '<B>Bold</B>',
+    '<p>Episode 1, where we talk about <b>things</b>.</p>'
+    '<ul><li><a href="https://example.com/1">a link</a></li>'
+    '<li>another topic</li></ul>'
+    '<script>alert("removed by the sanitizer")</script>',
+    '<ul>\n  <li>one</li>\n  <li>two</li>\n</ul>',
+    '<ol><li>a<li>b</ol>',
+    '<li>bare</li>',
+    '<strong>s</strong><em>e</em><code>c</code><blockquote>q</blockquote>'
+    '<abbr title="t">a</abbr><acronym title="t">a</acronym>',
+    '<b>unclosed',
+    '<div><p>nested</p></div>',
+    '<table><tr><td>x</td></tr></table>',
+    '<code>&lt;p&gt;</code>',
+    'line<br>break<br/>and<br />more</br>',
+    '<BR>',
+    # disallowed tags and attributes
+    '<p class="x">para</p>',
+    '<span style="color:red">x</span>',
+    '<script>alert("x")</script>',
+    '<img src="x.png"/>',
+    '<img src=x onerror=alert(1)>',
+    '<input disabled>',
+    '<p a="1" B="2">',
+    '<foo/>',
+    '<foo bar>',
+    '<a title="x" title="y" href=h>x</a>',
+    '<a title=\'a&amp;b<c>"\'>x</a>',
+    # urls
+    '<a href="https://example.com/a?b=1&amp;c=2" title="t">link</a>',
+    '<a href="HTTPS://EXAMPLE.COM">x</a>',
+    '<a href="/relative">x</a>',
+    '<a href="data:text/plain,hi">x</a>',
+    '<a href="javascript:alert(1)">x</a>',
+    '<a href="java\nscript:alert(1)">x</a>',
+    '<a href="&#106;avascript:alert(1)">x</a>',
+    # comments and malformed markup
+    '<!-- c -->after',
+    '<!doctype html>x',
+    '<?php x ?>y',
+    '</ 1>z',
+    'a<b',
+    '<div',
+    '>stray',
+    '<p>a</p\n>',
+    '\n<li>&lt;/div&gt;</li>',
+    '&nbsp;</code><!-- c -->&nbsp;',
+    '<a ' + 'b="c"' * 1000,
+    # misnested allowed tags
+    '<strong><em>x</strong></em>',
+    '<i><b><code>x</i></b></code>',
+    '<code><b></code></b>t',
+    '<b>x</i>y',
+    '</b>x<b>',
+    '<ul><li>a<ul><li>b</li></li></ul>',
+    '<li><ol>x</li></ol>',
+    '<blockquote><li>x</blockquote>',
+    '<abbr><ol><li>x</abbr>',
+    '<a href="x"><a href="y">z</a></a>',
+    # misnested disallowed tags
+    '<p><b>a</p>b</b>',
+    '<em><p>x</em></p>',
+    '<p><ul><li>x</ul></p>',
+    '<table><b>x</b></table>',
+    '<b>x<script>y</b></script>',
+]
+
+# badly nested formatting tags, which html5lib reopens after the tag closing
+# them out of order and libxml2 does not, as (input, bleach, lxml)
+MISNESTED = [
+    ('<b><i>x</b>y</i>', '<b><i>x</i></b><i>y</i>', '<b><i>x</i></b>y'),
+    ('<a href="h"><b>x</a>y</b>',
+     '<a href="h"><b>x</b></a><b>y</b>', '<a href="h"><b>x</b></a>y'),
+]
+
+
+class TestHtmlSanitizer(unittest.TestCase):
+    def test_clean_lxml_equals_bleach(self):
+        for s in CORPUS:
+            with self.subTest(s=s):
+                self.assertEqual(html_sanitizer.clean_bleach(s),
+                                 html_sanitizer.clean_lxml(s))
+
+    def test_clean_misnested(self):
+        for s, bleach, lxml in MISNESTED:
+            with self.subTest(s=s):
+                self.assertEqual(bleach, html_sanitizer.clean_bleach(s))
+                self.assertEqual(lxml, html_sanitizer.clean_lxml(s))
+                # the text is kept as is by both
+                self.assertEqual(
+                    re.sub('<[^>]*>', '', bleach), re.sub('<[^>]*>', '', lxml))
+
+    def test_clean_lxml(self):
+        self.assertEqual(
+            '<b>bold</b>&lt;script&gt;x&lt;/script&gt;<br>',
+            html_sanitizer.clean_lxml('<b>bold</b><script>x</script><br/>'))
+        self.assertEqual(
+            '<a>x</a>',
+            html_sanitizer.clean_lxml('<a href="javascript:alert(1)">x</a>'))
+        self.assertEqual(
+            '<a href="https://example.com/?a=1&amp;b=2" title="t">x</a>',
+            html_sanitizer.clean_lxml(
+                '<a title="t" href="https://example.com/?a=1&amp;b=2">x</a>'))
+
+    def test_clean(self):
+        backends = {'bleach': lambda s: 'bleach', 'lxml': lambda s: 'lxml'}
+        with patch.object(html_sanitizer, 'BACKENDS', backends):
+            with patch.dict(app.config, {'HTML_SANITIZER': 'lxml'}):
+                self.assertEqual('lxml', html_sanitizer.clean('<b></b>'))
+            with patch.dict(app.config, {'HTML_SANITIZER': None}):
+                self.assertEqual('bleach', html_sanitizer.clean('<b></b>'))
+
+    def test_clean_defaults_to_bleach(self):
+        self.assertEqual('bleach', settings.HTML_SANITIZER)
@@ -0,0 +1,61 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from highland import json_feed
+from highland.models import Audio, Episode, Show
+
+
+class TestJsonFeed(unittest.TestCase):
+    def test_get_item(self):
+        episode = self._create_episode()
+        audio = Audio(1, 'ep.mp3', 1800, 30000000, 'audio/mpeg', 'audioguid')
+        context = {'url': 'http://site/show/ep', 'image_url': '',
+                   'audio_url': 'http://audio/ep.mp3'}
+
+        self.assertEqual({
+            'id': 'guid',
+            'url': 'http://site/show/ep',
+            'title': 'title',
+            'summary': 'subtitle',
+            'content_html': '<b>description</b>',
+            'date_published': '2016-01-01T00:00:00+00:00',
+            'attachments': [{
+                'url': 'http://audio/ep.mp3',
+                'mime_type': 'audio/mpeg',
+                'size_in_bytes': 30000000,
+                'duration_in_seconds': 1800
+            }]
+        }, json_feed.get_item(episode, audio, '<b>description</b>', context))
+
+        context['image_url'] = 'http://image/ep.png'
+        item = json_feed.get_item(episode, None, '', context)
+        self.assertEqual('http://image/ep.png', item['image'])
+        self.assertNotIn('attachments', item)
+
+    def test_render_feed(self):
+        show = Show(1, 'title', 'description', 'subtitle', 'en-US', 'author',
+                    'category', False, None, 'show')
+
+        feed = json.loads(json_feed.render_feed(
+            show, 'http://site/show', 'http://image/show.png',
+            [{'id': 'guid'}]))
+
+        self.assertEqual(json_feed.VERSION, feed['version'])
+        self.assertEqual('http://site/show', feed['home_page_url'])
+        self.assertEqual('http://site/show/feed.json', feed['feed_url'])
+        self.assertEqual('http://image/show.png', feed['icon'])
+        self.assertEqual([{'name': 'author'}], feed['authors'])
+        self.assertEqual([{'id': 'guid'}], feed['items'])
+
+        document = json.loads(json_feed.render_episode(
+            show, 'http://site/show', '', {'id': 'guid'}))
+        self.assertEqual('guid', document['id'])
+        self.assertEqual('title', document['show']['title'])
+        self.assertNotIn('icon', document['show'])
+
+    def _create_episode(self):
+        episode = Episode(1, 1, 'title', 'subtitle', 'description', None,
+                          'published', None, False, None, 'ep')
+        episode.guid = 'guid'
+        episode.published_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        return episode
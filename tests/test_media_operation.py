@@ -2,13 +2,13 @@ import unittest
 from unittest.mock import patch, MagicMock
 
 from tests.utility import assign_ids, create_user
-from highland import media_storage, media_operation
+from highland import media_storage, media_operation, cache
 from highland.exception import AccessNotAllowedError
 from highland.models import db, Audio, User
 
 
 class TestMediaOperation(unittest.TestCase):
-    @patch.object(media_storage, 'delete')
+    @patch.object(media_storage, 'delete_many', return_value={})
     @patch.object(db, 'session')
     def test_delete(self, mock_session, mock_delete):
         audios = [
@@ -17,7 +17,7 @@ class TestMediaOperation(unittest.TestCase):
         ]
         mock_key_fn = MagicMock()
         mock_key_fn.side_effect = \
-            lambda user, media: '{}+{}'.format(user, media)
+            lambda user, media: '{}+{}'.format(user.id, media.id)
         mock_bucket = MagicMock()
         self._delete_prep(mock_session, audios, Audio)
 
@@ -25,12 +25,13 @@ class TestMediaOperation(unittest.TestCase):
             1, [x.id for x in audios], Audio, mock_key_fn, mock_bucket)
 
         self.assertEqual(2, mock_key_fn.call_count)
-        self.assertEqual(2, mock_delete.call_count)
+        mock_delete.assert_called_once_with(
+            mock_bucket, ['1+{}'.format(x.id) for x in audios])
         mock_session.commit.assert_called_with()
         self.assertEqual(2, mock_session.delete.call_count)
         mock_session.commit.assert_called_with()
 
-    @patch.object(media_storage, 'delete')
+    @patch.object(media_storage, 'delete_many', return_value={})
     @patch.object(db, 'session')
     def test_delete_raises_when_audio_is_not_owned_by_the_user(
             self, mock_session, mock_delete):
@@ -48,20 +49,54 @@ class TestMediaOperation(unittest.TestCase):
         mock_session.delete.assert_not_called()
         mock_session.commit.assert_not_called()
 
-    @patch.object(media_storage, 'delete')
+    @patch.object(media_storage, 'delete_many', return_value={})
     @patch.object(db, 'session')
     def test_delete_db_record_is_not_deleted_when_storage_error(
             self, mock_session, mock_delete):
-        audio = Audio(1, 'file_one', 30, 128, 'audio/mpeg', 'some_guid_01')
-        self._delete_prep(mock_session, [audio], Audio)
-        mock_delete.side_effect = ValueError
+        audios = [
+            Audio(1, 'file_one', 30, 128, 'audio/mpeg', 'some_guid_01'),
+            Audio(1, 'file_two', 60, 256, 'audio/mpeg', 'some_guid_02')
+        ]
+        self._delete_prep(mock_session, audios, Audio)
+        mock_delete.return_value = {'file_one': 'AccessDenied: Access Denied'}
 
-        media_operation.delete(1, [audio.id], Audio, MagicMock(), MagicMock())
+        media_operation.delete(
+            1, [x.id for x in audios], Audio,
+            lambda user, media: media.filename, MagicMock())
 
         self.assertEqual(1, mock_delete.call_count)
-        mock_session.delete.assert_not_called()
+        mock_session.delete.assert_called_once_with(audios[1])
         mock_session.commit.assert_called_with()
 
+    @patch.object(media_operation, 'preview_cache', cache.TTLCache(10, 30))
+    @patch.object(media_storage, 'delete_many', return_value={})
+    @patch.object(db, 'session')
+    def test_delete_drops_media_from_preview_cache(
+            self, mock_session, mock_delete):
+        audios = [
+            Audio(1, 'file_one', 30, 128, 'audio/mpeg', 'some_guid_01'),
+            Audio(1, 'file_two', 60, 256, 'audio/mpeg', 'some_guid_02')
+        ]
+        self._delete_prep(mock_session, audios, Audio)
+        mock_get = MagicMock(side_effect=lambda x: audios[int(x) - 10])
+        for x in audios:
+            media_operation.get_for_preview(Audio, str(x.id), mock_get)
+        mock_delete.return_value = {'file_one': 'AccessDenied: Access Denied'}
+
+        media_operation.delete(
+            1, [x.id for x in audios], Audio,
+            lambda user, media: media.filename, MagicMock())
+
+        for x in audios:
+            self.assertEqual(
+                x, media_operation.get_for_preview(Audio, str(x.id), mock_get))
+        self.assertEqual(3, mock_get.call_count)
+        mock_get.assert_called_with(str(audios[1].id))
+
+    def test_get_for_preview_without_id(self):
+        self.assertIsNone(
+            media_operation.get_for_preview(Audio, None, MagicMock()))
+
     def _delete_prep(self, mock_session, medias, model_class):
         medias = assign_ids(medias, 10)
         media_ids = [x.id for x in medias]
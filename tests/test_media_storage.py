@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+
+from highland import app, media_storage, storage_backend
+
+
+class TestMediaStorage(unittest.TestCase):
+    def setUp(self):
+        self.mock_s3 = MagicMock()
+        media_storage.set_backend(storage_backend.S3Storage(self.mock_s3))
+
+    def tearDown(self):
+        media_storage.set_backend(None)
+
+    @patch.object(app, 'config', {'S3_BUCKET_FEED': 'feed_bucket'})
+    def test_upload(self):
+        mock_s3 = self.mock_s3
+        media_storage.upload('content', 'feed_bucket', 'alias', 'rss',
+                             ContentType='application/rss+xml')
+
+        mock_s3.meta.client.put_object.assert_called_with(
+            Bucket='feed_bucket', Key='rss/alias', Body='content',
+            ACL='public-read',
+            ContentType='application/rss+xml')
+
+    @patch.object(app, 'config', {
+        'S3_BUCKET_FEED': 'feed_bucket',
+        'UPLOAD_COMPRESSION': {'S3_BUCKET_FEED': ('gzip', 6)}})
+    def test_upload_compressed(self):
+        mock_s3 = self.mock_s3
+        media_storage.upload('content', 'feed_bucket', 'alias', 'rss',
+                             ContentType='application/rss+xml')
+
+        kwargs = mock_s3.meta.client.put_object.call_args[1]
+        self.assertEqual('gzip', kwargs.get('ContentEncoding'))
+        self.assertEqual('application/rss+xml', kwargs.get('ContentType'))
+        self.assertEqual(b'content', gzip.decompress(kwargs.get('Body')))
+
+    def test_upload_stream(self):
+        backend = storage_backend.MemoryStorage()
+        media_storage.set_backend(backend)
+
+        length, checksum = media_storage.upload_stream(
+            io.BytesIO(b'audio'), 'audio_bucket', 'guid', 'user',
+            ContentType='audio/mpeg')
+
+        self.assertEqual(5, length)
+        self.assertEqual(hashlib.sha256(b'audio').hexdigest(), checksum)
+        key = ('audio_bucket', 'user/guid')
+        self.assertEqual(b'audio', backend.objects[key])
+        self.assertEqual({'ContentType': 'audio/mpeg'}, backend.metadata[key])
+
+    def test_list_keys(self):
+        mock_s3 = self.mock_s3
+        paginate = mock_s3.meta.client.get_paginator.return_value.paginate
+        paginate.return_value = [
+            {'Contents': [{'Key': 'show/ep1'}, {'Key': 'show/ep2'}]}]
+
+        self.assertEqual(['show/ep1', 'show/ep2'],
+                         media_storage.list_keys('sites', 'show'))
+        paginate.assert_called_with(Bucket='sites', Prefix='show/')
+
+    def test_delete_folder(self):
+        backend = storage_backend.MemoryStorage()
+        media_storage.set_backend(backend)
+        media_storage.upload('ep1', 'sites', 'ep1', 'show')
+        media_storage.upload('ep1', 'sites', 'ep1', 'show2')
+
+        media_storage.delete_folder('sites', 'show')
+
+        self.assertEqual(['show2/ep1'], backend.list_keys('sites', ''))
+
+    @patch.object(app, 'config', {'STORAGE_BACKEND': 'memory'})
+    def test_get_backend(self):
+        media_storage.set_backend(None)
+
+        backend = media_storage.get_backend()
+        self.assertIsInstance(backend, storage_backend.MemoryStorage)
+        self.assertIs(backend, media_storage.get_backend())
+
+        with self.assertRaises(ValueError):
+            media_storage.create_backend('ftp')
+
+    def test_compress_is_deterministic(self):
+        self.assertEqual(
+            media_storage.compress('some content', 'gzip', 6),
+            media_storage.compress(b'some content', 'gzip', 6))
+
+    def test_compress_file(self):
+        data = b'<item>episode</item>\n' * 10000
+
+        with media_storage.compress(io.BytesIO(data), 'gzip', 6) as f:
+            compressed = f.read()
+
+        self.assertLess(len(compressed), len(data))
+        self.assertEqual(data, gzip.decompress(compressed))
+
+    def test_compress_raises_on_unknown_encoding(self):
+        with self.assertRaises(ValueError):
+            media_storage.compress(b'content', 'zip')
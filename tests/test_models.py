@@ -17,7 +17,7 @@ class TestShow(unittest.TestCase):
 
         show_d = dict(show)
 
-        self.assertEqual(14, len(show_d))
+        self.assertEqual(15, len(show_d))
         self.assertEqual(show.owner_user_id, show_d.get('owner_user_id'))
         self.assertEqual(show.id, show_d.get('id'))
         self.assertEqual(show.title, show_d.get('title'))
@@ -29,6 +29,7 @@ class TestShow(unittest.TestCase):
         self.assertEqual(show.explicit, show_d.get('explicit'))
         self.assertEqual(show.image_id, show_d.get('image_id'))
         self.assertEqual(show.alias, show_d.get('alias'))
+        self.assertEqual(show.feed_page_size, show_d.get('feed_page_size'))
         self.assertIsNotNone(show_d.get('last_build_datetime'))
         self.assertIsNotNone(show_d.get('update_datetime'))
         self.assertIsNotNone(show_d.get('create_datetime'))
@@ -85,11 +86,12 @@ class TestAudio(unittest.TestCase):
         audio = models.Audio(user, 'my file name', 1800, 5000000, 'audio/mpeg',
                              uuid.uuid4().hex)
         audio.id = 2
+        audio.checksum = 'a' * 64
         audio.create_datetime = datetime.datetime.now(datetime.timezone.utc)
 
         audio_d = dict(audio)
 
-        self.assertEqual(8, len(audio_d))
+        self.assertEqual(9, len(audio_d))
         self.assertEqual(audio.owner_user_id, audio_d.get('owner_user_id'))
         self.assertEqual(audio.id, audio_d.get('id'))
         self.assertEqual(audio.filename, audio_d.get('filename'))
@@ -97,6 +99,7 @@ class TestAudio(unittest.TestCase):
         self.assertEqual(audio.length, audio_d.get('length'))
         self.assertEqual(audio.type, audio_d.get('type'))
         self.assertEqual(audio.guid, audio_d.get('guid'))
+        self.assertEqual(audio.checksum, audio_d.get('checksum'))
         self.assertEqual(str(audio.create_datetime),
                          audio_d.get('create_datetime'))
 
@@ -0,0 +1,424 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch, call, ANY, MagicMock
+from highland import app, public_view, media_storage, models,\
+    published_file_operation, show_snapshot, cache, audio_operation, \
+    image_operation, json_feed, upload_manager, media_operation
+from highland.models import Audio, Episode, Image, PublishedFile, Show
+from tests.utility import create_user
+
+
+class TestPublicView(unittest.TestCase):
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(upload_manager, '_manager',
+                  upload_manager.UploadManager(4, 4, 0, 0))
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'delete_many', return_value={})
+    @patch.object(media_storage, 'upload')
+    @patch.object(media_storage, 'exists', return_value=True)
+    @patch.object(media_storage, 'list_keys')
+    @patch.object(published_file_operation, 'load_by_key')
+    @patch.object(public_view, '_render_episode_json')
+    @patch.object(public_view, '_get_json_item')
+    @patch.object(public_view, '_render_episode')
+    @patch.object(public_view, '_publish_index')
+    @patch.object(show_snapshot, 'load')
+    def test_sync(self, mock_load, mock_publish_index, mock_render,
+                  mock_get_json_item, mock_render_json, mock_load_by_key,
+                  mock_list_keys, mock_exists, mock_upload, mock_delete,
+                  mock_session, mock_version):
+        user = create_user(1)
+        show = self._create_show()
+
+        def publish_index(snapshot, published, items, batch):
+            batch.submit('<html>page</html>', 'sites', 'page-1', 'show')
+            return {'show': None, 'show/page-1': '<html>page</html>'}
+
+        mock_publish_index.side_effect = publish_index
+        episodes = [self._create_episode(i) for i in range(4)]
+        snapshot = show_snapshot.ShowSnapshot(
+            user, show, None, [(x, None, None) for x in episodes])
+        mock_load.return_value = snapshot
+        mock_render.side_effect = \
+            lambda show, episode, context: \
+            '<html>{}</html>'.format(episode.alias)
+        mock_get_json_item.side_effect = \
+            lambda episode, audio, context: episode.alias
+        mock_render_json.side_effect = \
+            lambda user, show, show_image, item: '{{"{}"}}'.format(item)
+
+        def published_file(key, fingerprint):
+            published = PublishedFile(1, 'sites', key)
+            published.fingerprint = fingerprint
+            return published
+
+        def fingerprint(episode):
+            return public_view._get_episode_fingerprint(
+                show, episode, public_view._get_episode_context(
+                    user, show, None, episode, None, None))
+
+        # ep0 is new, ep1 unchanged, ep2 changed, ep3 missing in the storage
+        changed = published_file('show/ep2', 'outdated')
+        gone = published_file('show/gone', 'fingerprint')
+        mock_load_by_key.return_value = {
+            'show': published_file('show', 'index'),
+            'show/ep1': published_file('show/ep1', fingerprint(episodes[1])),
+            'show/episode-json/ep1.json': published_file(
+                'show/episode-json/ep1.json',
+                published_file_operation.get_digest('{"ep1"}')),
+            'show/ep2': changed,
+            'show/ep3': published_file('show/ep3', fingerprint(episodes[3])),
+            'show/gone': gone}
+        mock_list_keys.return_value = [
+            'show/ep0', 'show/ep1', 'show/episode-json/ep1.json', 'show/ep2',
+            'show/orphan', 'show/page-1', 'show/_preview']
+
+        result = public_view.sync(1)
+
+        self.assertEqual(
+            {'uploaded': 7, 'unchanged': 3, 'deleted': 2}, result)
+        mock_load.assert_called_with(1)
+        self.assertEqual(snapshot, mock_publish_index.call_args[0][0])
+        self.assertEqual(['ep0', 'ep1', 'ep2', 'ep3'],
+                         mock_publish_index.call_args[0][2])
+        mock_list_keys.assert_called_with('sites', 'show')
+        mock_exists.assert_called_once_with('sites', 'show')
+        self.assertEqual(
+            [('<html>ep0</html>', 'sites', 'ep0', 'show'),
+             ('<html>ep2</html>', 'sites', 'ep2', 'show'),
+             ('<html>ep3</html>', 'sites', 'ep3', 'show'),
+             ('<html>page</html>', 'sites', 'page-1', 'show'),
+             ('{"ep0"}', 'sites', 'episode-json/ep0.json', 'show'),
+             ('{"ep2"}', 'sites', 'episode-json/ep2.json', 'show'),
+             ('{"ep3"}', 'sites', 'episode-json/ep3.json', 'show')],
+            sorted(x[0] for x in mock_upload.call_args_list))
+        self.assertEqual(
+            published_file_operation.get_digest('<html>ep2</html>'),
+            changed.digest)
+        self.assertNotEqual('outdated', changed.fingerprint)
+        self.assertEqual(
+            ['show/ep0', 'show/episode-json/ep0.json',
+             'show/episode-json/ep2.json', 'show/episode-json/ep3.json'],
+            sorted(x[0][0].key for x in mock_session.add.call_args_list))
+        mock_delete.assert_called_once_with(
+            'sites', ['show/gone', 'show/orphan'])
+        mock_session.delete.assert_called_once_with(gone)
+        mock_session.commit.assert_called_with()
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'delete_many', return_value={})
+    @patch.object(media_storage, 'exists', return_value=False)
+    @patch.object(media_storage, 'list_keys', return_value=['show/page-1'])
+    @patch.object(published_file_operation, 'load_by_key')
+    @patch.object(public_view, '_publish_index')
+    @patch.object(show_snapshot, 'load')
+    def test_sync_uploads_missing_index(
+            self, mock_load, mock_publish_index, mock_load_by_key,
+            mock_list_keys, mock_exists, mock_delete, mock_session):
+        mock_load.return_value = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None, [])
+        index = PublishedFile(1, 'sites', 'show')
+        index.fingerprint = 'index'
+        page = PublishedFile(1, 'sites', 'show/page-1')
+        page.fingerprint = 'page'
+        mock_load_by_key.return_value = {'show': index, 'show/page-1': page}
+        fingerprints = []
+
+        def publish_index(snapshot, published, items, batch):
+            fingerprints.extend(
+                published[x].fingerprint for x in ('show', 'show/page-1'))
+            return {'show': '<html></html>', 'show/page-1': None}
+
+        mock_publish_index.side_effect = publish_index
+
+        public_view.sync(1)
+
+        mock_exists.assert_called_once_with('sites', 'show')
+        self.assertEqual([None, 'page'], fingerprints)
+        mock_delete.assert_called_once_with('sites', [])
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(upload_manager, '_manager',
+                  upload_manager.UploadManager(4, 4, 0, 0))
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'delete_many')
+    @patch.object(media_storage, 'upload')
+    @patch.object(media_storage, 'list_keys')
+    @patch.object(published_file_operation, 'load_by_key')
+    @patch.object(public_view, '_render_episode')
+    @patch.object(public_view, '_publish_index', return_value={})
+    @patch.object(show_snapshot, 'load')
+    def test_sync_keeps_pages_on_upload_failure(
+            self, mock_load, mock_publish_index, mock_render, mock_load_by_key,
+            mock_list_keys, mock_upload, mock_delete, mock_session,
+            mock_version):
+        mock_load.return_value = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None,
+            [(self._create_episode(0), None, None)])
+        mock_render.return_value = '<html></html>'
+        mock_load_by_key.return_value = {}
+        mock_list_keys.return_value = ['show/orphan']
+        mock_upload.side_effect = ValueError
+
+        with self.assertRaises(ValueError):
+            public_view.sync(1)
+        mock_delete.assert_not_called()
+        mock_session.add.assert_not_called()
+
+    @patch.object(app, 'config', {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(published_file_operation, 'get_model')
+    @patch.object(published_file_operation, 'load_by_key')
+    @patch.object(public_view, 'episode_html')
+    @patch.object(public_view, '_delete_index_pages_except')
+    @patch.object(public_view, '_publish_index')
+    def test_update(self, mock_publish_index, mock_delete_index_pages,
+                    mock_episode_html, mock_load_by_key, mock_get_model):
+        episodes = [(self._create_episode(i), None, None) for i in range(3)]
+        snapshot = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None, episodes)
+
+        mock_publish_index.return_value = {'show': '<html></html>'}
+
+        self.assertEqual('<html></html>', public_view.update(snapshot, [0, 2]))
+
+        published = mock_load_by_key.return_value
+        mock_load_by_key.assert_called_with(1, 'sites')
+        self.assertEqual(
+            [((snapshot,) + episodes[0],
+              {'published': published, 'batch': ANY}),
+             ((snapshot,) + episodes[2],
+              {'published': published, 'batch': ANY})],
+            mock_episode_html.call_args_list)
+        mock_publish_index.assert_called_with(snapshot, published, batch=ANY)
+        mock_delete_index_pages.assert_called_with(
+            snapshot.show, published, mock_publish_index.return_value)
+        mock_get_model.assert_not_called()
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites',
+                             'HOST_SITE': 'http://site'})
+    # a single worker uploads the page and the JSON in order
+    @patch.object(upload_manager, '_manager',
+                  upload_manager.UploadManager(1, 4, 0, 0))
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    @patch.object(published_file_operation, 'record')
+    @patch.object(media_storage, 'upload')
+    @patch.object(public_view, '_render_episode', return_value='<html>')
+    def test_episode_html_publishes_json(
+            self, mock_render, mock_upload, mock_record, mock_version):
+        snapshot = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None, [])
+        episode = self._create_episode(1)
+        episode.description_html = '<b>description</b>'
+
+        self.assertEqual('<html>', public_view.episode_html(
+            snapshot, episode, None, None, published={}))
+
+        (html, _, file_name, folder), kwargs = mock_upload.call_args_list[0]
+        self.assertEqual(('<html>', 'ep1', 'show'), (html, file_name, folder))
+        (document, _, file_name, folder), kwargs = \
+            mock_upload.call_args_list[1]
+        self.assertEqual(('episode-json/ep1.json', 'show'),
+                         (file_name, folder))
+        self.assertEqual(json_feed.EPISODE_CONTENT_TYPE, kwargs['ContentType'])
+        document = json.loads(document)
+        self.assertEqual('<b>description</b>', document['content_html'])
+        self.assertEqual('http://site/show', document['show']['home_page_url'])
+        self.assertEqual(
+            published_file_operation.get_digest(mock_upload.call_args[0][0]),
+            mock_record.call_args[0][4])
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites',
+                             'HOST_SITE': 'http://site'})
+    @patch.object(upload_manager, '_manager',
+                  upload_manager.UploadManager(1, 4, 0, 0))
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    @patch.object(published_file_operation, 'record')
+    @patch.object(media_storage, 'upload')
+    @patch.object(public_view, '_render_episode', return_value='<html>')
+    def test_episode_json_kept_apart_from_feed(
+            self, mock_render, mock_upload, mock_record, mock_version):
+        snapshot = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None, [])
+        episode = self._create_episode(1)
+        episode.alias = 'feed'
+        episode.description_html = ''
+        published = {}
+
+        public_view.episode_html(
+            snapshot, episode, None, None, published=published)
+        public_view._publish_index(snapshot, published, [])
+
+        keys = [x[0][2] for x in mock_record.call_args_list]
+        self.assertEqual(
+            ['show/feed', 'show/episode-json/feed.json', 'show',
+             'show/feed.json'], keys)
+
+    @patch.object(app, 'config', {'HOST_SITE': 'http://site',
+                                  'SITE_INDEX_PAGE_SIZE': 3})
+    def test_get_index_pages(self):
+        episodes = [self._create_episode(i) for i in range(7)]
+        snapshot = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None,
+            [(x, None, None) for x in episodes])
+
+        index, page_2, page_1 = public_view._get_index_pages(snapshot)
+
+        self.assertEqual(('show', 'show', '', episodes[:3],
+                          {'older_url': 'http://site/show/page-2'}), index)
+        self.assertEqual(
+            ('show/page-2', 'page-2', 'show', episodes[3:4],
+             {'url': 'http://site/show/page-2',
+              'newer_url': 'http://site/show',
+              'older_url': 'http://site/show/page-1'}), page_2)
+        self.assertEqual(
+            ('show/page-1', 'page-1', 'show', episodes[4:],
+             {'url': 'http://site/show/page-1',
+              'newer_url': 'http://site/show/page-2'}), page_1)
+
+    @patch.object(app, 'config', {'HOST_SITE': 'http://site'})
+    def test_get_index_pages_without_page_size(self):
+        episodes = [self._create_episode(i) for i in range(7)]
+        snapshot = show_snapshot.ShowSnapshot(
+            create_user(1), self._create_show(), None,
+            [(x, None, None) for x in episodes])
+
+        self.assertEqual([('show', 'show', '', episodes, {})],
+                         public_view._get_index_pages(snapshot))
+
+    @patch.object(app, 'config', {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'delete_many')
+    def test_delete_index_pages_except(self, mock_delete, mock_session):
+        stale = PublishedFile(1, 'sites', 'show/page-3')
+        published = {
+            'show': PublishedFile(1, 'sites', 'show'),
+            'show/ep1': PublishedFile(1, 'sites', 'show/ep1'),
+            'show/page-1': PublishedFile(1, 'sites', 'show/page-1'),
+            'show/page-3': stale,
+            'show/page-4': PublishedFile(1, 'sites', 'show/page-4')}
+        mock_delete.return_value = {'show/page-4': 'InternalError: error'}
+
+        public_view._delete_index_pages_except(
+            self._create_show(), published,
+            {'show': None, 'show/page-1': None})
+
+        mock_delete.assert_called_once_with(
+            'sites', ['show/page-3', 'show/page-4'])
+        mock_session.delete.assert_called_once_with(stale)
+        self.assertNotIn('show/page-3', published)
+        self.assertIn('show/page-4', published)
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    def test_episode_fingerprint_depends_on_rendered_fields(
+            self, mock_version):
+        user = create_user(1)
+        show = self._create_show()
+        episode = self._create_episode(1)
+
+        def fingerprint():
+            return public_view._get_episode_fingerprint(
+                show, episode, public_view._get_episode_context(
+                    user, show, None, episode, None, None))
+
+        original = fingerprint()
+        show.subtitle = 'not on the episode page'
+        show.category = 'Technology'
+        self.assertEqual(original, fingerprint())
+        episode.title = 'new title'
+        self.assertNotEqual(original, fingerprint())
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(published_file_operation, 'record')
+    @patch.object(media_storage, 'upload')
+    @patch.object(published_file_operation, 'get_model')
+    def test_publish_page_skips_unchanged(
+            self, mock_get_model, mock_upload, mock_record):
+        published = PublishedFile(1, 'sites', 'show/ep')
+        published.fingerprint = 'fingerprint'
+        mock_get_model.return_value = published
+        render = MagicMock()
+
+        self.assertIsNone(public_view._publish_page(
+            MagicMock(), 'ep', 'show', 'fingerprint', render))
+        mock_get_model.assert_called_with('sites', 'show/ep')
+        render.assert_not_called()
+        mock_upload.assert_not_called()
+
+        render.return_value = '<html></html>'
+        self.assertEqual('<html></html>', public_view._publish_page(
+            MagicMock(id=1), 'ep', 'show', 'changed', render))
+        mock_upload.assert_called_with(
+            '<html></html>', 'sites', 'ep', 'show',
+            ContentType='text/html; charset=utf-8')
+        mock_record.assert_called_with(
+            1, 'sites', 'show/ep',
+            published_file_operation.get_digest('<html></html>'),
+            'changed', published)
+
+    @patch.dict(app.config, {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(upload_manager, 'upload')
+    def test_upload_page(self, mock_upload):
+        public_view._upload_page('{}', 'feed.json', 'show',
+                                 json_feed.FEED_CONTENT_TYPE)
+        mock_upload.assert_called_with(
+            '{}', 'sites', 'feed.json', 'show',
+            ContentType=json_feed.FEED_CONTENT_TYPE)
+
+    @patch.object(app, 'config', {'S3_BUCKET_SITES': 'sites'})
+    @patch.object(public_view, '_get_template_version', return_value='v1')
+    @patch.object(media_operation, 'preview_cache', cache.TTLCache(10, 30))
+    @patch.object(public_view, 'preview_cache', cache.TTLCache(10, 30))
+    @patch.object(models.db, 'session')
+    @patch.object(public_view, '_upload_page')
+    @patch.object(public_view, '_render_episode', return_value='<html>')
+    @patch.object(audio_operation, 'get')
+    @patch.object(image_operation, 'get_model')
+    def test_preview_episode_cached(
+            self, mock_get_image, mock_get_audio, mock_render, mock_upload,
+            mock_session, mock_version):
+        user = create_user(1)
+        show = self._create_show()
+        show.image_id = 3
+        mock_get_audio.return_value = Audio(
+            1, 'a.mp3', 60, 100, 'audio/mpeg', 'guid')
+        mock_get_image.return_value = Image(1, 'i.png', 'guid', 'image/png')
+
+        def preview(title):
+            return public_view.preview_episode(
+                user, show, title, 'subtitle', 'description', '5', '3')
+
+        self.assertEqual('<html>', preview('title'))
+        self.assertEqual('<html>', preview('title'))
+        self.assertEqual(1, mock_render.call_count)
+        self.assertEqual(2, mock_upload.call_count)
+        mock_upload.assert_called_with('<html>', '_preview', 'show')
+
+        preview('edited')
+        self.assertEqual(2, mock_render.call_count)
+        # the show image is the episode image, both looked up once
+        mock_get_audio.assert_called_once_with('5')
+        mock_get_image.assert_called_once_with(3)
+        self.assertEqual(
+            [call(mock_get_image.return_value),
+             call(mock_get_audio.return_value)],
+            mock_session.expunge.call_args_list)
+
+    def _create_show(self):
+        show = Show(1, 'title', 'description', 'subtitle', 'en-US', 'author',
+                    'category', False, None, 'show')
+        show.id = 1
+        show.url = 'http://example.com/show'
+        return show
+
+    def _create_episode(self, i):
+        episode = Episode(1, 1, 'title{}'.format(i), 'subtitle', 'description',
+                          None, 'published', None, False, None,
+                          'ep{}'.format(i))
+        episode.id = i
+        episode.published_datetime = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        return episode
@@ -0,0 +1,111 @@
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+
+from highland import media_storage, models, published_file_operation
+from highland.models import PublishedFile
+
+
+class TestPublishedFileOperation(unittest.TestCase):
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'upload')
+    @patch.object(PublishedFile, 'query')
+    def test_upload_if_changed_uploads_new_file(
+            self, mock_query, mock_upload, mock_session):
+        mock_query.filter_by.return_value.first.return_value = None
+
+        result = published_file_operation.upload_if_changed(
+            1, b'content', 'some_bucket', 'alias', 'rss',
+            ContentType='text/xml')
+
+        self.assertTrue(result)
+        mock_query.filter_by.assert_called_with(
+            bucket='some_bucket', key='rss/alias')
+        mock_upload.assert_called_with(
+            b'content', 'some_bucket', 'alias', 'rss', ContentType='text/xml')
+        published = mock_session.add.call_args[0][0]
+        self.assertEqual(1, published.show_id)
+        self.assertEqual('rss/alias', published.key)
+        self.assertEqual(
+            published_file_operation.get_digest(b'content'), published.digest)
+        mock_session.commit.assert_not_called()
+
+    @patch.object(models.db, 'session')
+    @patch.object(PublishedFile, 'query')
+    def test_upload_if_changed_records_when_batch_is_waited_for(
+            self, mock_query, mock_session):
+        mock_query.filter_by.return_value.first.return_value = None
+        batch = MagicMock()
+
+        self.assertTrue(published_file_operation.upload_if_changed(
+            1, b'content', 'some_bucket', '1', 'rss_archive/alias',
+            batch=batch, ContentType='text/xml'))
+
+        args, kwargs = batch.submit.call_args
+        self.assertEqual(
+            (b'content', 'some_bucket', '1', 'rss_archive/alias'), args)
+        self.assertEqual('text/xml', kwargs['ContentType'])
+        mock_session.add.assert_not_called()
+        kwargs['done']()
+        self.assertEqual(
+            'rss_archive/alias/1', mock_session.add.call_args[0][0].key)
+
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'upload')
+    @patch.object(PublishedFile, 'query')
+    def test_upload_if_changed_uploads_changed_file(
+            self, mock_query, mock_upload, mock_session):
+        published = PublishedFile(1, 'some_bucket', 'rss/alias')
+        published.digest = published_file_operation.get_digest(b'old')
+        mock_query.filter_by.return_value.first.return_value = published
+
+        self.assertTrue(published_file_operation.upload_if_changed(
+            1, b'new', 'some_bucket', 'alias', 'rss'))
+
+        self.assertEqual(1, mock_upload.call_count)
+        self.assertEqual(
+            published_file_operation.get_digest(b'new'), published.digest)
+        mock_session.add.assert_not_called()
+
+    @patch.object(media_storage, 'upload')
+    @patch.object(PublishedFile, 'query')
+    def test_upload_if_changed_skips_unchanged_file(
+            self, mock_query, mock_upload):
+        published = PublishedFile(1, 'some_bucket', 'rss/alias')
+        published.digest = published_file_operation.get_digest('same')
+        mock_query.filter_by.return_value.first.return_value = published
+
+        self.assertFalse(published_file_operation.upload_if_changed(
+            1, 'same', 'some_bucket', 'alias', 'rss'))
+
+        mock_upload.assert_not_called()
+
+    def test_get_digest_accepts_str_and_bytes(self):
+        self.assertEqual(
+            published_file_operation.get_digest('日本語'),
+            published_file_operation.get_digest('日本語'.encode('utf-8')))
+
+    def test_get_digest_reads_and_rewinds_file(self):
+        f = io.BytesIO(b'x' * 100000)
+        self.assertEqual(
+            published_file_operation.get_digest(b'x' * 100000),
+            published_file_operation.get_digest(f))
+        self.assertEqual(0, f.tell())
+
+    @patch.object(models.db, 'session')
+    @patch.object(media_storage, 'delete_many')
+    @patch.object(PublishedFile, 'query')
+    def test_delete_except(self, mock_query, mock_delete, mock_session):
+        published = [PublishedFile(1, 'some_bucket', 'folder/{}'.format(x))
+                     for x in ('1', '2', '3', '4')]
+        mock_query.filter_by.return_value.filter.return_value.all. \
+            return_value = published
+        mock_delete.return_value = {'folder/4': 'InternalError: error'}
+
+        result = published_file_operation.delete_except(
+            1, 'some_bucket', 'folder', ['1', '2'])
+
+        self.assertEqual(['folder/3'], result)
+        mock_delete.assert_called_with(
+            'some_bucket', ['folder/3', 'folder/4'])
+        mock_session.delete.assert_called_once_with(published[2])
@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from highland import models, rebuild_queue
+from highland.models import RebuildRequest
+
+
+class TestLocalRebuildQueue(unittest.TestCase):
+    def test_request_rebuilds_right_away_without_window(self):
+        rebuild = MagicMock()
+        queue = rebuild_queue.LocalRebuildQueue(rebuild, 0)
+
+        queue.request(1, 11)
+
+        rebuild.assert_called_with(1, {11})
+
+    def test_requests_within_window_are_merged(self):
+        rebuild = MagicMock()
+        queue = rebuild_queue.LocalRebuildQueue(rebuild, 600)
+
+        queue.request(1, 11)
+        queue.request(1, 12)
+        queue.request(1)
+        queue.request(2, 21)
+        rebuild.assert_not_called()
+        self.assertEqual([], queue.process_due())
+
+        result = queue.flush()
+
+        self.assertEqual([1, 2], sorted(result))
+        self.assertEqual(2, rebuild.call_count)
+        rebuild.assert_any_call(1, {11, 12})
+        rebuild.assert_any_call(2, {21})
+        self.assertEqual([], queue.flush())
+
+    @patch.object(rebuild_queue.time, 'monotonic')
+    @patch.object(rebuild_queue.threading, 'current_thread')
+    @patch.object(rebuild_queue.threading, 'Timer')
+    def test_timer_fired_early_is_armed_again(
+            self, mock_timer, mock_current_thread, mock_monotonic):
+        rebuild = MagicMock()
+        queue = rebuild_queue.LocalRebuildQueue(rebuild, 600)
+        mock_monotonic.return_value = 1000.0
+        queue.request(1, 11)
+        first = mock_timer.return_value
+        mock_timer.assert_called_with(600, queue._process_timer, [1])
+        mock_timer.return_value = MagicMock()
+
+        # fired 0.5 seconds before the due time
+        mock_current_thread.return_value = first
+        mock_monotonic.return_value = 1599.5
+        queue._process_timer(1)
+
+        rebuild.assert_not_called()
+        mock_timer.assert_called_with(0.5, queue._process_timer, [1])
+        mock_timer.return_value.start.assert_called_with()
+
+        mock_current_thread.return_value = mock_timer.return_value
+        mock_monotonic.return_value = 1600.0
+        queue._process_timer(1)
+
+        rebuild.assert_called_once_with(1, {11})
+        self.assertEqual(2, mock_timer.call_count)
+        self.assertEqual([], queue.flush())
+
+    def test_failed_rebuild_does_not_stop_others(self):
+        rebuild = MagicMock()
+        rebuild.side_effect = [ValueError, None]
+        queue = rebuild_queue.LocalRebuildQueue(rebuild, 600)
+        queue.request(1)
+        queue.request(2)
+
+        queue.flush()
+
+        self.assertEqual(2, rebuild.call_count)
+
+
+class TestDatabaseRebuildQueue(unittest.TestCase):
+    @patch.object(models.db, 'session')
+    def test_request(self, mock_session):
+        queue = rebuild_queue.DatabaseRebuildQueue(MagicMock(), 30)
+
+        queue.request(1, 11)
+
+        request = mock_session.add.call_args[0][0]
+        self.assertEqual(1, request.show_id)
+        self.assertEqual(11, request.episode_id)
+        mock_session.commit.assert_called_with()
+
+    @patch.object(RebuildRequest, 'query')
+    @patch.object(models.db, 'session')
+    def test_process_due(self, mock_session, mock_query):
+        rebuild = MagicMock()
+        queue = rebuild_queue.DatabaseRebuildQueue(rebuild, 30)
+        mock_session.query.return_value.group_by.return_value. \
+            having.return_value.all.return_value = [(1,)]
+        requests = [RebuildRequest(1, 11), RebuildRequest(1, 12),
+                    RebuildRequest(1)]
+        mock_query.filter_by.return_value.with_for_update.return_value. \
+            all.return_value = requests
+
+        result = queue.process_due()
+
+        self.assertEqual([1], result)
+        rebuild.assert_called_with(1, {11, 12})
+        self.assertEqual(3, mock_session.delete.call_count)
+
+    @patch.object(RebuildRequest, 'query')
+    @patch.object(models.db, 'session')
+    def test_process_due_skips_show_claimed_by_others(
+            self, mock_session, mock_query):
+        rebuild = MagicMock()
+        queue = rebuild_queue.DatabaseRebuildQueue(rebuild, 30)
+        mock_session.query.return_value.group_by.return_value. \
+            having.return_value.all.return_value = [(1,)]
+        mock_query.filter_by.return_value.with_for_update.return_value. \
+            all.return_value = []
+
+        self.assertEqual([], queue.process_due())
+        rebuild.assert_not_called()
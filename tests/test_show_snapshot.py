@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from highland import show_snapshot, show_operation, episode_operation, models
+from highland.exception import NoSuchEntityError
+
+
+class TestShowSnapshot(unittest.TestCase):
+    @patch.object(episode_operation, 'load_public_with_media')
+    @patch.object(show_operation, 'get_show_url')
+    @patch.object(models.db, 'session')
+    def test_load(self, mock_session, mock_get_show_url, mock_load_episodes):
+        show, user, image = MagicMock(), MagicMock(), MagicMock()
+        mock_session.query.return_value. \
+            join.return_value. \
+            outerjoin.return_value. \
+            filter.return_value. \
+            first.return_value = (show, user, image)
+        mock_get_show_url.return_value = 'some_show_url'
+
+        result = show_snapshot.load(1)
+
+        self.assertEqual(show, result.show)
+        self.assertEqual(user, result.user)
+        self.assertEqual(image, result.show_image)
+        self.assertEqual('some_show_url', show.url)
+        self.assertEqual(mock_load_episodes.return_value, result.episodes)
+        mock_load_episodes.assert_called_with(show.id)
+
+    @patch.object(models.db, 'session')
+    def test_load_raises_when_show_not_found(self, mock_session):
+        mock_session.query.return_value. \
+            join.return_value. \
+            outerjoin.return_value. \
+            filter.return_value. \
+            first.return_value = None
+        with self.assertRaises(NoSuchEntityError):
+            show_snapshot.load(1)
+
+    @patch.object(episode_operation, 'load_public_with_media')
+    @patch.object(show_operation, 'get_show_url')
+    @patch.object(models.db, 'session')
+    def test_load_show(self, mock_session, mock_get_show_url,
+                       mock_load_episodes):
+        show, user = MagicMock(), MagicMock()
+        mock_session.query.return_value. \
+            join.return_value. \
+            outerjoin.return_value. \
+            filter.return_value. \
+            first.return_value = (show, user, None)
+
+        self.assertEqual((user, show, None), show_snapshot.load_show(1))
+        mock_load_episodes.assert_not_called()
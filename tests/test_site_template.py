@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from highland import app, site_template
+from highland.models import Episode, Show
+
+
+class TestSiteTemplate(unittest.TestCase):
+    def test_render_outside_flask_context(self):
+        show = Show(1, 'show <title>', 'description', 'subtitle', 'en-US',
+                    'author', 'category', False, None, 'show')
+        episode = Episode(1, 1, 'episode title', 'subtitle', 'description',
+                          None, 'published', None, False, None, 'ep')
+        episode.published_datetime = datetime(2016, 1, 2, tzinfo=timezone.utc)
+
+        html = site_template.render(
+            site_template.TEMPLATE_INDEX, title=show.title, show=show,
+            url='url', home_url='home_url', feed_url='feed_url',
+            image_url='', episodes=[episode])
+
+        self.assertIn('<title>show &lt;title&gt;</title>', html)
+        self.assertIn('Jan 02, 2016', html)
+        self.assertIn('href=/show/ep', html)
+
+    def test_precompile_writes_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.object(app, 'config',
+                              {'SITE_TEMPLATE_CACHE_DIR': cache_dir}):
+                environment = site_template._create_environment()
+            with patch.object(site_template, 'environment', environment):
+                self.assertEqual(
+                    site_template.TEMPLATES, site_template.precompile())
+            self.assertEqual(
+                len(site_template.TEMPLATES), len(os.listdir(cache_dir)))
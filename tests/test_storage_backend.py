@@ -0,0 +1,213 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from botocore.exceptions import ClientError
+
+from highland import storage_backend
+
+
+class TestS3Storage(unittest.TestCase):
+    def test_delete_many_in_batches(self):
+        s3 = MagicMock()
+        delete_objects = s3.meta.client.delete_objects
+        delete_objects.side_effect = [
+            {'Errors': [{'Key': 'show/1', 'Code': 'AccessDenied',
+                         'Message': 'Access Denied'}]},
+            ClientError({'Error': {'Code': '503'}}, 'DeleteObjects'),
+            {}]
+        keys = ['show/{}'.format(x) for x in range(2500)]
+
+        errors = storage_backend.S3Storage(s3).delete_many('sites', keys)
+
+        self.assertEqual(3, delete_objects.call_count)
+        self.assertEqual('sites', delete_objects.call_args[1]['Bucket'])
+        objects = [x[1]['Delete']['Objects']
+                   for x in delete_objects.call_args_list]
+        self.assertEqual([1000, 1000, 500], [len(x) for x in objects])
+        self.assertEqual({'Key': 'show/0'}, objects[0][0])
+        self.assertTrue(delete_objects.call_args[1]['Delete']['Quiet'])
+        self.assertEqual(
+            {'show/1'} | set(keys[1000:2000]), set(errors))
+        self.assertEqual('AccessDenied: Access Denied', errors['show/1'])
+
+    def test_calls_through_client(self):
+        s3 = MagicMock()
+        client = s3.meta.client
+        client.get_paginator.return_value.paginate.return_value = [
+            {'Contents': [{'Key': 'show/a'}, {'Key': 'show/b'}]}, {}]
+        storage = storage_backend.S3Storage(s3)
+
+        storage.put('sites', 'show/a', b'body', ContentType='text/html')
+        storage.delete('sites', 'show/a')
+        keys = storage.list_keys('sites', 'show/')
+
+        client.put_object.assert_called_with(
+            Bucket='sites', Key='show/a', Body=b'body', ACL='public-read',
+            ContentType='text/html')
+        client.delete_object.assert_called_with(Bucket='sites', Key='show/a')
+        client.get_paginator.assert_called_with('list_objects')
+        client.get_paginator.return_value.paginate.assert_called_with(
+            Bucket='sites', Prefix='show/')
+        self.assertEqual(['show/a', 'show/b'], keys)
+        # resources are not to be shared between the upload threads
+        s3.Bucket.assert_not_called()
+        s3.Object.assert_not_called()
+
+    def test_put_stream_in_parts(self):
+        s3 = MagicMock()
+        client = s3.meta.client
+        client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+        client.upload_part.side_effect = \
+            lambda **kwargs: {'ETag': 'etag{}'.format(kwargs['PartNumber'])}
+
+        storage_backend.S3Storage(s3).put_stream(
+            'audio', 'user/guid', io.BytesIO(b'0123456789'), part_size=4,
+            ContentType='audio/mpeg')
+
+        client.create_multipart_upload.assert_called_with(
+            Bucket='audio', Key='user/guid', ACL='public-read',
+            ContentType='audio/mpeg')
+        self.assertEqual(
+            [(1, b'0123'), (2, b'4567'), (3, b'89')],
+            [(x[1]['PartNumber'], x[1]['Body'])
+             for x in client.upload_part.call_args_list])
+        client.complete_multipart_upload.assert_called_with(
+            Bucket='audio', Key='user/guid', UploadId='upload',
+            MultipartUpload={'Parts': [
+                {'ETag': 'etag1', 'PartNumber': 1},
+                {'ETag': 'etag2', 'PartNumber': 2},
+                {'ETag': 'etag3', 'PartNumber': 3}]})
+        client.abort_multipart_upload.assert_not_called()
+
+    def test_put_stream_aborts_on_failure(self):
+        s3 = MagicMock()
+        client = s3.meta.client
+        client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+        client.upload_part.side_effect = \
+            ClientError({'Error': {'Code': '503'}}, 'UploadPart')
+
+        with self.assertRaises(ClientError):
+            storage_backend.S3Storage(s3).put_stream(
+                'audio', 'user/guid', io.BytesIO(b'0123'))
+        client.abort_multipart_upload.assert_called_with(
+            Bucket='audio', Key='user/guid', UploadId='upload')
+        client.complete_multipart_upload.assert_not_called()
+
+    def test_exists(self):
+        s3 = MagicMock()
+        head_object = s3.meta.client.head_object
+        head_object.side_effect = [
+            {}, ClientError({'Error': {'Code': '404'}}, 'HeadObject'),
+            ClientError({'Error': {'Code': '403'}}, 'HeadObject')]
+        storage = storage_backend.S3Storage(s3)
+
+        self.assertTrue(storage.exists('sites', 'show'))
+        self.assertFalse(storage.exists('sites', 'show'))
+        with self.assertRaises(ClientError):
+            storage.exists('sites', 'show')
+        head_object.assert_called_with(Bucket='sites', Key='show')
+
+    def test_get_part_url(self):
+        s3 = MagicMock()
+        generate = s3.meta.client.generate_presigned_url
+        generate.return_value = 'https://audio/part'
+
+        self.assertEqual(
+            'https://audio/part', storage_backend.S3Storage(s3).get_part_url(
+                'audio', 'user/guid', 'upload', 2, 600))
+        generate.assert_called_with(
+            'upload_part', ExpiresIn=600, Params={
+                'Bucket': 'audio', 'Key': 'user/guid', 'UploadId': 'upload',
+                'PartNumber': 2})
+
+
+class TestReadParts(unittest.TestCase):
+    def test_fills_parts_from_short_reads(self):
+        stream = MagicMock()
+        chunks = [b'01', b'2', b'3', b'45', b'']
+        stream.read.side_effect = lambda size: chunks.pop(0)
+
+        self.assertEqual(
+            [b'0123', b'45'],
+            list(storage_backend._read_parts(stream, 4)))
+
+    def test_empty_stream_has_a_part(self):
+        self.assertEqual(
+            [b''], list(storage_backend._read_parts(io.BytesIO(), 4)))
+
+    def test_stream_of_whole_parts(self):
+        self.assertEqual(
+            [b'0123', b'4567'],
+            list(storage_backend._read_parts(io.BytesIO(b'01234567'), 4)))
+
+
+class TestLocalStorage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = storage_backend.LocalStorage(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_and_list_keys(self):
+        self.storage.put('sites', 'show/ep1', '<html>1</html>')
+        self.storage.put('sites', 'show/ep2', io.BytesIO(b'<html>2</html>'),
+                         ContentType='text/html')
+        self.storage.put('sites', 'show2/ep1', b'<html></html>')
+
+        self.assertEqual(['show/ep1', 'show/ep2'],
+                         self.storage.list_keys('sites', 'show/'))
+        with open(os.path.join(self.directory.name, 'sites', 'show', 'ep2'),
+                  'rb') as f:
+            self.assertEqual(b'<html>2</html>', f.read())
+
+    def test_exists(self):
+        self.storage.put('sites', 'show/ep1', 'content')
+
+        self.assertTrue(self.storage.exists('sites', 'show/ep1'))
+        self.assertFalse(self.storage.exists('sites', 'show'))
+        self.assertFalse(self.storage.exists('sites', 'show/ep2'))
+
+    def test_delete(self):
+        self.storage.put('sites', 'show/ep1', 'content')
+
+        self.storage.delete('sites', 'show/ep1')
+        self.storage.delete('sites', 'show/ep1')
+        self.assertEqual([], self.storage.list_keys('sites', ''))
+
+    def test_delete_many(self):
+        self.storage.put('sites', 'show/ep1', 'content')
+        self.storage.put('sites', 'show/ep2', 'content')
+
+        errors = self.storage.delete_many(
+            'sites', ['show/ep1', 'show/ep2', '../feed/show'])
+
+        self.assertEqual(['../feed/show'], list(errors))
+        self.assertEqual([], self.storage.list_keys('sites', ''))
+
+    def test_key_out_of_bucket(self):
+        with self.assertRaises(ValueError):
+            self.storage.put('sites', '../feed/show', 'content')
+
+
+class TestMemoryStorage(unittest.TestCase):
+    def test_put_delete_and_list_keys(self):
+        storage = storage_backend.MemoryStorage()
+        storage.put('sites', 'show/ep1', 'content', ContentType='text/html')
+        storage.put('sites', 'show/ep2', io.BytesIO(b'content'))
+        storage.put('feed', 'show/ep1', b'content')
+
+        self.assertEqual(b'content', storage.objects[('sites', 'show/ep1')])
+        self.assertEqual({'ContentType': 'text/html'},
+                         storage.metadata[('sites', 'show/ep1')])
+        self.assertEqual(['show/ep1', 'show/ep2'],
+                         storage.list_keys('sites', 'show/'))
+
+        self.assertTrue(storage.exists('sites', 'show/ep1'))
+        self.assertFalse(storage.exists('sites', 'show'))
+
+        storage.delete('sites', 'show/ep1')
+        self.assertEqual(['show/ep2'], storage.list_keys('sites', 'show/'))
+        self.assertFalse(storage.exists('sites', 'show/ep1'))
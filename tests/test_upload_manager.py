@@ -0,0 +1,140 @@
+import io
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
+from highland import media_storage, upload_manager
+
+
+def client_error():
+    return ClientError({'Error': {'Code': '503'}}, 'PutObject')
+
+
+class TestUploadManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = upload_manager.UploadManager(4, 8, 2, 0.5)
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    @patch.object(upload_manager.random, 'uniform',
+                  side_effect=lambda a, b: b)
+    @patch.object(upload_manager.time, 'sleep')
+    @patch.object(media_storage, 'upload')
+    def test_retries_with_jittered_backoff(
+            self, mock_upload, mock_sleep, mock_uniform):
+        mock_upload.side_effect = [client_error(), client_error(), None]
+
+        result = self.manager.submit(
+            '<html></html>', 'sites', 'ep', 'show',
+            ContentType='text/html').result()
+
+        self.assertEqual(('show/ep', 3, None),
+                         (result.key, result.attempts, result.error))
+        mock_upload.assert_called_with(
+            '<html></html>', 'sites', 'ep', 'show', ContentType='text/html')
+        self.assertEqual([((0, 0.5),), ((0, 1.0),)],
+                         mock_uniform.call_args_list)
+        self.assertEqual([((0.5,),), ((1.0,),)], mock_sleep.call_args_list)
+        self.assertEqual(
+            {'uploaded': 1, 'failed': 0, 'retried': 2},
+            {k: v for k, v in self.manager.stats().items()
+             if not k.endswith('seconds')})
+
+    @patch.object(upload_manager.time, 'sleep')
+    @patch.object(media_storage, 'upload')
+    def test_gives_up_after_retries(self, mock_upload, mock_sleep):
+        mock_upload.side_effect = client_error()
+
+        result = self.manager.submit('<html></html>', 'sites', 'ep').result()
+
+        self.assertIsInstance(result.error, ClientError)
+        self.assertEqual(3, mock_upload.call_count)
+        self.assertEqual(1, self.manager.stats()['failed'])
+
+    @patch.object(upload_manager.time, 'sleep')
+    @patch.object(media_storage, 'upload', side_effect=ValueError)
+    def test_does_not_retry_other_errors(self, mock_upload, mock_sleep):
+        result = self.manager.submit('<html></html>', 'sites', 'ep').result()
+
+        self.assertIsInstance(result.error, ValueError)
+        self.assertEqual(1, mock_upload.call_count)
+        mock_sleep.assert_not_called()
+
+    @patch.object(upload_manager.time, 'sleep')
+    @patch.object(media_storage, 'upload')
+    def test_rewinds_file_before_retrying(self, mock_upload, mock_sleep):
+        read = []
+
+        def upload(file_data, *args, **kwargs):
+            read.append(file_data.read())
+            if len(read) == 1:
+                raise client_error()
+
+        mock_upload.side_effect = upload
+
+        self.manager.submit(io.BytesIO(b'feed'), 'feed', 'show').result()
+
+        self.assertEqual([b'feed', b'feed'], read)
+
+    @patch.object(media_storage, 'upload')
+    def test_batch_calls_done_of_succeeded_uploads(self, mock_upload):
+        mock_upload.side_effect = self._fail_on('bad')
+        done = MagicMock()
+        batch = self.manager.batch()
+
+        batch.submit('good', 'sites', 'one', done=done.one)
+        batch.submit('bad', 'sites', 'two', done=done.two)
+        batch.submit('good', 'sites', 'three')
+        results = batch.wait()
+
+        self.assertEqual(['one', 'two', 'three'], [x.key for x in results])
+        self.assertEqual([None, None], [results[0].error, results[2].error])
+        self.assertIsInstance(results[1].error, ValueError)
+        done.one.assert_called_once_with()
+        done.two.assert_not_called()
+        self.assertEqual([], batch.wait())
+
+    @patch.object(media_storage, 'upload')
+    def test_batch_raises_first_error_on_exit(self, mock_upload):
+        mock_upload.side_effect = self._fail_on('bad')
+        done = MagicMock()
+
+        with self.assertRaises(ValueError):
+            with self.manager.batch() as batch:
+                batch.submit('bad', 'sites', 'one')
+                batch.submit('good', 'sites', 'two', done=done)
+        done.assert_called_once_with()
+
+    @patch.object(media_storage, 'upload')
+    def test_submit_blocks_while_queue_is_full(self, mock_upload):
+        manager = upload_manager.UploadManager(2, 1, 0, 0)
+        release = threading.Event()
+        mock_upload.side_effect = lambda *args, **kwargs: release.wait(5)
+        manager.submit('one', 'sites', 'one')
+        submitting = threading.Thread(
+            target=manager.submit, args=('two', 'sites', 'two'))
+
+        submitting.start()
+        submitting.join(0.1)
+        self.assertTrue(submitting.is_alive())
+
+        release.set()
+        submitting.join(5)
+        self.assertFalse(submitting.is_alive())
+        manager.shutdown()
+        self.assertEqual(2, manager.stats()['uploaded'])
+
+    @patch.object(upload_manager, '_manager')
+    def test_upload_raises_error(self, mock_manager):
+        mock_manager.batch.return_value = upload_manager.UploadBatch(
+            self.manager)
+        with patch.object(media_storage, 'upload', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                upload_manager.upload('<html></html>', 'sites', 'ep')
+
+    def _fail_on(self, bad):
+        def upload(body, *args, **kwargs):
+            if body == bad:
+                raise ValueError
+        return upload
@@ -4,9 +4,11 @@ import unittest
 import uuid
 import highland
 from flask import json
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, PropertyMock, patch
 from highland import models, show_operation, episode_operation, audio_operation,\
-    image_operation, user_operation
+    image_operation, user_operation, feed_operation, publish, \
+    audio_upload_operation, cognito_auth
+from highland.exception import InvalidValueError
 
 
 class AuthMixin(object):
@@ -74,6 +76,34 @@ class TestAudio(unittest.TestCase, AuthMixin):
     def test_get(self):
         self.assertForbidden(self.app.get('/audio'))
 
+    def test_ingest(self):
+        self.assertForbidden(self.app.post(
+            '/audio/ingest?filename=some.mp3', data=b'audio',
+            content_type='audio/mpeg'))
+
+    @patch.object(audio_upload_operation, 'start',
+                  side_effect=InvalidValueError('length not accepted'))
+    @patch.object(highland.web.auth, '_consume_token')
+    @patch.object(cognito_auth.CognitoAuth, 'authenticated_user',
+                  new_callable=PropertyMock)
+    def test_upload_rejects_invalid_values(
+            self, mock_user, mock_consume, mock_start):
+        response = self.app.post(
+            '/audio/upload', content_type='application/json',
+            data=json.dumps({'filename': 'some.mp3', 'duration': 120,
+                             'length': '1024', 'filetype': 'audio/mpeg'}))
+        self.assertEqual(400, response.status_code)
+        mock_start.assert_called_with(
+            mock_user.return_value.id, 'some.mp3', 120, '1024', 'audio/mpeg')
+
+    def test_upload(self):
+        self.assertForbidden(self.app.post('/audio/upload'))
+        self.assertForbidden(self.app.get('/audio/upload/1'))
+        self.assertForbidden(self.app.post('/audio/upload/1/part_urls'))
+        self.assertForbidden(self.app.put('/audio/upload/1/parts'))
+        self.assertForbidden(self.app.post('/audio/upload/1/complete'))
+        self.assertForbidden(self.app.delete('/audio/upload/1'))
+
 
 class TestImage(unittest.TestCase, AuthMixin):
     def setUp(self):
@@ -85,3 +115,93 @@ class TestImage(unittest.TestCase, AuthMixin):
 
     def test_get(self):
         self.assertForbidden(self.app.get('/image'))
+
+
+class TestRebuildQueue(unittest.TestCase, AuthMixin):
+    def setUp(self):
+        highland.app.config['TESTING'] = True
+        self.app = highland.app.test_client()
+
+    def post(self, secret=None):
+        headers = {} if secret is None else {'X-Task-Secret': secret}
+        return self.app.post('/process_rebuild_queue', headers=headers)
+
+    @patch.object(publish, 'queue')
+    def test_process(self, mock_queue):
+        mock_queue.process_due.return_value = [1]
+        with patch.dict(highland.app.config, {'TASK_SECRET': 'secret'}):
+            self.assertForbidden(self.post())
+            self.assertForbidden(self.post('wrong'))
+            mock_queue.process_due.assert_not_called()
+
+            response = self.post('secret')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([1], json.loads(response.data)['result'])
+
+    @patch.object(publish, 'queue')
+    def test_process_refused_without_secret(self, mock_queue):
+        with patch.dict(highland.app.config, {'TASK_SECRET': ''}):
+            self.assertForbidden(self.post(''))
+        mock_queue.process_due.assert_not_called()
+
+
+class TestFeed(unittest.TestCase):
+    def setUp(self):
+        highland.app.config['TESTING'] = True
+        self.app = highland.app.test_client()
+        self.show = models.Show(1, 'title', 'desc', 'sub', 'en', 'author',
+                                'Technology', False, None, 'alias')
+        self.show.id = 1
+        self.show.last_build_datetime = datetime.datetime(
+            2016, 5, 1, 12, 30, 15, 500, tzinfo=datetime.timezone.utc)
+
+    @patch.object(feed_operation, 'get_cached')
+    @patch.object(show_operation, 'get_model_by_alias')
+    def test_get(self, mock_get_show, mock_get_cached):
+        mock_get_show.return_value = self.show
+        mock_get_cached.return_value = b'<rss/>'
+
+        response = self.app.get('/rss/alias')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'<rss/>', response.data)
+        self.assertEqual('"{}"'.format(feed_operation.get_etag(self.show)),
+                         response.headers.get('ETag'))
+        self.assertEqual('Sun, 01 May 2016 12:30:15 GMT',
+                         response.headers.get('Last-Modified'))
+        mock_get_show.assert_called_with('alias')
+
+    @patch.object(feed_operation, 'get_cached')
+    @patch.object(show_operation, 'get_model_by_alias')
+    def test_get_not_modified_by_etag(self, mock_get_show, mock_get_cached):
+        mock_get_show.return_value = self.show
+
+        response = self.app.get('/rss/alias', headers={
+            'If-None-Match': '"{}"'.format(
+                feed_operation.get_etag(self.show))})
+
+        self.assertEqual(304, response.status_code)
+        mock_get_cached.assert_not_called()
+
+    @patch.object(feed_operation, 'get_cached')
+    @patch.object(show_operation, 'get_model_by_alias')
+    def test_get_not_modified_since(self, mock_get_show, mock_get_cached):
+        mock_get_show.return_value = self.show
+
+        response = self.app.get('/rss/alias', headers={
+            'If-Modified-Since': 'Sun, 01 May 2016 12:30:15 GMT'})
+
+        self.assertEqual(304, response.status_code)
+        mock_get_cached.assert_not_called()
+
+    @patch.object(feed_operation, 'get_cached')
+    @patch.object(show_operation, 'get_model_by_alias')
+    def test_get_modified_since(self, mock_get_show, mock_get_cached):
+        mock_get_show.return_value = self.show
+        mock_get_cached.return_value = b'<rss/>'
+
+        response = self.app.get('/rss/alias', headers={
+            'If-Modified-Since': 'Sun, 01 May 2016 12:30:14 GMT'})
+
+        self.assertEqual(200, response.status_code)